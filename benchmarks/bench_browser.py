@@ -0,0 +1,242 @@
+# Headless benchmarks for NaviBrowser's hot paths, against synthetic profiles and a local HTTP server.
+#   python benchmarks/bench_browser.py [--sizes 1000,10000,100000] [--tabs 10] [--out results.json]
+#   python benchmarks/bench_browser.py --compare baseline.json [--threshold 0.25]
+#   python benchmarks/bench_browser.py --perf-profile low-memory --out low.json  (compare profiles on the same workload)
+# Also runs `simple_browser.py --batch` over --batch-pages URLs from the same local server.
+# Each profile size runs in its own process (Qt profiles and URL schemes are per process), and every
+# metric is "lower is better", so a run fails when any metric grows past the threshold.
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGE = """<!doctype html><html><head><title>Page {n}</title><style>p{{margin:4px}}</style></head>
+<body><h1>Bench page {n}</h1>{body}<img src="/img/{n}.svg"></body></html>"""
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64"><rect width="64" height="64"/></svg>'
+# A page for the offline capture: 40 images, a script and a stylesheet that imports another and uses a font
+CAPTURE_PAGE = """<html><head><title>Capture</title><link rel="stylesheet" href="/static/site.css"><script src="/static/app.js"></script></head>
+<body>{imgs}</body></html>""".format(imgs="".join(f'<img src="/img/c{i}.svg">' for i in range(40)))
+STATIC = {
+    "/static/site.css": (b'@import "/static/base.css"; @font-face{font-family:f;src:url(font.woff2)} body{background:url(/img/bg.svg)}', "text/css"),
+    "/static/base.css": (b"h1{background:url(/img/h1.svg)}", "text/css"),
+    "/static/app.js": (b"console.log('app')", "application/javascript"),
+    "/static/font.woff2": (os.urandom(32768), "font/woff2"),
+}
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/img/"):
+            time.sleep(0.01)  # Some server latency, so the fetch pool's parallelism shows
+            body, ctype = SVG + f"<!-- {self.path} -->".encode(), "image/svg+xml"
+        elif self.path in STATIC: body, ctype = STATIC[self.path]
+        else:
+            n = self.path.strip("/") or "0"
+            body, ctype = PAGE.format(n=n, body="".join(f"<p>Paragraph {i} of page {n}</p>" for i in range(200))).encode(), "text/html"
+        self.send_response(200)
+        self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+def serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def synthetic_profile(history, downloads=300, sites=200, seed=1):
+    # Legacy-document shape, so it goes through the same import path as a real old profile
+    rnd = random.Random(seed)
+    now = time.time()
+    hist = []
+    for i in range(history):
+        p = rnd.randint(0, max(1, history // 5)); h = f"site{p % 500}.example.com"
+        hist.append({'url': f"https://{h}/articles/{p}", 'title': f"Article {p} on {h}", 'time': now - i})
+    return {
+        'settings': {'theme': 'light', 'wholesome_switch': False, 'max_live_tabs': 1000, 'restore_session': False},
+        'history': hist, 'last_active': now,
+        'downloads': [{'id': str(i), 'title': f"Saved page {i}", 'date': now - i, 'html': PAGE.format(n=i, body="<p>saved</p>" * 500)} for i in range(downloads)],
+        'sites': {f"site{i}.pw-navi": {'domain': f"site{i}.pw-navi", 'title': f"Site {i}", 'html_content': f"<h1>Site {i}</h1>"} for i in range(sites)},
+        'extensions': {},
+    }
+
+def median_ms(fn, reps=5):
+    times = []
+    for _ in range(reps):
+        start = time.perf_counter(); fn(); times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def consume(page):
+    # Renderers return a string or a generator of chunks
+    if isinstance(page, (str, bytes)): return len(page)
+    return sum(len(c) for c in page)
+
+def wait_for(app, done, timeout=30, tick=None, every=0.05):
+    # tick, if given, runs at most once per `every` seconds while waiting (memory sampling)
+    deadline, next_tick = time.monotonic() + timeout, 0
+    while not done() and time.monotonic() < deadline:
+        app.processEvents()
+        if tick and time.monotonic() >= next_tick: tick(); next_tick = time.monotonic() + every
+        time.sleep(0.002)
+    return done()
+
+def load_ms(app, tab, url):
+    from PyQt5.QtCore import QUrl
+    loaded = []
+    tab.loadFinished.connect(loaded.append)
+    start = time.perf_counter(); tab.setUrl(QUrl(url))
+    ok = wait_for(app, lambda: loaded)
+    tab.loadFinished.disconnect(loaded.append)
+    return (time.perf_counter() - start) * 1000 if ok else float('inf')
+
+def worker(size, tabs, perf_profile):
+    # Runs inside a scratch directory: the browser keeps its files relative to the cwd
+    import simple_browser as sb
+    from PyQt5.QtCore import QUrl
+    from PyQt5.QtWidgets import QApplication
+    server, base = serve()
+    r = {}
+
+    store = sb.NaviStore(sb.DB_FILE)
+    start = time.perf_counter(); store.import_data(sb.apply_data_defaults(synthetic_profile(size))); r['import_ms'] = (time.perf_counter() - start) * 1000
+    r['load_from_disk_ms'] = median_ms(lambda: store.load())
+    r['load_history_ms'] = median_ms(lambda: store.load_history(sb.HISTORY_LIMIT), reps=3)
+    # Offline capture of a page with 46 resources; the second capture of it should store nothing new
+    def blob_count(): return sum(len(f) for _, _, f in os.walk(sb.BLOB_DIR))
+    start = time.perf_counter(); job = sb.PageCapture(f"{base}/capture", "Capture", CAPTURE_PAGE, store.blobs).run()
+    r['capture_ms'] = (time.perf_counter() - start) * 1000
+    if job.state != 'done' or job.failed or len(job.resources) != 46: sys.exit(f"capture incomplete: {job.progress()}")
+    before = blob_count(); sb.PageCapture(f"{base}/capture", "Capture", CAPTURE_PAGE, store.blobs).run()
+    r['capture_new_blobs'] = blob_count() - before
+    store.close()
+
+    profile = sb.apply_perf_profile([f"--perf-profile={perf_profile}"])
+    sb.register_url_schemes()
+    app = QApplication([sys.argv[0]])
+    start = time.perf_counter(); b = sb.NaviBrowser(profile); b.show(); r['startup_ms'] = (time.perf_counter() - start) * 1000
+    wait_for(app, lambda: b.history_loaded)
+
+    def save():
+        b.save_to_disk('settings'); b.store.writer.flush()
+    r['save_to_disk_ms'] = median_ms(save)
+    n = 2000
+    start = time.perf_counter()
+    for i in range(n): b.add_to_history(f"{base}/visit/{i}", f"Visit {i}")
+    r['add_to_history_us'] = (time.perf_counter() - start) / n * 1e6
+    b.store.writer.flush()
+
+    routes = list(sb.INTERNAL_ROUTES) + ["navi://history?q=article", "navi://history?page=10", "saved://dlw/0"]
+    for route in routes:
+        name = route.replace("navi://", "").replace("saved://", "saved_").replace("/", "_").replace("?", "_").replace("=", "_") or "home"
+        def cold(route=route): b.page_cache.clear(); consume(b.render_url(QUrl(route)))
+        r[f"render_{name}_ms"] = median_ms(cold)
+
+    r['add_new_tab_ms'] = median_ms(lambda: b.add_new_tab(QUrl("about:blank")))
+
+    # Extension overhead: the same page loaded with no scripts and with 20 page-world scripts
+    tab = b.add_new_tab(QUrl("about:blank")); load_ms(app, tab, f"{base}/warmup")
+    plain = statistics.median(load_ms(app, tab, f"{base}/{i}") for i in range(5))
+    for i in range(20):
+        code = f"// @match {base}/*\ndocument.body && document.body.setAttribute('data-ext{i}', '1');"
+        b.data['extensions'][f"bench{i}"] = {'code': code, 'active': True}
+        b.extensions.refresh(f"bench{i}")
+    with_ext = statistics.median(load_ms(app, tab, f"{base}/{i}") for i in range(5, 10))
+    r['extension_overhead_ms'] = max(0.0, with_ext - plain)
+    runs = sum(s[0] for s in b.extensions.stats.values())
+    r['extension_script_ms'] = sum(s[1] for s in b.extensions.stats.values()) / runs if runs else 0.0
+
+    # Peak memory with N live tabs, each on its own page. Renderers are sampled while the tabs load and
+    # for a while after (shared renderers counted once); the main process's high-water mark is the kernel's
+    opened = [b.add_new_tab(QUrl(f"{base}/tab{i}")) for i in range(tabs)]
+    peak = [0]
+    def sample():
+        pids = {t.page().renderProcessPid() for t in opened if hasattr(t.page(), 'renderProcessPid')}
+        peak[0] = max(peak[0], sum(sb.process_rss(p) for p in pids if p))
+    wait_for(app, lambda: all(t.url().toString().startswith(base) and t.title().startswith("Page") for t in opened), 60, tick=sample)
+    wait_for(app, lambda: False, 2, tick=sample)
+    r['rss_peak_main_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1048576 if sys.platform == 'darwin' else 1024)
+    r['rss_peak_renderers_mb'] = peak[0] / 1048576
+
+    b.close(); app.processEvents(); server.shutdown()
+    return r
+
+def batch(pages, concurrency, perf_profile):
+    # simple_browser.py --batch as its own process, against the local server; every page must come back
+    server, base = serve()
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "urls.txt"), "w") as f: f.write("".join(f"{base}/batch{i}\n" for i in range(pages)))
+        p = subprocess.run([sys.executable, os.path.join(ROOT, "simple_browser.py"), "--batch", "urls.txt", "--out", "out",
+                            "--concurrency", str(concurrency), f"--perf-profile={perf_profile}"], cwd=d, capture_output=True, text=True)
+        written = len([f for f in os.listdir(os.path.join(d, "out")) if f.endswith(".html")]) if os.path.isdir(os.path.join(d, "out")) else 0
+    server.shutdown()
+    if p.returncode != 0 or written != pages:
+        sys.stderr.write(p.stderr); sys.exit(f"batch run failed: {p.stdout.strip()[-500:]}")
+    report = json.loads(p.stdout.strip().splitlines()[-1])
+    return {'batch.ms_per_page': report['wall_s'] * 1000 / report['ok'], 'batch.p90_ms': report['latency_ms']['p90']}
+
+def run(sizes, tabs, perf_profile):
+    results = {'meta': {'time': time.time(), 'python': sys.version.split()[0], 'tabs': tabs, 'perf_profile': perf_profile}, 'metrics': {}}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            p = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(size), "--tabs", str(tabs), "--perf-profile", perf_profile],
+                               cwd=d, capture_output=True, text=True)
+        if p.returncode != 0:
+            sys.stderr.write(p.stderr); sys.exit(f"benchmark worker for {size} rows failed")
+        for k, v in json.loads(p.stdout.strip().splitlines()[-1]).items(): results['metrics'][f"{size}.{k}"] = round(v, 3)
+    return results
+
+def compare(current, baseline, threshold, floor=0.5):
+    # Returns the metrics that regressed by more than threshold (fractional) over the baseline, or are
+    # missing from this run (a crashed or renamed measurement must not pass); changes smaller than
+    # floor (in the metric's own unit) are timer noise and never fail
+    regressions = []
+    for k, base in sorted(baseline['metrics'].items()):
+        cur = current['metrics'].get(k)
+        if cur is None:
+            print(f"  {k:45} {base:12.3f} -> {'missing':>12}           MISSING")
+            regressions.append(k); continue
+        change = cur / base - 1 if base > 0 else (float('inf') if cur > base else 0.0)
+        flag = "REGRESSION" if change > threshold and cur - base > floor else ""
+        print(f"  {k:45} {base:12.3f} -> {cur:12.3f}  {change:+7.1%}  {flag}")
+        if flag: regressions.append(k)
+    return regressions
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000", help="history rows per synthetic profile")
+    ap.add_argument("--tabs", type=int, default=10, help="live tabs for the memory measurement")
+    ap.add_argument("--out", help="write results as JSON")
+    ap.add_argument("--compare", help="baseline JSON; exit 1 if any metric regressed")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    ap.add_argument("--floor", type=float, default=0.5, help="ignore absolute changes below this (ms, us or MB)")
+    ap.add_argument("--perf-profile", default="balanced", help="performance profile the browser runs with")
+    ap.add_argument("--batch-pages", type=int, default=50, help="pages for the --batch run (0 skips it)")
+    ap.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(worker(args.worker, args.tabs, args.perf_profile)))
+        sys.exit(0)
+
+    results = run([int(s) for s in args.sizes.split(",")], args.tabs, args.perf_profile)
+    if args.batch_pages:
+        results['metrics'].update({k: round(v, 3) for k, v in batch(args.batch_pages, 4, args.perf_profile).items()})
+    if args.out:
+        with open(args.out, "w") as f: json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        bad = compare(results, baseline, args.threshold, args.floor)
+        if bad: sys.exit(f"{len(bad)} metric(s) missing or regressed more than {args.threshold:.0%}: {', '.join(bad)}")
+    else:
+        for k, v in results['metrics'].items(): print(f"  {k:45} {v:12.3f}")
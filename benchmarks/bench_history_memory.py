@@ -0,0 +1,59 @@
+# Memory per history entry: the old list-of-dicts layout vs. HistoryLog.
+#   python benchmarks/bench_history_memory.py [entries]
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from simple_browser import HistoryLog
+
+def visits(n, seed=1):
+    # Realistic-ish mix: n/5 distinct pages on 500 hosts, so pages are revisited.
+    # Strings are rebuilt per visit, as QUrl.toString()/title() hand out fresh copies.
+    rnd = random.Random(seed)
+    now = time.time()
+    for i in range(n):
+        p = rnd.randint(0, max(1, n // 5)); h = f"site{p % 500}.example.com"
+        yield f"https://{h}/articles/{p}?ref=navi", f"Article {p} on {h}", now - (n - i)
+
+def measure(build, n):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build(n)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return obj, size
+
+def build_dicts(n):
+    history = []
+    for url, title, t in visits(n): history.append({'url': url, 'title': title, 'time': t})
+    return history
+
+def build_log(n):
+    log = HistoryLog(n)
+    for url, title, t in visits(n): log.append(url, title, t)
+    return log
+
+def insert_cost(n, inserts=200):
+    # Old add_to_history: insert(0) + slice on a full list; new: ring buffer append
+    old = build_dicts(n)
+    start = time.perf_counter()
+    for url, title, t in visits(inserts, seed=2):
+        old.insert(0, {'url': url, 'title': title, 'time': t}); old = old[:n]
+    old_us = (time.perf_counter() - start) / inserts * 1e6
+    new = build_log(n)
+    start = time.perf_counter()
+    for url, title, t in visits(inserts, seed=2): new.append(url, title, t)
+    new_us = (time.perf_counter() - start) / inserts * 1e6
+    return old_us, new_us
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    _, dict_bytes = measure(build_dicts, n)
+    _, log_bytes = measure(build_log, n)
+    old_us, new_us = insert_cost(n)
+    print(f"{n} entries")
+    print(f"  list of dicts: {dict_bytes / n:8.1f} bytes/entry, insert {old_us:8.1f} us")
+    print(f"  HistoryLog:    {log_bytes / n:8.1f} bytes/entry, insert {new_us:8.1f} us")
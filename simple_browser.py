@@ -1,20 +1,125 @@
 import sys
 import json
+import argparse
 import os
 import time
+import sqlite3
+import threading
+import hashlib
+import zlib
+import re
+import math
+import bisect
+import heapq
+import itertools
+import mimetypes
+import pickle
+import codecs
+import urllib.request
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from html import escape, unescape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin, parse_qs
 from datetime import datetime
-from PyQt5.QtCore import QUrl, Qt, QSize, QDateTime, QTimer
+STARTUP_T0 = time.perf_counter()  # Before the Qt imports, so --startup-trace can time them
+from PyQt5.QtCore import QUrl, Qt, QSize, QDateTime, QTimer, QStringListModel, pyqtSignal, pyqtSlot, QBuffer, QIODevice, QObject, QEvent, QFile, QLockFile
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QAction, QLineEdit,
     QWidget, QVBoxLayout, QLabel, QPushButton, QTextEdit,
     QMessageBox, QTabWidget, QMenu, QDialog, QPlainTextEdit,
-    QHBoxLayout, QComboBox
+    QHBoxLayout, QComboBox, QCompleter, QFileDialog, QListWidget
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineSettings, QWebEngineScript
+from PyQt5.QtWebEngineCore import (
+    QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob,
+    QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+)
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
 
 # --- Constants ---
-DATA_FILE = "navi_data.json"
+DATA_FILE = "navi_data.json"  # Legacy whole-document format, migrated into DB_FILE
+DB_FILE = "navi_data.db"
+BLOB_DIR = "navi_blobs"
+SITE_DIR = "navi_sites"  # Asset packs of personal sites
+FILTER_DIR = "navi_filters"  # EasyList-style *.txt lists; the compiled engine is cached here too
+THUMB_DIR = "navi_thumbs"  # Tab overview thumbnails, one JPEG per URL
 TWO_WEEKS_SECONDS = 1209600
+HISTORY_LIMIT = 100000
+HISTORY_PAGE_SIZE = 50
+HISTORY_SEARCH_WINDOW = 500
+FRECENCY_HALF_LIFE = 14 * 86400  # A visit counts half as much after two weeks
+NOTES_COMPACT_EVERY = 200  # Note edits kept as deltas before they are folded into a snapshot
+# Captured web pages and their resources. Their own scheme, never bridged and without local access,
+# so a saved page's scripts get no way into navi:// pages
+SAVED_ORIGIN = "saved://dlw"
+INTERNAL_ROUTES = {
+    "navi://home": "Home", "navi://settings": "Settings", "navi://navits": "Navits", "navi://navits/buy": "Navits Store",
+    "navi://pw": "My Sites", "navi://dlw": "Downloads", "navi://history": "History", "navi://cws": "Extensions", "navi://info": "Info",
+    "navi://cache": "Cache", "navi://perf": "Performance", "navi://blocking": "Blocking", "navi://diagnostics": "Diagnostics",
+    "navi://import": "Import", "navi://tabs": "Tabs",
+}
+
+# --- Startup Trace ---
+# `--startup-trace` prints each phase as it finishes: time since launch and since the previous mark
+class StartupTrace:
+    def __init__(self, enabled=False):
+        self.enabled, self.last = enabled, STARTUP_T0
+
+    def mark(self, phase):
+        if not self.enabled: return
+        now = time.perf_counter()
+        print(f"[startup] {(now - STARTUP_T0) * 1000:8.1f} ms  (+{(now - self.last) * 1000:7.1f})  {phase}", file=sys.stderr)
+        self.last = now
+
+TRACE = StartupTrace("--startup-trace" in sys.argv)
+
+# --- Performance Profiles ---
+# Chromium reads its switches once, when QtWebEngine starts, so the profile is picked from the saved
+# settings (or --perf-profile=<name>) before QApplication exists and a change applies on restart.
+CPU_COUNT = os.cpu_count() or 2
+PERF_PROFILES = {
+    'low-memory': {
+        'label': "Low memory", 'about': "Two shared renderers, no GPU process, small cache. For machines with little RAM.",
+        'software_gl': True, 'cache_cap_mb': 64,
+        'flags': ["--renderer-process-limit=2", "--process-per-site", "--disable-site-isolation-trials", "--disable-gpu",
+                  "--disable-gpu-compositing", "--enable-low-end-device-mode", "--js-flags=--optimize-for-size"],
+    },
+    'balanced': {'label': "Balanced", 'about': "QtWebEngine's own defaults.", 'software_gl': False, 'cache_cap_mb': None, 'flags': []},
+    'throughput': {
+        'label': "Throughput", 'about': "A renderer per core and GPU rasterization. For workstations with RAM to spare.",
+        'software_gl': False, 'cache_cap_mb': None,
+        'flags': [f"--renderer-process-limit={max(4, CPU_COUNT)}", "--ignore-gpu-blocklist", "--enable-gpu-rasterization",
+                  "--enable-zero-copy", f"--num-raster-threads={min(4, max(1, CPU_COUNT // 2))}"],
+    },
+}
+
+def saved_rows(query, path=DB_FILE):
+    # Reads the profile database without opening the store; [] for a new or unreadable profile
+    if not os.path.exists(path): return []
+    try:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try: return db.execute(query).fetchall()
+        finally: db.close()
+    except sqlite3.Error: return []
+
+def saved_settings(path=DB_FILE):
+    rows = saved_rows("SELECT value FROM kv WHERE key = 'settings'", path)
+    try: return json.loads(rows[0][0]) if rows else {}
+    except ValueError: return {}
+
+def apply_perf_profile(argv):
+    # Must run before QApplication; returns the name of the profile in effect
+    name = next((a.split("=", 1)[1] for a in argv if a.startswith("--perf-profile=")), None) or saved_settings().get('perf_profile')
+    if name not in PERF_PROFILES: name = 'balanced'
+    p = PERF_PROFILES[name]
+    # Switches already in the environment go last, so a hand-set one still wins
+    os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = " ".join(p['flags'] + [os.environ.get("QTWEBENGINE_CHROMIUM_FLAGS", "")]).strip()
+    if p['software_gl']: QApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)
+    return name
 
 # --- Helper Functions ---
 def get_wholesome_history():
@@ -36,9 +141,787 @@ def is_seasonal(event):
             return True
     return False
 
+def apply_data_defaults(data):
+    # Ensure all new keys exist in old data files
+    if 'settings' not in data: data['settings'] = {}
+    if 'theme' not in data['settings']: data['settings']['theme'] = 'light'
+    if 'wholesome_switch' not in data['settings']: data['settings']['wholesome_switch'] = True
+    if 'custom_suffix' not in data['settings']: data['settings']['custom_suffix'] = '.pw-navi'
+    if 'save_window_ms' not in data['settings']: data['settings']['save_window_ms'] = 250
+    if 'history_limit' not in data['settings']: data['settings']['history_limit'] = HISTORY_LIMIT
+    if 'max_live_tabs' not in data['settings']: data['settings']['max_live_tabs'] = 8
+    if 'tab_memory_budget_mb' not in data['settings']: data['settings']['tab_memory_budget_mb'] = 0
+    if 'tab_freeze_seconds' not in data['settings']: data['settings']['tab_freeze_seconds'] = 300
+    if 'cache_dir' not in data['settings']: data['settings']['cache_dir'] = 'navi_cache'
+    if 'cache_size_mb' not in data['settings']: data['settings']['cache_size_mb'] = 256
+    if 'restore_session' not in data['settings']: data['settings']['restore_session'] = True
+    if 'site_cache_mb' not in data['settings']: data['settings']['site_cache_mb'] = 32
+    if 'blocking_enabled' not in data['settings']: data['settings']['blocking_enabled'] = True
+    if 'perf_enabled' not in data['settings']: data['settings']['perf_enabled'] = False
+    if 'perf_samples' not in data['settings']: data['settings']['perf_samples'] = 5000
+    if 'capture_workers' not in data['settings']: data['settings']['capture_workers'] = 8
+    if 'capture_per_host' not in data['settings']: data['settings']['capture_per_host'] = 4
+    if 'perf_profile' not in data['settings']: data['settings']['perf_profile'] = 'balanced'
+    if 'thumb_cache_mb' not in data['settings']: data['settings']['thumb_cache_mb'] = 16
+    if 'thumb_disk_mb' not in data['settings']: data['settings']['thumb_disk_mb'] = 64
+
+    if 'inventory' not in data: data['inventory'] = []
+    if 'navits' not in data: data['navits'] = 0
+    if 'sites' not in data: data['sites'] = {}
+    if 'extensions' not in data: data['extensions'] = {}
+    if 'history' not in data: data['history'] = []
+    if 'downloads' not in data: data['downloads'] = []
+    if 'session' not in data: data['session'] = []
+    if 'perf_profile_stats' not in data: data['perf_profile_stats'] = {}
+    return data
+
+def dir_size(path):
+    total = 0
+    try:
+        for e in os.scandir(path):
+            if e.is_dir(follow_symlinks=False): total += dir_size(e.path)
+            elif e.is_file(follow_symlinks=False): total += e.stat(follow_symlinks=False).st_size
+    except OSError: pass
+    return total
+
+def is_internal_url(u):
+    # Browser-owned pages; personal local://<site> pages are user content and don't count
+    return u.scheme() == "navi" or (u.scheme() == "local" and u.host() == "navi")
+
+def js_arg(v):
+    # A Python value as a JS literal that is safe inside a double-quoted HTML attribute
+    return escape(json.dumps(v))
+
+def url_part(v):
+    # A value as one percent-encoded URL path segment, which is also safe inside an HTML attribute
+    return QUrl.toPercentEncoding(v).data().decode()
+
+def mime_for(path):
+    # Content type from the file extension; extensionless internal routes are HTML
+    t = mimetypes.guess_type(path)[0] if "." in path.rsplit("/", 1)[-1] else None
+    t = t or "text/html"
+    if t.startswith("text/") or t in ("application/json", "application/javascript"): t += ";charset=utf-8"
+    return t.encode()
+
+class ByteLRU:
+    # Least-recently-used map of byte strings, bounded by their total size
+    def __init__(self, max_bytes):
+        self.max_bytes, self.size, self.items = max_bytes, 0, OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        v = self.items.get(key)
+        if v is None: self.misses += 1; return None
+        self.items.move_to_end(key); self.hits += 1
+        return v
+
+    def put(self, key, v):
+        self.pop(key)
+        if len(v) > self.max_bytes: return
+        self.items[key] = v; self.size += len(v)
+        while self.size > self.max_bytes:
+            _, old = self.items.popitem(last=False); self.size -= len(old)
+
+    def pop(self, key):
+        v = self.items.pop(key, None)
+        if v is not None: self.size -= len(v)
+
+def atomic_write(path, data):
+    # Temp file + fsync + rename, so readers never see a half-written file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# --- History ---
+class HistoryEntry:
+    __slots__ = ('url', 'title', 'time', 'host')
+
+    def __init__(self, url, title, time, host=''):
+        self.url, self.title, self.time, self.host = url, title, time, host
+
+# Visits kept as parallel arrays in a ring buffer: appending is O(1) and never copies,
+# and each visit costs three array slots. URLs, titles and hosts are interned, so a page
+# visited many times stores its strings once. Index 0 is the most recent visit.
+class HistoryLog:
+    def __init__(self, capacity=HISTORY_LIMIT):
+        self.capacity = max(1, capacity)
+        self.clear()
+
+    def clear(self):
+        self.times, self.url_ids, self.title_ids = array('d'), array('l'), array('l')
+        self.head = 0  # Oldest slot, overwritten next once the buffer is full
+        self.urls, self.url_index, self.url_hosts = [], {}, array('l')
+        self.titles, self.title_index = [], {}
+        self.hosts, self.host_index = [], {}
+
+    @staticmethod
+    def _intern(table, index, value):
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        return i
+
+    def append(self, url, title, t):
+        u = self.url_index.get(url)
+        if u is None:
+            u = self._intern(self.urls, self.url_index, url)
+            self.url_hosts.append(self._intern(self.hosts, self.host_index, urlsplit(url).hostname or ''))
+        ti = self._intern(self.titles, self.title_index, title or '')
+        if len(self.times) < self.capacity:
+            self.times.append(t); self.url_ids.append(u); self.title_ids.append(ti)
+        else:
+            self.times[self.head], self.url_ids[self.head], self.title_ids[self.head] = t, u, ti
+            self.head = (self.head + 1) % self.capacity
+            # Overwritten visits leave unreferenced strings behind; drop them now and then
+            if len(self.urls) + len(self.titles) > 4 * self.capacity: self._compact()
+
+    def extend(self, rows):
+        # (url, title, time) rows, oldest first
+        for row in rows: self.append(*row)
+
+    def _compact(self):
+        rows = [(e.url, e.title, e.time) for e in self.oldest_first()]
+        capacity = self.capacity
+        self.clear(); self.capacity = capacity
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self.times)
+
+    def _slot(self, i):
+        return (self.head - 1 - i) % len(self.times)
+
+    def entry(self, i):
+        s = self._slot(i)
+        u = self.url_ids[s]
+        return HistoryEntry(self.urls[u], self.titles[self.title_ids[s]], self.times[s], self.hosts[self.url_hosts[u]])
+
+    def first(self):
+        return self.entry(0) if self.times else None
+
+    def recent(self, n, offset=0):
+        return [self.entry(i) for i in range(offset, min(len(self), offset + n))]
+
+    def __iter__(self):
+        for i in range(len(self)): yield self.entry(i)
+
+    def oldest_first(self):
+        for i in reversed(range(len(self))): yield self.entry(i)
+
+    def copy(self):
+        c = HistoryLog.__new__(HistoryLog)
+        c.capacity, c.head = self.capacity, self.head
+        c.times, c.url_ids, c.title_ids, c.url_hosts = array('d', self.times), array('l', self.url_ids), array('l', self.title_ids), array('l', self.url_hosts)
+        c.urls, c.titles, c.hosts = list(self.urls), list(self.titles), list(self.hosts)
+        c.url_index, c.title_index, c.host_index = dict(self.url_index), dict(self.title_index), dict(self.host_index)
+        return c
+
+# --- Storage ---
+# Content-addressed, zlib-compressed blobs stored as <root>/<hash[:2]>/<hash>.
+# Identical content is written once; reads happen only when a blob is opened.
+# A pinned hash is never deleted, so a writer that found it already on disk can rely on it
+# until its own references are recorded.
+class BlobStore:
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        self.pinned, self.lock = defaultdict(int), threading.Lock()
+
+    @staticmethod
+    def hash(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, h):
+        return os.path.join(self.root, h[:2], h)
+
+    def put(self, data, h=None):
+        h = h or self.hash(data)
+        p = self.path(h)
+        if not os.path.exists(p):
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            atomic_write(p, zlib.compress(data, 6))
+        return h
+
+    def get(self, h):
+        with open(self.path(h), 'rb') as f: return zlib.decompress(f.read())
+
+    def stream(self, h, chunk=65536):
+        # Decompresses as it reads, so large blobs never sit in memory whole
+        d = zlib.decompressobj()
+        with open(self.path(h), 'rb') as f:
+            for block in iter(lambda: f.read(chunk), b""): yield d.decompress(block)
+        yield d.flush()
+
+    def pin(self, h):
+        with self.lock: self.pinned[h] += 1
+
+    def unpin(self, hashes):
+        with self.lock:
+            for h in hashes:
+                self.pinned[h] -= 1
+                if self.pinned[h] <= 0: del self.pinned[h]
+
+    def delete(self, h):
+        with self.lock:
+            if h in self.pinned: return
+            try: os.remove(self.path(h))
+            except FileNotFoundError: pass
+
+# Asset bodies of personal sites, appended to one pack file per site and read back by offset.
+# The manifest (path -> pack, offset, size) lives in the site_files table. Packs are named
+# <domain hash>.<generation>.pack; compaction copies live bodies into the next generation.
+class SitePacks:
+    def __init__(self, folder=SITE_DIR):
+        self.folder = folder
+        self.files = {}  # Pack name -> open read handle
+
+    @staticmethod
+    def name(domain, gen=0):
+        return f"{hashlib.sha1(domain.encode()).hexdigest()[:16]}.{gen}.pack"
+
+    @staticmethod
+    def generation(name):
+        return int(name.split(".")[1])
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def write(self, name, bodies):
+        # Appends each body; returns their offsets. One fsync for the batch.
+        os.makedirs(self.folder, exist_ok=True)
+        offsets = []
+        with open(self.path(name), 'ab') as f:
+            for b in bodies: offsets.append(f.tell()); f.write(b)
+            f.flush(); os.fsync(f.fileno())
+        return offsets
+
+    def read(self, name, offset, size):
+        f = self.files.get(name)
+        if f is None: f = self.files[name] = open(self.path(name), 'rb')
+        f.seek(offset)
+        return f.read(size)
+
+    def size(self, name):
+        try: return os.path.getsize(self.path(name))
+        except OSError: return 0
+
+    def delete(self, name):
+        f = self.files.pop(name, None)
+        if f: f.close()
+        try: os.remove(self.path(name))
+        except OSError: pass
+
+    def close(self):
+        for f in self.files.values(): f.close()
+        self.files.clear()
+
+def migrate_downloads_to_blobs(store, db):
+    # Saved pages used to live inline in the downloads table
+    for dl_id, html in db.execute("SELECT id, html FROM downloads WHERE html IS NOT NULL").fetchall():
+        data = html.encode()
+        db.execute("UPDATE downloads SET hash = ?, size = ?, html = NULL WHERE id = ?", (store.blobs.put(data), len(data), dl_id))
+
+def backfill_history_hosts(store, db):
+    db.executemany("UPDATE history SET host = ? WHERE id = ?",
+                   [(urlsplit(u).hostname or '', i) for i, u in db.execute("SELECT id, url FROM history").fetchall()])
+    db.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+def move_notes_out_of_settings(store, db):
+    # Home notes used to live inside the settings blob, rewritten in full on every save
+    row = db.execute("SELECT value FROM kv WHERE key = 'settings'").fetchone()
+    if not row: return
+    settings = json.loads(row[0])
+    notes = settings.pop('home_notes', None)
+    if notes: db.execute("INSERT INTO notes (version, start, deleted, text, snapshot) SELECT IFNULL(MAX(version), 0) + 1, 0, 0, ?, 1 FROM notes", (notes,))
+    store._put(db, 'settings', json.dumps(settings))
+
+# One migration per schema version, applied in order and tracked with PRAGMA user_version.
+# Entries are SQL scripts or callables taking (store, db).
+SCHEMA_MIGRATIONS = [
+    """
+    CREATE TABLE kv (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, title TEXT, time REAL NOT NULL);
+    CREATE TABLE downloads (id TEXT PRIMARY KEY, title TEXT, html TEXT, date REAL);
+    CREATE TABLE sites (domain TEXT PRIMARY KEY, title TEXT, html_content TEXT);
+    CREATE TABLE extensions (name TEXT PRIMARY KEY, code TEXT, active INTEGER NOT NULL DEFAULT 1);
+    """,
+    """
+    ALTER TABLE downloads ADD COLUMN size INTEGER;
+    ALTER TABLE downloads ADD COLUMN hash TEXT;
+    CREATE INDEX downloads_hash ON downloads (hash);
+    """,
+    migrate_downloads_to_blobs,
+    """
+    ALTER TABLE history ADD COLUMN host TEXT;
+    CREATE VIRTUAL TABLE history_fts USING fts5(title, url, host, content='history', content_rowid='id', prefix='2 3');
+    CREATE TRIGGER history_ai AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts (rowid, title, url, host) VALUES (new.id, new.title, new.url, new.host);
+    END;
+    CREATE TRIGGER history_ad AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, title, url, host) VALUES ('delete', old.id, old.title, old.url, old.host);
+    END;
+    CREATE TRIGGER history_au AFTER UPDATE ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, title, url, host) VALUES ('delete', old.id, old.title, old.url, old.host);
+        INSERT INTO history_fts (rowid, title, url, host) VALUES (new.id, new.title, new.url, new.host);
+    END;
+    """,
+    backfill_history_hosts,
+    """
+    CREATE TABLE notes (version INTEGER PRIMARY KEY, start INTEGER NOT NULL, deleted INTEGER NOT NULL, text TEXT NOT NULL, snapshot INTEGER NOT NULL DEFAULT 0);
+    """,
+    move_notes_out_of_settings,
+    """
+    CREATE TABLE site_files (domain TEXT NOT NULL, path TEXT NOT NULL, pack TEXT NOT NULL, offset INTEGER NOT NULL, size INTEGER NOT NULL, PRIMARY KEY (domain, path));
+    """,
+    """
+    CREATE TABLE download_resources (download_id TEXT NOT NULL, url TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (download_id, url));
+    CREATE INDEX download_resources_hash ON download_resources (hash);
+    """,
+]
+
+# SQLite (WAL) profile store. Each write touches only the record that changed.
+class NaviStore:
+    RECORD_SECTIONS = ('sites', 'extensions', 'history', 'downloads')
+
+    def __init__(self, path=DB_FILE, blob_dir=BLOB_DIR, site_dir=SITE_DIR):
+        self.path = path
+        self.blobs = BlobStore(blob_dir)
+        self.packs = SitePacks(site_dir)
+        self.site_files = defaultdict(dict)  # domain -> {path: (pack, offset, size)}, filled by load()
+        self.asset_cache = ByteLRU(32 << 20)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.migrate_schema()
+        self.versions = defaultdict(int)  # section -> change counter, used to invalidate rendered pages
+        self.writer = PersistWorker(path)
+        self.writer.start()
+
+    def migrate_schema(self):
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        for i, step in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+            if callable(step):
+                with self.db: step(self, self.db)
+            else: self.db.executescript(step)
+            with self.db: self.db.execute(f"PRAGMA user_version={i}")
+
+    def is_empty(self):
+        return self.db.execute("SELECT 1 FROM kv LIMIT 1").fetchone() is None
+
+    def load(self):
+        data = {k: json.loads(v) for k, v in self.db.execute("SELECT key, value FROM kv")}
+        data['sites'] = {d: {'domain': d, 'title': t, 'html_content': h}
+                         for d, t, h in self.db.execute("SELECT domain, title, html_content FROM sites ORDER BY rowid")}
+        for d, p, pack, off, size in self.db.execute("SELECT domain, path, pack, offset, size FROM site_files"):
+            self.site_files[d][p] = (pack, off, size)
+        data['extensions'] = {n: {'code': c, 'active': bool(a)}
+                              for n, c, a in self.db.execute("SELECT name, code, active FROM extensions ORDER BY rowid")}
+        # History is the bulk of the file and is read off the GUI thread (see load_history)
+        # Metadata only; page contents stay in self.blobs until opened
+        data['downloads'] = [{'id': i, 'title': t, 'date': d, 'size': sz, 'hash': h}
+                             for i, t, d, sz, h in self.db.execute("SELECT id, title, date, size, hash FROM downloads ORDER BY rowid")]
+        return data
+
+    def import_data(self, data):
+        # One-time migration from the legacy JSON document. It writes on this connection, so the
+        # writer is drained first and the two never contend for the write lock.
+        self.writer.flush()
+        with self.db:
+            for k, v in data.items():
+                if k not in self.RECORD_SECTIONS: self._put(self.db, k, json.dumps(v))
+            for d, v in data['sites'].items(): self._put_site(self.db, d, v.get('title'), v.get('html_content'))
+            for n, v in data['extensions'].items(): self._put_extension(self.db, n, v.get('code'), v.get('active', True))
+            self.db.executemany("INSERT INTO history (url, title, time, host) VALUES (?, ?, ?, ?)",
+                                [(h['url'], h.get('title'), h.get('time', 0), urlsplit(h['url']).hostname or '') for h in reversed(data['history'])])
+            for d in data['downloads']:
+                html = (d.get('html') or '').encode()
+                self._add_download(self.db, d['id'], d.get('title'), d.get('date'), len(html), self.blobs.put(html))
+            move_notes_out_of_settings(self, self.db)
+
+    # Writes: each public method snapshots its arguments and queues an op on the writer thread
+    @staticmethod
+    def _put(db, key, value):
+        db.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+    @staticmethod
+    def _put_site(db, domain, title, html):
+        db.execute("INSERT OR REPLACE INTO sites (domain, title, html_content) VALUES (?, ?, ?)", (domain, title, html))
+    @staticmethod
+    def _put_extension(db, name, code, active):
+        db.execute("INSERT OR REPLACE INTO extensions (name, code, active) VALUES (?, ?, ?)", (name, code, int(active)))
+    @staticmethod
+    def _add_download(db, dl_id, title, date, size, h):
+        db.execute("INSERT OR REPLACE INTO downloads (id, title, date, size, hash) VALUES (?, ?, ?, ?, ?)", (dl_id, title, date, size, h))
+
+    def put(self, **items):
+        for k, v in items.items():
+            self.versions[k] += 1
+            v = json.dumps(v)
+            self.writer.submit(lambda db, k=k, v=v: self._put(db, k, v), ('kv', k))
+
+    def add_history(self, url, title, t, limit=HISTORY_LIMIT):
+        self.versions['history'] += 1
+        def op(db):
+            db.execute("INSERT INTO history (url, title, time, host) VALUES (?, ?, ?, ?)", (url, title, t, urlsplit(url).hostname or ''))
+            db.execute("DELETE FROM history WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)", (limit,))
+        self.writer.submit(op)
+
+    def replace_history(self, entries):
+        self.versions['history'] += 1
+        rows = [(h['url'], h.get('title'), h['time'], urlsplit(h['url']).hostname or '') for h in reversed(entries)]
+        def op(db):
+            db.execute("DELETE FROM history")
+            db.executemany("INSERT INTO history (url, title, time, host) VALUES (?, ?, ?, ?)", rows)
+        self.writer.submit(op)
+
+    # Browser import: visits are staged in a temp table on the writer's connection, then merged in one pass
+    @staticmethod
+    def _import_table(db):
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS import_visits (url TEXT NOT NULL, title TEXT, time REAL NOT NULL, host TEXT)")
+    def stage_import_visits(self, rows):
+        def op(db):
+            self._import_table(db)
+            db.executemany("INSERT INTO temp.import_visits (url, title, time, host) VALUES (?, ?, ?, ?)", rows)
+        self.writer.submit(op)
+    def merge_import_visits(self, limit, result):
+        # Drops visits the history already has, matched on URL and visit time (a repeated import adds
+        # nothing), then rewrites the history as the newest `limit` visits of both, in time order, so ids
+        # stay chronological
+        self.versions['history'] += 1
+        def op(db):
+            self._import_table(db)
+            staged = db.execute("SELECT COUNT(*) FROM temp.import_visits").fetchone()[0]
+            db.execute("DELETE FROM temp.import_visits WHERE rowid NOT IN (SELECT MIN(rowid) FROM temp.import_visits GROUP BY url, time)")
+            db.execute("DELETE FROM temp.import_visits WHERE (url, time) IN (SELECT url, time FROM main.history)")
+            fresh = db.execute("SELECT COUNT(*) FROM temp.import_visits").fetchone()[0]
+            result['duplicates'], result['imported'] = staged - fresh, 0
+            if fresh:
+                db.execute("""CREATE TEMP TABLE import_merged AS SELECT * FROM (SELECT url, title, time, host, 0 AS imported FROM main.history
+                              UNION ALL SELECT url, title, time, host, 1 FROM temp.import_visits) ORDER BY time DESC LIMIT ?""", (limit,))
+                result['imported'] = db.execute("SELECT COUNT(*) FROM temp.import_merged WHERE imported").fetchone()[0]
+                db.execute("DELETE FROM main.history")
+                db.execute("INSERT INTO main.history (url, title, time, host) SELECT url, title, time, host FROM temp.import_merged ORDER BY time")
+                db.execute("DROP TABLE temp.import_merged")
+            db.execute("DROP TABLE temp.import_visits")
+        self.writer.submit(op)
+
+    def put_site(self, domain, rec):
+        self.versions['sites'] += 1
+        title, html = rec.get('title'), rec.get('html_content')
+        self.writer.submit(lambda db: self._put_site(db, domain, title, html), ('site', domain))
+    def delete_site(self, domain):
+        self.versions['sites'] += 1
+        self.writer.submit(lambda db: db.execute("DELETE FROM sites WHERE domain = ?", (domain,)), ('site', domain))
+        files = self.site_files.pop(domain, None)
+        if files:
+            for path in files: self.asset_cache.pop((domain, path))
+            self.writer.submit(lambda db: db.execute("DELETE FROM site_files WHERE domain = ?", (domain,)))
+            self.writer.flush()  # Rows gone before the packs are
+            for pack in {p for p, _, _ in files.values()}: self.packs.delete(pack)
+
+    # Site assets: the body is appended to the site's pack right away (readers see it at once),
+    # only the manifest row goes through the writer
+    def put_site_file(self, domain, path, data):
+        files = self.site_files[domain]
+        gens = [SitePacks.generation(p) for p, _, _ in files.values()]
+        pack = SitePacks.name(domain, max(gens, default=0))
+        offset, = self.packs.write(pack, [data])
+        files[path] = (pack, offset, len(data))
+        self.asset_cache.pop((domain, path))
+        self.versions['sites'] += 1
+        self.writer.submit(lambda db: db.execute("INSERT OR REPLACE INTO site_files (domain, path, pack, offset, size) VALUES (?, ?, ?, ?, ?)",
+                                                 (domain, path, pack, offset, len(data))), ('site_file', domain, path))
+        self.compact_site(domain)
+
+    def delete_site_file(self, domain, path):
+        files = self.site_files.get(domain, {})
+        entry = files.pop(path, None)
+        if entry is None: return
+        self.asset_cache.pop((domain, path))
+        self.versions['sites'] += 1
+        self.writer.submit(lambda db: db.execute("DELETE FROM site_files WHERE domain = ? AND path = ?", (domain, path)), ('site_file', domain, path))
+        if not files:
+            del self.site_files[domain]
+            self.writer.flush()  # Rows gone before the pack is
+            self.packs.delete(entry[0])
+        else: self.compact_site(domain)
+
+    def read_site_file(self, domain, path):
+        key = (domain, path)
+        data = self.asset_cache.get(key)
+        if data is None:
+            entry = self.site_files[domain].get(path) if domain in self.site_files else None
+            if entry is None: return None
+            try: data = self.packs.read(*entry)
+            except OSError as e: print(f"Error reading {domain}/{path}: {e}"); return None
+            self.asset_cache.put(key, data)
+        return data
+
+    def compact_site(self, domain, min_dead=1 << 20):
+        # Once dead bytes outweigh live ones, copy the live bodies into the next generation,
+        # repoint every row in one transaction, and drop the old pack after that commits
+        files = self.site_files[domain]
+        old = {p for p, _, _ in files.values()}
+        live = sum(size for _, _, size in files.values())
+        if sum(self.packs.size(p) for p in old) - live < max(live, min_dead): return
+        new = SitePacks.name(domain, max(SitePacks.generation(p) for p in old) + 1)
+        paths = list(files)
+        offsets = self.packs.write(new, [self.packs.read(*files[p]) for p in paths])
+        for p, off in zip(paths, offsets): files[p] = (new, off, files[p][2])
+        rows = [(new, files[p][1], domain, p) for p in paths]
+        self.writer.submit(lambda db: db.executemany("UPDATE site_files SET pack = ?, offset = ? WHERE domain = ? AND path = ?", rows))
+        self.writer.flush()
+        for p in old: self.packs.delete(p)
+    def put_extension(self, name, rec):
+        self.versions['extensions'] += 1
+        code, active = rec.get('code'), rec.get('active', True)
+        self.writer.submit(lambda db: self._put_extension(db, name, code, active), ('ext', name))
+    def add_capture(self, rec, resources, pins=()):
+        # The capture already wrote (and pinned) its blobs; this records the page and the resources it
+        # points at, and only then lets them go. Not keyed, so a delete queued right after can't
+        # coalesce it away and orphan those blobs
+        self.versions['downloads'] += 1
+        args = (rec['id'], rec.get('title'), rec.get('date'), rec['size'], rec['hash'])
+        rows = [(rec['id'], u, h) for u, h in resources.items()]
+        def op(db):
+            self._add_download(db, *args)
+            db.executemany("INSERT OR REPLACE INTO download_resources (download_id, url, hash) VALUES (?, ?, ?)", rows)
+            self.blobs.unpin(pins)
+        self.writer.submit(op)
+    def delete_download(self, dl_id):
+        self.versions['downloads'] += 1
+        def op(db):
+            # Resources are shared between captures; a blob goes once nothing references it
+            hashes = db.execute("SELECT hash FROM downloads WHERE id = ? UNION SELECT hash FROM download_resources WHERE download_id = ?", (dl_id, dl_id)).fetchall()
+            db.execute("DELETE FROM downloads WHERE id = ?", (dl_id,))
+            db.execute("DELETE FROM download_resources WHERE download_id = ?", (dl_id,))
+            for (h,) in hashes:
+                if not db.execute("SELECT 1 FROM downloads WHERE hash = ? UNION ALL SELECT 1 FROM download_resources WHERE hash = ? LIMIT 1", (h, h)).fetchone(): self.blobs.delete(h)
+        self.writer.submit(op, ('dl', dl_id))
+
+    def load_history(self, limit, db=None):
+        # Pass a fresh connection when calling from another thread
+        log = HistoryLog(limit)
+        log.extend((db or self.db).execute("SELECT url, title, time FROM (SELECT id, url, title, time FROM history ORDER BY id DESC LIMIT ?) ORDER BY id", (limit,)))
+        return log
+
+    def load_notes(self):
+        # Latest snapshot with the edits made after it replayed on top: (version, text, edits)
+        version, text = self.db.execute("SELECT version, text FROM notes WHERE snapshot = 1 ORDER BY version DESC LIMIT 1").fetchone() or (0, "")
+        edits = self.db.execute("SELECT version, start, deleted, text FROM notes WHERE version > ? ORDER BY version", (version,)).fetchall()
+        for version, start, deleted, ins in edits: text = text[:start] + ins + text[start + deleted:]
+        return version, text, len(edits)
+
+    def add_note_edit(self, version, start, deleted, text):
+        # Never coalesced: every delta is needed to rebuild the text
+        self.versions['notes'] += 1
+        self.writer.submit(lambda db: db.execute("INSERT INTO notes (version, start, deleted, text) VALUES (?, ?, ?, ?)", (version, start, deleted, text)))
+
+    def put_notes(self, version, text):
+        # A snapshot replaces everything before it in the same transaction
+        self.versions['notes'] += 1
+        def op(db):
+            db.execute("INSERT INTO notes (version, start, deleted, text, snapshot) VALUES (?, 0, 0, ?, 1)", (version, text))
+            db.execute("DELETE FROM notes WHERE version < ?", (version,))
+        self.writer.submit(op)
+
+    def search_history(self, query, limit=HISTORY_PAGE_SIZE, offset=0):
+        # Every word must match as a prefix of a title, url or host token; titles weigh most.
+        # Only the newest HISTORY_SEARCH_WINDOW matches are ranked, which keeps common words
+        # cheap at 100k+ rows (FTS5 walks rowids newest-first without scoring everything).
+        terms = re.findall(r"\w+", query)
+        if not terms: return []
+        match = " ".join(f'"{t}"*' for t in terms)
+        return [HistoryEntry(*row) for row in self.db.execute(
+            """SELECT h.url, h.title, h.time, h.host FROM
+                 (SELECT rowid, rank FROM history_fts WHERE history_fts MATCH ? AND rank MATCH 'bm25(5.0, 1.0, 2.0)'
+                  ORDER BY rowid DESC LIMIT ?) m
+               JOIN history h ON h.id = m.rowid ORDER BY m.rank, h.id DESC LIMIT ? OFFSET ?""",
+            (match, max(HISTORY_SEARCH_WINDOW, offset + limit), limit, offset))]
+
+    def read_download(self, rec):
+        if not os.path.exists(self.blobs.path(rec['hash'])): self.writer.flush()  # Saved moments ago and not written yet
+        return self.blobs.stream(rec['hash'])
+
+    def read_capture_resource(self, name):
+        # name is <hash>.<ext>, as written into captured pages
+        h = name.split(".", 1)[0]
+        if not re.fullmatch(r"[0-9a-f]{64}", h) or not os.path.exists(self.blobs.path(h)): return None
+        return self.blobs.stream(h)
+
+    def close(self):
+        self.writer.stop()
+        self.packs.close()
+        self.db.close()
+
+# Write-behind persistence: ops queued from the GUI thread are merged for `window`
+# seconds and committed in a single transaction. Ops sharing a coalesce key replace
+# each other, so ten navits updates in a burst become one row write. Each op runs in
+# its own savepoint: one that raises is rolled back alone and retried with the next
+# burst, up to ATTEMPTS times, while the rest of its burst still commits.
+class PersistWorker(threading.Thread):
+    ATTEMPTS = 3
+
+    def __init__(self, path, window=0.25):
+        super().__init__(name="navi-persist", daemon=True)
+        self.path, self.window = path, window
+        self.pending = {}  # key -> (op, failed attempts)
+        self.cond = threading.Condition()
+        self.running, self.busy, self.flushing = True, False, False
+        self.requested = self.executed = self.commits = self.failed = 0
+        self.errors = deque(maxlen=10)  # (time, message) of the latest failed attempts
+
+    def submit(self, op, key=None):
+        with self.cond:
+            self.requested += 1
+            if key is None: key = object()
+            else: self.pending.pop(key, None)
+            self.pending[key] = (op, 0)
+            self.cond.notify_all()
+
+    def run(self):
+        db = sqlite3.connect(self.path)
+        db.execute("PRAGMA synchronous=FULL")  # Off the GUI thread, so commits can afford a full fsync
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or not self.running)
+                if not self.pending: break
+                # Let the rest of the burst arrive unless someone is waiting on us
+                self.cond.wait_for(lambda: self.flushing or not self.running, timeout=self.window)
+                ops, self.pending, self.busy = list(self.pending.items()), {}, True
+            failed = self.commit(db, ops)
+            with self.cond:
+                for key, op, tries, e in failed:
+                    self.errors.append((time.time(), str(e)))
+                    if key in self.pending: continue  # Superseded by a newer write while this one ran
+                    if tries + 1 < self.ATTEMPTS: self.pending[key] = (op, tries + 1)
+                    else: self.failed += 1
+                self.busy = False
+                self.cond.notify_all()
+        db.close()
+
+    def commit(self, db, ops):
+        # One transaction with a savepoint per op; returns the ops that failed, as (key, op, tries, error)
+        failed = []
+        try:
+            db.execute("BEGIN")
+            for key, (op, tries) in ops:
+                db.execute("SAVEPOINT op")
+                try: op(db)
+                except Exception as e:
+                    db.execute("ROLLBACK TO op")
+                    failed.append((key, op, tries, e))
+                db.execute("RELEASE op")
+            db.commit()
+        except Exception as e:
+            # The transaction itself failed, so nothing in it was written
+            if db.in_transaction: db.rollback()
+            return [(key, op, tries, e) for key, (op, tries) in ops]
+        self.executed += len(ops) - len(failed); self.commits += 1
+        return failed
+
+    def flush(self):
+        # Blocks until everything submitted so far is committed
+        with self.cond:
+            self.flushing = True
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: not self.pending and not self.busy or not self.is_alive())
+            self.flushing = False
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.join()
+
+    def stats(self):
+        # requested: store writes asked for; performed: transactions actually committed;
+        # failed: writes dropped after ATTEMPTS tries
+        with self.cond:
+            return {'requested': self.requested, 'performed': self.commits, 'ops': self.executed, 'failed': self.failed,
+                    'coalesced': self.requested - self.executed - self.failed - len(self.pending),
+                    'last_error': self.errors[-1] if self.errors else None}
+
+# --- Autocomplete ---
+def _logaddexp(a, b):
+    m = max(a, b)
+    return m + math.log1p(math.exp(-abs(a - b)))
+
+# URL bar suggestions ranked by frecency: visit count decayed by age. A score is kept as
+# log(sum(2 ** (t_visit / half_life))), which never has to be re-decayed: ordering by it
+# equals ordering by decayed visit count at any later moment, and it only ever grows.
+# Because of that, the best TOP_K urls per short prefix can be kept exact incrementally;
+# longer prefixes are answered from a sorted key list, whose ranges are small by then.
+class FrecencyIndex:
+    TOP_DEPTH = 6
+    TOP_K = 10
+    MAX_SCAN = 2000
+
+    def __init__(self):
+        self.entries = {}  # url -> [score, title]
+        self.keys = []     # sorted (key, url)
+        self.top = {}      # prefix -> urls, best first
+
+    @staticmethod
+    def normalize(text):
+        k = re.sub(r"^[a-z][a-z0-9+.-]*://", "", text.strip().lower())
+        return k[4:] if k.startswith("www.") else k
+
+    @staticmethod
+    def score(t, weight=1.0):
+        return t / FRECENCY_HALF_LIFE * math.log(2) + math.log(weight)
+
+    def build(self, visits):
+        # Bulk load from (url, title, time, weight) tuples in one sort
+        for url, title, t, w in visits:
+            e = self.entries.get(url)
+            if e is None: self.entries[url] = [self.score(t, w), title or '']
+            else:
+                e[0] = _logaddexp(e[0], self.score(t, w))
+                if title: e[1] = title
+        self.keys = sorted((self.normalize(u), u) for u in self.entries)
+        self.top = {}
+        for url in sorted(self.entries, key=lambda u: -self.entries[u][0]):
+            k = self.normalize(url)
+            for n in range(1, min(len(k), self.TOP_DEPTH) + 1):
+                lst = self.top.setdefault(k[:n], [])
+                if len(lst) < self.TOP_K: lst.append(url)
+        return self
+
+    def visit(self, url, title=None, t=None, weight=1.0):
+        s = self.score(time.time() if t is None else t, weight)
+        e = self.entries.get(url)
+        k = self.normalize(url)
+        if e is None:
+            e = self.entries[url] = [s, title or '']
+            bisect.insort(self.keys, (k, url))
+        else:
+            e[0] = _logaddexp(e[0], s)
+            if title: e[1] = title
+        for n in range(1, min(len(k), self.TOP_DEPTH) + 1):
+            lst = self.top.setdefault(k[:n], [])
+            if url in lst: lst.remove(url)
+            i = 0
+            while i < len(lst) and self.entries[lst[i]][0] >= e[0]: i += 1
+            if i < self.TOP_K: lst.insert(i, url); del lst[self.TOP_K:]
+
+    def query(self, text, limit=8):
+        p = self.normalize(text)
+        if not p: return []
+        if len(p) <= self.TOP_DEPTH: urls = self.top.get(p, [])[:limit]
+        else:
+            i = bisect.bisect_left(self.keys, (p,))
+            urls = []
+            for k, u in self.keys[i:i + self.MAX_SCAN]:
+                if not k.startswith(p): break
+                urls.append(u)
+            urls = sorted(urls, key=lambda u: -self.entries[u][0])[:limit]
+        return [(u, self.entries[u][1]) for u in urls]
+
 # --- Styles ---
 class ModernStyles:
     @staticmethod
+    @lru_cache(maxsize=None)
     def get(theme_name):
         # Default Colors
         bg, fg, input_bg, border, btn_hover, accent = "#f8f9fa", "#212529", "#ffffff", "#dee2e6", "#e9ecef", "#0d6efd"
@@ -79,17 +962,828 @@ class ModernStyles:
 class NaviWebPage(QWebEnginePage):
     def certificateError(self, error): return True # Ignore SSL errors
 
-    def acceptNavigationRequest(self, url, _type, isMainFrame):
-        if url.scheme() == "navi":
+    def javaScriptConsoleMessage(self, level, message, line, source):
+        if message.startswith(ExtensionRegistry.TIMING_TAG):
             view = self.view()
-            if view and hasattr(view, 'parent_window'):
-                view.parent_window.handle_internal_pages(url.toString(), view)
+            # Batch pages carry their own registry; tab pages report to their window's
+            registry = getattr(self, 'extensions', None) or (view.parent_window.extensions if view and hasattr(view, 'parent_window') else None)
+            if registry: registry.record(message)
+            return
+        super().javaScriptConsoleMessage(level, message, line, source)
+
+    def acceptNavigationRequest(self, url, _type, isMainFrame):
+        # Page routes load through NaviSchemeHandler; only commands are intercepted here.
+        # A command runs for a link on an internal page or an address typed into the URL bar;
+        # from web pages, frames or anything else it is dropped.
+        view = self.view()
+        if url.scheme() == "navi" and view and hasattr(view, 'parent_window') and not view.parent_window.is_page_route(url):
+            trusted = isMainFrame and (_type == QWebEnginePage.NavigationTypeTyped or
+                                       (_type == QWebEnginePage.NavigationTypeLinkClicked and is_internal_url(self.url())))
+            if trusted:
+                perf = view.parent_window.perf
+                t0 = perf.start()
+                if view.parent_window.handle_internal_pages(url.toString(), view): perf.end(t0, 'internal', 'command ' + url.host())
             return False
-        return super().acceptNavigationRequest(url, _type, isMainFrame)
+        accepted = super().acceptNavigationRequest(url, _type, isMainFrame)
+        if accepted and isMainFrame: self.attach_bridge(url)
+        return accepted
+
+    def attach_bridge(self, url):
+        # Only documents from internal pages get the QWebChannel transport
+        if not is_internal_url(url):
+            if self.webChannel(): self.setWebChannel(None)
+            return
+        if self.webChannel(): return
+        if not hasattr(self, 'channel'):
+            view = self.view()
+            if not (view and hasattr(view, 'parent_window')): return
+            self.channel = QWebChannel(self)
+            self.channel.registerObject("navi", NaviBridge(view.parent_window, self))
+        self.setWebChannel(self.channel)
+
+# --- Bridge ---
+# The API internal pages call over QWebChannel instead of navigating to navi:// command URLs.
+# Slots take plain arguments and return a JSON string, which InternalPages.BRIDGE_JS parses.
+def bridge_call(fn):
+    @wraps(fn)
+    def call(self, *args):
+        # The channel is detached when the page leaves an internal URL; this covers the gap
+        if not is_internal_url(self.page.url()): return json.dumps({'ok': False, 'message': 'Not allowed'})
+        return json.dumps(fn(self, *args))
+    return call
+
+class NaviBridge(QObject):
+    def __init__(self, browser, page):
+        super().__init__(page)
+        self.browser, self.page = browser, page
+
+    @pyqtSlot(int, int, int, str, result=str)
+    @bridge_call
+    def editNotes(self, base, start, deleted, text):
+        version = self.browser.edit_notes(base, start, deleted, text)
+        if version is None: return {'ok': False, 'version': self.browser.notes_version, 'text': self.browser.notes}
+        return {'ok': True, 'version': version}
+
+    @pyqtSlot(str, result=str)
+    @bridge_call
+    def toggleExtension(self, name):
+        active = self.browser.toggle_extension(name)
+        return {'ok': active is not None, 'active': bool(active)}
+
+    @pyqtSlot(str, result=str)
+    @bridge_call
+    def deleteSite(self, domain):
+        return {'ok': self.browser.delete_site(domain)}
+
+    @pyqtSlot(str, result=str)
+    @bridge_call
+    def deleteDownload(self, dl_id):
+        return {'ok': self.browser.delete_download(dl_id)}
+
+    @pyqtSlot(result=str)
+    @bridge_call
+    def captureProgress(self):
+        return [j.progress() for j in self.browser.captures.values()]
+
+    @pyqtSlot(result=str)
+    @bridge_call
+    def importProgress(self):
+        return [j.progress() for j in self.browser.imports]
+
+    @pyqtSlot(int, result=str)
+    @bridge_call
+    def closeTab(self, serial):
+        return {'ok': self.browser.close_tab_serial(serial)}
+
+    @pyqtSlot(str, result=str)
+    @bridge_call
+    def buyItem(self, item):
+        ok, title, message = self.browser.buy_item(item)
+        return {'ok': ok, 'title': title, 'message': message, 'navits': self.browser.data.get('navits', 0)}
+
+@lru_cache(maxsize=1)
+def qwebchannel_js():
+    # Shipped inside the QtWebChannel module as a Qt resource
+    f = QFile(":/qtwebchannel/qwebchannel.js")
+    if not f.open(QIODevice.ReadOnly): return None
+    try: return bytes(f.readAll())
+    finally: f.close()
+
+# --- URL Schemes ---
+def register_url_schemes():
+    # Must run before QApplication is created
+    for name in (b"navi", b"local", b"saved"):
+        scheme = QWebEngineUrlScheme(name)
+        scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+        flags = QWebEngineUrlScheme.SecureScheme
+        if name != b"saved": flags |= QWebEngineUrlScheme.LocalAccessAllowed
+        scheme.setFlags(flags)
+        QWebEngineUrlScheme.registerScheme(scheme)
+
+# Read-only device over an iterator of str/bytes chunks, so a page is sent while it is
+# still being generated instead of being built into one string first
+class ChunkDevice(QIODevice):
+    def __init__(self, chunks, parent=None):
+        super().__init__(parent)
+        self.chunks, self.buf, self.failed = iter(chunks), b"", False
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+    def _fill(self):
+        while not self.buf and self.chunks is not None:
+            try:
+                c = next(self.chunks)
+                self.buf = c.encode() if isinstance(c, str) else c
+            except StopIteration: self.chunks = None
+            except Exception as e:
+                # Runs inside Qt virtuals, where an exception would abort the browser; the response just ends
+                print(f"Error streaming response: {e}")
+                self.chunks, self.failed = None, True
+
+    def isSequential(self): return True
+    def bytesAvailable(self): self._fill(); return len(self.buf) + super().bytesAvailable()
+    def atEnd(self): self._fill(); return not self.buf and super().atEnd()
+
+    def readData(self, maxlen):
+        self._fill()
+        out, self.buf = self.buf[:maxlen], self.buf[maxlen:]
+        return out
+
+# Answers navi://<route> and local://navi/<route> from NaviBrowser.routes, and
+# local://<site>/ from the personal sites
+class NaviSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.browser = browser
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        t0 = self.browser.perf.start()
+        try: body = self.browser.render_url(url)
+        except Exception as e:
+            print(f"Error rendering {url.toString()}: {e}")
+            body = None
+        if body is not None and not isinstance(body, (str, bytes)):
+            # Streamed pages are timed to their first chunk only; one that fails before it is not found
+            body = ChunkDevice(body, job); body._fill()
+            if body.failed and not body.buf: body = None
+        self.browser.perf.end(t0, 'internal', f"{url.scheme()}://{url.host()}{url.path()}")
+        mime = mime_for(url.path())
+        if body is None:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+        elif isinstance(body, (str, bytes)):
+            buf = QBuffer(job)
+            buf.setData(body.encode() if isinstance(body, str) else body)
+            buf.open(QIODevice.ReadOnly)
+            job.reply(mime, buf)
+        else:
+            job.reply(mime, body)
+
+# --- Extensions ---
+# Each active extension is compiled once into a QWebEngineScript on the profile, so the
+# engine injects it itself at the declared point and only on matching URLs. Options are
+# read from Greasemonkey-style comment lines in the extension code:
+#   // @run-at document-start | document-ready | document-idle (default)
+#   // @match <glob>   // @exclude <glob>   (default: every page)
+#   // @world main      (default: an isolated world of its own)
+class ExtensionRegistry:
+    TIMING_TAG = "navi-ext-time "
+    RUN_AT = {"document-start": QWebEngineScript.DocumentCreation, "document-ready": QWebEngineScript.DocumentReady,
+              "document-end": QWebEngineScript.DocumentReady, "document-idle": QWebEngineScript.Deferred}
+
+    def __init__(self, extensions, profile):
+        self.extensions = extensions
+        self.profiles = [profile]
+        self.scripts, self.worlds, self.stats = {}, {}, {}
+        for name in extensions: self.refresh(name)
+
+    @staticmethod
+    def parse_meta(code):
+        meta = {'run-at': 'document-idle', 'include': [], 'exclude': [], 'world': None}
+        for key, value in re.findall(r"^\s*//\s*@(run-at|match|include|exclude|world)\s+(\S+)", code, re.M):
+            if key in ('match', 'include'): meta['include'].append(value)
+            elif key == 'exclude': meta['exclude'].append(value)
+            else: meta[key] = value
+        return meta
+
+    def compile(self, name, code):
+        meta = self.parse_meta(code)
+        if meta['world'] == 'main': world = QWebEngineScript.MainWorld
+        else: world = self.worlds.setdefault(name, QWebEngineScript.UserWorld + 1 + len(self.worlds))
+        # The engine matches the generated UserScript block natively before injecting
+        header = "// ==UserScript==\n" + "".join(f"// @include {g}\n" for g in meta['include'] or ["*"])
+        header += "".join(f"// @exclude {g}\n" for g in meta['exclude']) + "// ==/UserScript==\n"
+        timed = (f"(function(){{var __t0=performance.now();try{{\n{code}\n}}finally{{"
+                 f"console.debug({json.dumps(self.TIMING_TAG)}+JSON.stringify([{json.dumps(name)},performance.now()-__t0]));}}}})();")
+        script = QWebEngineScript()
+        script.setName(f"navi-ext:{name}")
+        script.setSourceCode(header + timed)
+        script.setInjectionPoint(self.RUN_AT.get(meta['run-at'], QWebEngineScript.Deferred))
+        script.setWorldId(world)
+        script.setRunsOnSubFrames(False)
+        return script
+
+    def refresh(self, name):
+        # Re-registers a single extension after it was toggled, edited or removed
+        old = self.scripts.pop(name, None)
+        if old is not None:
+            for p in self.profiles: p.scripts().remove(old)
+        ext = self.extensions.get(name)
+        if not ext or not ext['active']: return
+        script = self.compile(name, ext['code'])
+        for p in self.profiles: p.scripts().insert(script)
+        self.scripts[name] = script
+
+    def add_profile(self, profile):
+        self.profiles.append(profile)
+        for script in self.scripts.values(): profile.scripts().insert(script)
+
+    def record(self, message):
+        try: name, ms = json.loads(message[len(self.TIMING_TAG):])
+        except ValueError: return
+        s = self.stats.setdefault(name, [0, 0.0, 0.0])  # runs, total ms, max ms
+        s[0] += 1; s[1] += ms; s[2] = max(s[2], ms)
+
+# --- Content Blocking ---
+# EasyList-style network filters compiled into three lookups, so a request costs a few dict
+# probes and one automaton pass instead of a scan over every rule:
+#   ||host^ rules    -> host set, probed for each suffix of the request host
+#   other rules      -> indexed by their longest whole literal token, regex checked on a hit
+#   substring rules with no whole token (e.g. "ad_") -> one Aho-Corasick automaton pass
+# Anything left (wildcards without a whole token) goes to a short generic list. Cosmetic (##) rules and options we
+# can't honour (popup, csp, redirect, ...) are skipped. The compiled engine is pickled next to
+# the lists and reused until a list file changes.
+FILTER_OPTIONS_SKIP = {'popup', 'csp', 'redirect', 'redirect-rule', 'removeparam', 'rewrite', 'badfilter',
+                       'elemhide', 'generichide', 'genericblock', 'specifichide', 'ehide', 'ghide', 'shide', 'header', 'permissions'}
+FILTER_TYPES = ['script', 'image', 'stylesheet', 'object', 'xmlhttprequest', 'subdocument', 'ping', 'websocket', 'font', 'media', 'other']
+FILTER_TYPE_BITS = {t: 1 << i for i, t in enumerate(FILTER_TYPES)}
+FILTER_TYPE_BITS.update({'css': FILTER_TYPE_BITS['stylesheet'], 'xhr': FILTER_TYPE_BITS['xmlhttprequest'], 'frame': FILTER_TYPE_BITS['subdocument']})
+TOKEN_RE = re.compile(r"[a-z0-9%]+")
+
+def host_suffixes(host):
+    # "a.b.c" -> "a.b.c", "b.c", "c"
+    yield host
+    i = host.find(".")
+    while i != -1:
+        yield host[i + 1:]
+        i = host.find(".", i + 1)
+
+def domain_in(host, domains):
+    return any(h in domains for h in host_suffixes(host))
+
+def site_of(host):
+    # Rough registrable domain (last two labels, three under short second levels like co.uk)
+    parts = host.split(".")
+    n = 3 if len(parts) > 2 and len(parts[-1]) == 2 and len(parts[-2]) <= 3 else 2
+    return ".".join(parts[-n:])
+
+def filter_regex(p):
+    # Pattern body -> regex: * any run, ^ separator or end, | and || anchors
+    start = end = ""
+    if p.startswith("||"): start, p = r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?", p[2:]
+    elif p.startswith("|"): start, p = "^", p[1:]
+    if p.endswith("|"): end, p = "$", p[:-1]
+    return start + "".join(".*" if c == "*" else r"(?:[^a-z0-9_.%-]|$)" if c == "^" else re.escape(c) for c in p) + end
+
+def filter_token(p):
+    # Longest literal token that must appear whole in a matching URL (bounded on both sides)
+    left, right = p.startswith("|"), p.endswith(("|", "^"))
+    p = p.lstrip("|").rstrip("|")
+    best = ""
+    for m in TOKEN_RE.finditer(p):
+        a, b = m.span()
+        if (a == 0 and not left) or (a > 0 and p[a - 1] == "*"): continue
+        if (b == len(p) and not right) or (b < len(p) and p[b] == "*"): continue
+        if b - a > len(best): best = m.group()
+    return best if len(best) >= 2 else ""
+
+class FilterRule:
+    __slots__ = ('text', 'pattern', 'regex', 'types', 'not_types', 'third', 'domains', 'not_domains')
+
+    def __init__(self, text, pattern=None):
+        self.text, self.pattern, self.regex = text, pattern, None
+        self.types = self.not_types = 0
+        self.third = self.domains = self.not_domains = None
+
+    def matches(self, url, site, type_bit, third):
+        if self.types and not self.types & type_bit: return False
+        if self.not_types & type_bit: return False
+        if self.third is not None and self.third != third: return False
+        if self.domains and not domain_in(site, self.domains): return False
+        if self.not_domains and domain_in(site, self.not_domains): return False
+        if self.pattern is None: return True  # Host and substring rules already matched
+        if self.regex is None: self.regex = re.compile(self.pattern)  # Compiled on first use
+        return self.regex.search(url) is not None
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        # State 0 is the root; out[s] lists every pattern id ending at s (fail chain merged in)
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for i, p in enumerate(patterns):
+            s = 0
+            for c in p:
+                nxt = self.goto[s].get(c)
+                if nxt is None:
+                    nxt = len(self.goto); self.goto[s][c] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                s = nxt
+            self.out[s].append(i)
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for c, t in self.goto[s].items():
+                queue.append(t)
+                f = self.fail[s]
+                while f and c not in self.goto[f]: f = self.fail[f]
+                self.fail[t] = self.goto[f].get(c, 0)
+                self.out[t] += self.out[self.fail[t]]
+
+    def search(self, text):
+        # Ids of every pattern occurring in text
+        goto, fail, out = self.goto, self.fail, self.out
+        s, hits = 0, []
+        for c in text:
+            t = goto[s].get(c)
+            while t is None and s:
+                s = fail[s]; t = goto[s].get(c)
+            s = t or 0
+            if out[s]: hits += out[s]
+        return hits
+
+class FilterSet:
+    def __init__(self):
+        self.hosts, self.tokens, self.generic, self.plain, self.plain_rules = {}, {}, [], [], []
+        self.ac = None
+
+    def add(self, pattern, rule):
+        if re.fullmatch(r"\|\|[a-z0-9.-]+\^", pattern): self.hosts.setdefault(pattern[2:-1], []).append(rule); return
+        token, plain = filter_token(pattern), not any(c in pattern for c in "*^|")
+        if plain and not token:
+            self.plain.append(pattern); self.plain_rules.append(rule); return
+        rule.pattern = filter_regex(pattern)
+        if token: self.tokens.setdefault(token, []).append(rule)
+        else: self.generic.append(rule)
+
+    def finish(self):
+        self.ac = AhoCorasick(self.plain)
+
+    def match(self, url, host, site, type_bit, third):
+        # (rule, bucket) of the first rule that applies, else None
+        for h in host_suffixes(host):
+            for r in self.hosts.get(h, ()):
+                if r.matches(url, site, type_bit, third): return r, 'host'
+        for i in self.ac.search(url) if self.plain else ():
+            if self.plain_rules[i].matches(url, site, type_bit, third): return self.plain_rules[i], 'substring'
+        for t in set(TOKEN_RE.findall(url)):
+            for r in self.tokens.get(t, ()):
+                if r.matches(url, site, type_bit, third): return r, 'token'
+        for r in self.generic:
+            if r.matches(url, site, type_bit, third): return r, 'generic'
+        return None
+
+class FilterEngine:
+    VERSION = 1  # Bump when the compiled layout changes, invalidating cached engines
+
+    def __init__(self):
+        self.block, self.allow = FilterSet(), FilterSet()
+        self.allow_sites = set()  # @@||site^$document: nothing blocked on these pages
+        self.rules = self.skipped = 0
+
+    def add_line(self, line):
+        line = line.strip()
+        if not line or line[0] in "![" or "##" in line or "#@#" in line or "#?#" in line or "#$#" in line: return
+        allow = line.startswith("@@")
+        if allow: line = line[2:]
+        pattern, _, opts = line.lower().partition("$")
+        if pattern.startswith("/") and pattern.endswith("/") and len(pattern) > 1: self.skipped += 1; return  # Regex rules
+        rule = FilterRule(line)
+        for opt in filter(None, opts.split(",")):
+            neg, name = opt.startswith("~"), opt.lstrip("~")
+            if name in FILTER_TYPE_BITS:
+                if neg: rule.not_types |= FILTER_TYPE_BITS[name]
+                else: rule.types |= FILTER_TYPE_BITS[name]
+            elif name in ('third-party', '3p'): rule.third = not neg
+            elif name in ('first-party', '1p'): rule.third = neg
+            elif name.startswith("domain="):
+                ds = name[7:].split("|")
+                rule.domains = frozenset(d for d in ds if not d.startswith("~")) or None
+                rule.not_domains = frozenset(d[1:] for d in ds if d.startswith("~")) or None
+            elif name == 'document' and allow and re.fullmatch(r"\|\|[a-z0-9.-]+\^?", pattern):
+                self.allow_sites.add(pattern[2:].rstrip("^")); self.rules += 1; return
+            elif name in ('match-case', 'important', 'all'): continue
+            else: self.skipped += 1; return  # FILTER_OPTIONS_SKIP and anything unknown
+        if not pattern or pattern in ("*", "|", "||"): self.skipped += 1; return
+        (self.allow if allow else self.block).add(pattern, rule)
+        self.rules += 1
+
+    @classmethod
+    def parse(cls, lines):
+        engine = cls()
+        for line in lines: engine.add_line(line)
+        engine.block.finish(); engine.allow.finish()
+        return engine
+
+    def match(self, url, host, site_host, type_bit):
+        # The block rule that applies to a request, or None (no rule, or an exception matched)
+        if site_host and domain_in(site_host, self.allow_sites): return None
+        third = site_of(host) != site_of(site_host) if site_host else True
+        hit = self.block.match(url, host, site_host, type_bit, third)
+        if hit and self.allow.match(url, host, site_host, type_bit, third): return None
+        return hit
+
+    @classmethod
+    def load(cls, paths, cache_path):
+        # (engine, from_cache); the cache is keyed on each list's name, size and mtime
+        key = (cls.VERSION, [(os.path.basename(p), os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in paths])
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_key, engine = pickle.load(f)
+            if cached_key == key: return engine, True
+        except Exception: pass
+        def lines():
+            for p in paths:
+                with open(p, encoding='utf-8', errors='replace') as f: yield from f
+        engine = cls.parse(lines())
+        try: atomic_write(cache_path, pickle.dumps((key, engine), pickle.HIGHEST_PROTOCOL))
+        except OSError as e: print(f"Error caching filters: {e}")
+        return engine, False
+
+class ContentBlocker:
+    # Loads the lists off the GUI thread; until the engine is ready nothing is blocked
+    RESOURCE_TYPES = {
+        'ResourceTypeSubFrame': 'subdocument', 'ResourceTypeStylesheet': 'stylesheet', 'ResourceTypeScript': 'script',
+        'ResourceTypeImage': 'image', 'ResourceTypeFavicon': 'image', 'ResourceTypeFontResource': 'font',
+        'ResourceTypeObject': 'object', 'ResourceTypePluginResource': 'object', 'ResourceTypeMedia': 'media',
+        'ResourceTypeXhr': 'xmlhttprequest', 'ResourceTypePing': 'ping', 'ResourceTypeCspReport': 'ping',
+    }
+
+    def __init__(self, folder=FILTER_DIR, enabled=True):
+        self.folder, self.enabled = folder, enabled
+        self.engine, self.loading, self.info = None, False, {}
+        self.types = {getattr(QWebEngineUrlRequestInfo, k): FILTER_TYPE_BITS[v] for k, v in self.RESOURCE_TYPES.items()
+                      if hasattr(QWebEngineUrlRequestInfo, k)}
+        self.main_frame = getattr(QWebEngineUrlRequestInfo, 'ResourceTypeMainFrame', 0)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.checks = self.blocked = 0
+        self.total_us = self.max_us = 0.0
+        self.buckets, self.hosts = defaultdict(int), defaultdict(int)
+
+    def lists(self):
+        if not os.path.isdir(self.folder): return []
+        return sorted(os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith(".txt"))
+
+    def load(self):
+        if self.loading: return
+        self.loading = True
+        def work():
+            start = time.perf_counter()
+            try:
+                engine, cached = FilterEngine.load(self.lists(), os.path.join(self.folder, ".compiled.pickle"))
+                self.info = {'ms': (time.perf_counter() - start) * 1000, 'cached': cached, 'lists': len(self.lists())}
+                self.engine = engine
+            except Exception as e: print(f"Error loading filter lists: {e}")
+            finally: self.loading = False
+        threading.Thread(target=work, daemon=True).start()
+
+    def check(self, info):
+        # True when the request should be blocked
+        engine = self.engine
+        if engine is None or not self.enabled: return False
+        t0 = time.perf_counter()
+        u = info.requestUrl()
+        if u.scheme() not in ("http", "https", "ws", "wss") or info.resourceType() == self.main_frame: return False
+        host = u.host().lower()
+        type_bit = self.types.get(info.resourceType(), FILTER_TYPE_BITS['websocket' if u.scheme() in ("ws", "wss") else 'other'])
+        hit = engine.match(u.toString().lower(), host, info.firstPartyUrl().host().lower(), type_bit)
+        us = (time.perf_counter() - t0) * 1e6
+        self.checks += 1; self.total_us += us; self.max_us = max(self.max_us, us)
+        if not hit: return False
+        self.blocked += 1; self.buckets[hit[1]] += 1; self.hosts[host] += 1
+        return True
+
+class NaviRequestInterceptor(QWebEngineUrlRequestInterceptor):
+    # One per page, so blocked requests can be counted per tab
+    def __init__(self, tab, blocker):
+        super().__init__(tab)
+        self.tab, self.blocker = tab, blocker
+
+    def interceptRequest(self, info):
+        if self.blocker.check(info):
+            info.block(True)
+            self.tab.blocked += 1
+
+# --- Page Capture ---
+# Full offline copies: the live DOM from toHtml() plus every subresource it references (images,
+# stylesheets, scripts, fonts and whatever the stylesheets pull in), fetched by a bounded thread
+# pool with a cap on connections per host. Resources are content-addressed blobs, so files shared
+# between captures are stored once; the saved HTML and CSS point at saved://dlw/res/<hash>.<ext>.
+# Anything that fails or is too large keeps its web URL.
+CAPTURE_MAX_BYTES = 20 << 20
+CAPTURE_MAX_RESOURCES = 500
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)|@import\s+(['"])([^'"]+)\3""", re.I)
+ATTR_URL_RE = re.compile(r"""(\s(?:src|href|poster|data-src)\s*=\s*)(["'])(.*?)\2""", re.I | re.S)
+SRCSET_RE = re.compile(r"""(\ssrcset\s*=\s*)(["'])(.*?)\2""", re.I | re.S)
+INTEGRITY_RE = re.compile(r"""\sintegrity\s*=\s*(["']).*?\1""", re.I | re.S)  # Rewritten CSS no longer matches its hash
+
+class ResourceLinks(HTMLParser):
+    # Subresource URLs of a document, resolved against its <base>
+    SRC_TAGS = {'img', 'script', 'source', 'video', 'audio', 'input', 'embed', 'track'}
+    LINK_RELS = {'stylesheet', 'icon', 'shortcut', 'apple-touch-icon', 'preload', 'modulepreload'}
+
+    def __init__(self, base):
+        super().__init__(convert_charrefs=True)
+        self.base, self.urls, self.in_style = base, [], False
+
+    def add(self, u, base=None):
+        u = u.strip()
+        if u and not u.startswith(('data:', 'blob:', 'javascript:', '#')): self.urls.append(urljoin(base or self.base, u))
+
+    def css(self, text, base=None):
+        for m in CSS_URL_RE.finditer(text): self.add(m.group(2) or m.group(4), base)
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: v for k, v in attrs if v}
+        if tag == 'base' and 'href' in a: self.base = urljoin(self.base, a['href'])
+        if tag in self.SRC_TAGS and 'src' in a: self.add(a['src'])
+        if tag == 'link' and 'href' in a and self.LINK_RELS & set(a.get('rel', '').lower().split()): self.add(a['href'])
+        if 'poster' in a: self.add(a['poster'])
+        for part in a.get('srcset', '').split(','):
+            if part.strip(): self.add(part.split()[0])
+        if 'style' in a: self.css(a['style'])
+        self.in_style = tag == 'style'
+
+    def handle_endtag(self, tag):
+        if tag == 'style': self.in_style = False
+
+    def handle_data(self, data):
+        if self.in_style: self.css(data)
+
+def rewrite_urls(text, base, local, html=True):
+    # Points every reference to a captured URL at its local copy
+    def find(u): return local.get(urljoin(base, unescape(u.strip())))
+    def attr(m):
+        r = find(m.group(3))
+        return f"{m.group(1)}{m.group(2)}{r}{m.group(2)}" if r else m.group(0)
+    def srcset(m):
+        parts = []
+        for part in m.group(3).split(','):
+            bits = part.split(None, 1)
+            r = bits and find(bits[0])
+            parts.append(" ".join([r] + bits[1:]) if r else part)
+        return f"{m.group(1)}{m.group(2)}{','.join(parts)}{m.group(2)}"
+    def css(m):
+        r = find(m.group(2) or m.group(4))
+        if not r: return m.group(0)
+        return f'url("{r}")' if m.group(2) else f'@import "{r}"'
+    text = CSS_URL_RE.sub(css, text)
+    if html: text = SRCSET_RE.sub(srcset, ATTR_URL_RE.sub(attr, INTEGRITY_RE.sub("", text)))
+    return text
+
+class PageCapture:
+    # One capture; run() does all network and blob I/O and is meant for a background thread.
+    # The counters are read by navi://dlw while it runs.
+    def __init__(self, url, title, html, blobs, workers=8, per_host=4, user_agent=None, timeout=15):
+        self.url, self.title, self.html, self.blobs = url, title, html, blobs
+        self.workers, self.per_host, self.timeout = workers, per_host, timeout
+        self.headers = {'User-Agent': user_agent or "Mozilla/5.0", 'Referer': url}
+        self.id, self.state, self.error = None, 'running', None
+        self.total = self.fetched = self.failed = self.bytes = 0
+        self.local, self.resources = {}, {}  # url -> saved://dlw/res/<hash>.<ext>, url -> hash
+        self.hash, self.size = None, 0
+        self.hosts, self.lock = {}, threading.Lock()
+        self.pins = []  # Every blob this capture stored; pinned until the store has recorded them
+
+    def put(self, data):
+        # Pinned before the write: a delete of an older capture sharing the blob must not remove it
+        h = self.blobs.hash(data)
+        self.blobs.pin(h)
+        with self.lock: self.pins.append(h)
+        return self.blobs.put(data, h)
+
+    def progress(self):
+        return {'id': self.id, 'state': self.state, 'total': self.total, 'done': self.fetched + self.failed,
+                'status': f"{self.fetched + self.failed} of {self.total} resources · {self.bytes / 1048576:.1f} MB" + (f" · {self.failed} failed" if self.failed else "")}
+
+    def host_slot(self, u):
+        host = urlsplit(u).netloc
+        with self.lock:
+            if host not in self.hosts: self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    @staticmethod
+    def extension(u, ctype):
+        # The extension picks the content type navi:// serves the copy with
+        ext = mimetypes.guess_extension(ctype) if ctype != 'application/octet-stream' else None
+        if not ext:
+            ext = os.path.splitext(urlsplit(u).path)[1].lower()
+            if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext) or not mimetypes.guess_type("x" + ext)[0]: ext = ".bin"
+        return ext
+
+    def fetch(self, u):
+        # (body, content type), or None when it can't be captured
+        try:
+            with self.host_slot(u):
+                with urllib.request.urlopen(urllib.request.Request(u, headers=self.headers), timeout=self.timeout) as r:
+                    body, ctype = r.read(CAPTURE_MAX_BYTES + 1), r.headers.get_content_type()
+            if len(body) > CAPTURE_MAX_BYTES: raise ValueError("too large")
+        except Exception:
+            with self.lock: self.failed += 1
+            return None
+        with self.lock: self.fetched += 1; self.bytes += len(body)
+        return body, ctype
+
+    def grab(self, u):
+        # Stylesheets come back for rewriting; everything else is stored as fetched
+        got = self.fetch(u)
+        if not got: return None
+        body, ctype = got
+        if ctype == 'text/css' or urlsplit(u).path.lower().endswith(".css"): return body
+        h = self.put(body)
+        with self.lock: self.resources[u] = h; self.local[u] = f"{SAVED_ORIGIN}/res/{h}{self.extension(u, ctype)}"
+        return None
+
+    def run(self):
+        try:
+            links = ResourceLinks(self.url); links.feed(self.html); links.close()
+            seen, sheets, pending = set(), {}, links.urls
+            with ThreadPoolExecutor(self.workers) as pool:
+                # One round per level: the page's resources, then what its stylesheets import, and so on
+                while pending:
+                    batch = [u for u in dict.fromkeys(pending) if u.startswith(("http://", "https://")) and u not in seen][:CAPTURE_MAX_RESOURCES - len(seen)]
+                    seen.update(batch); self.total += len(batch)
+                    found = ResourceLinks(self.url)
+                    for u, css in zip(batch, pool.map(self.grab, batch)):
+                        if css is not None:
+                            sheets[u] = css.decode('latin-1')  # Lossless, and url() syntax is ASCII
+                            found.css(sheets[u], u)
+                    pending = found.urls
+            # Deepest stylesheets first, so an @import already points at the rewritten copy
+            for u, text in reversed(list(sheets.items())):
+                h = self.put(rewrite_urls(text, u, self.local, html=False).encode('latin-1'))
+                self.resources[u] = h; self.local[u] = f"{SAVED_ORIGIN}/res/{h}.css"
+            page = rewrite_urls(self.html, links.base, self.local).encode()
+            self.hash, self.size = self.put(page), len(page)
+            self.bytes += len(page)
+            self.state = 'done'
+        except Exception as e:
+            self.state, self.error = 'failed', str(e)
+        return self
+
+# --- Browser Import ---
+# History from Chromium `History` and Firefox `places.sqlite` files, and bookmarks from Firefox and
+# Netscape bookmark HTML exports. Sources are read as cursors, in batches, on a background thread:
+# visits are staged on the store's writer and merged into the history in one pass at the end, and
+# bookmarks become one personal site page. Memory stays bounded by the batch size whatever the source holds.
+CHROME_EPOCH = 11644473600  # Seconds from 1601-01-01 (Chromium's epoch) to 1970-01-01
+IMPORT_SCHEMES = ("http://", "https://", "file://", "ftp://")
+
+class BookmarkParser(HTMLParser):
+    # Netscape bookmark files: <DT><H3>Folder</H3><DL><p> <DT><A HREF="..." ADD_DATE="...">Title</A> ... </DL>
+    def __init__(self, add):
+        super().__init__(convert_charrefs=True)
+        self.add, self.folders, self.next_folder = add, [], None
+        self.text, self.link = None, None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == 'h3': self.text = []
+        elif tag == 'dl': self.folders.append(self.next_folder); self.next_folder = None
+        elif tag == 'a' and a.get('href'): self.link, self.text = a, []
+
+    def handle_endtag(self, tag):
+        if tag == 'h3' and self.text is not None: self.next_folder, self.text = "".join(self.text).strip(), None
+        elif tag == 'dl' and self.folders: self.folders.pop()
+        elif tag == 'a' and self.link is not None:
+            folder = " / ".join(f for f in self.folders if f)
+            self.add(folder, "".join(self.text).strip(), self.link['href'], self.link.get('add_date'))
+            self.link, self.text = None, None
+
+    def handle_data(self, data):
+        if self.text is not None: self.text.append(data)
+
+class BrowserImport:
+    # One import; run() is meant for a background thread and navi://import reads the counters meanwhile
+    BATCH = 5000
+
+    def __init__(self, path, store, limit):
+        self.path, self.store, self.limit = path, store, limit
+        self.id, self.kind, self.state, self.error = None, None, 'running', None
+        self.done = self.total = 0  # Progress, in source rows (or bytes for bookmark files)
+        self.visits = self.skipped = self.imported = self.bookmarks = 0
+        self.seen_bookmarks, self.folder, self.page = set(), None, []  # The bookmarks site, built as rows arrive
+        self.site = None  # Its domain, once on_import_done has saved it
+
+    def progress(self):
+        return {'id': self.id, 'state': self.state, 'done': self.done, 'total': self.total, 'status': self.status()}
+
+    def status(self):
+        if self.state == 'failed': return f"Failed: {self.error}"
+        parts = [f"{self.visits} visits read"] if self.kind in ('chromium', 'firefox') else []
+        if self.state == 'done' and self.kind != 'bookmarks': parts.append(f"{self.imported} added to history, {self.skipped} skipped as already in history or non-web URLs")
+        if self.bookmarks: parts.append(f"{self.bookmarks} bookmarks")
+        return " · ".join(parts) or "Starting..."
+
+    def detect(self):
+        with open(self.path, 'rb') as f: head = f.read(4096)
+        if head.startswith(b"SQLite format 3\0"):
+            tables = {r[0] for r in self.source().execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'moz_places' in tables: return 'firefox'
+            if {'urls', 'visits'} <= tables: return 'chromium'
+            raise ValueError("not a Chromium or Firefox history database")
+        if b"<dl" in head.lower() or b"netscape-bookmark-file" in head.lower(): return 'bookmarks'
+        raise ValueError("not a browser history database or bookmarks file")
+
+    def source(self):
+        if not hasattr(self, 'db'): self.db = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+        return self.db
+
+    def run(self):
+        try:
+            self.kind = self.detect()
+            if self.kind == 'chromium':
+                self.import_visits("SELECT COUNT(*) FROM visits", "SELECT u.url, u.title, v.visit_time / 1000000.0 - ? FROM visits v JOIN urls u ON u.id = v.url ORDER BY v.visit_time DESC LIMIT ?", CHROME_EPOCH)
+            elif self.kind == 'firefox':
+                self.import_visits("SELECT COUNT(*) FROM moz_historyvisits", "SELECT p.url, p.title, v.visit_date / 1000000.0 - ? FROM moz_historyvisits v JOIN moz_places p ON p.id = v.place_id ORDER BY v.visit_date DESC LIMIT ?", 0)
+                rows = self.source().execute("SELECT f.title, b.title, p.url, b.dateAdded / 1000000 FROM moz_bookmarks b JOIN moz_places p ON p.id = b.fk LEFT JOIN moz_bookmarks f ON f.id = b.parent WHERE b.type = 1 ORDER BY b.parent, b.position")
+                for folder, title, url, added in rows: self.add_bookmark(folder or "", title, url, added)
+            else: self.import_bookmark_file()
+            self.state = 'done'
+        except Exception as e:
+            self.state, self.error = 'failed', str(e)
+        finally:
+            if hasattr(self, 'db'): self.db.close()
+        return self
+
+    def import_visits(self, count, query, epoch):
+        # Newest first, because only the newest `limit` visits would survive the merge anyway
+        self.total = min(self.source().execute(count).fetchone()[0], self.limit)
+        rows = self.source().execute(query, (epoch, self.limit))
+        while True:
+            chunk = rows.fetchmany(self.BATCH)
+            if not chunk: break
+            batch = []
+            for url, title, t in chunk:
+                self.visits += 1
+                # Every visit is kept, repeats of a page included, so frecency sees how often it was visited
+                if not url.startswith(IMPORT_SCHEMES): self.skipped += 1; continue
+                batch.append((url, title or "", t, urlsplit(url).hostname or ''))
+            self.store.stage_import_visits(batch)
+            self.store.writer.flush()  # Backpressure: never more than one batch waiting on the writer
+            self.done += len(chunk)
+        result = {}
+        self.store.merge_import_visits(self.limit, result)
+        self.store.writer.flush()
+        self.imported = result.get('imported', 0)
+        self.skipped += result.get('duplicates', 0)
+
+    def import_bookmark_file(self):
+        self.total = os.path.getsize(self.path)
+        parser = BookmarkParser(self.add_bookmark)
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b""):
+                parser.feed(decoder.decode(block))
+                self.done += len(block)
+        parser.feed(decoder.decode(b"", final=True)); parser.close()
+
+    def add_bookmark(self, folder, title, url, added=None):
+        if not url or not url.startswith(IMPORT_SCHEMES) or url in self.seen_bookmarks: return
+        self.seen_bookmarks.add(url); self.bookmarks += 1
+        if folder != self.folder:
+            if self.folder is not None: self.page.append("</ul>")
+            self.page.append(f"<h2>{escape(folder or 'Bookmarks')}</h2><ul>"); self.folder = folder
+        # Keep the source's date in Netscape form, so the page can be imported again elsewhere
+        try: stamp = f' ADD_DATE="{int(float(added))}"' if added else ""
+        except ValueError: stamp = ""
+        self.page.append(f"""<li><a href="{escape(url)}"{stamp}>{escape(title or url)}</a></li>""")
+
+    def site_html(self):
+        name = os.path.basename(self.path)
+        return (f"""<!doctype html><html><head><meta charset="utf-8"><title>Imported Bookmarks</title><style>body{{font-family:sans-serif;max-width:900px;margin:30px auto}} li{{margin:3px 0}}</style></head>"""
+                f"""<body><h1>🔖 Imported Bookmarks</h1><p><small>{self.bookmarks} bookmarks from {escape(name)}</small></p>{"".join(self.page)}{"</ul>" if self.page else ""}</body></html>""")
 
 # --- Internal Pages Generator ---
 class InternalPages:
+    TAIL = "</div></body></html>"
+    # navi.call(method, ...args) resolves to the bridge's JSON reply. navi.act() is for links:
+    # with the bridge it runs the call and hands the reply to done(), without it the link navigates.
+    BRIDGE_JS = """<script src="navi://bridge/qwebchannel.js"></script><script>
+    const navi = {
+      api: new Promise(ok => window.qt && qt.webChannelTransport ? new QWebChannel(qt.webChannelTransport, ch => ok(ch.objects.navi)) : ok(null)),
+      async call(method, ...args) {
+        const api = await navi.api;
+        if (!api) throw new Error('navi bridge unavailable');
+        return new Promise(ok => api[method](...args, r => ok(JSON.parse(r))));
+      },
+      act(ev, method, args, done) {
+        if (!(window.qt && qt.webChannelTransport)) return true;
+        ev.preventDefault(); navi.call(method, ...args).then(done || (() => {})); return false;
+      },
+    };</script>"""
+
     @staticmethod
+    @lru_cache(maxsize=None)
     def css(theme):
         # Map theme to basic colors for HTML
         is_dark = theme in ["dark", "christmas", "halloween"]
@@ -118,7 +1812,35 @@ class InternalPages:
         """
 
     @staticmethod
-    def home(theme, notes, navits, widgets_unlocked):
+    @lru_cache(maxsize=None)
+    def head(theme):
+        # Page skeleton up to the container, built once per theme
+        return f"""<html><head><meta charset="utf-8"><style>{InternalPages.css(theme)}</style>{InternalPages.BRIDGE_JS}</head><body><div class="container">"""
+
+    @staticmethod
+    def page(theme, body):
+        return InternalPages.head(theme) + body + InternalPages.TAIL
+
+    # Background jobs (captures, imports) show as .job cards; poll_jobs keeps them current from a bridge
+    # method returning [{id, state, done, total, status}] and reloads once one is finished or gone
+    @staticmethod
+    def job_card(job_id, title, done, total, status):
+        return f"""<div class="card job" id="job-{job_id}"><h3>{title}</h3><progress max="{max(total, 1)}" value="{done}" style="width:100%"></progress><p><small class="status">{escape(status)}</small></p></div>"""
+
+    @staticmethod
+    def poll_jobs(method):
+        return """<script>(function poll() { setTimeout(() => navi.call('%s').then(jobs => {
+      for (const el of document.querySelectorAll('.job')) {
+        const j = jobs.find(j => 'job-' + j.id === el.id);
+        if (!j || j.state !== 'running') return location.reload();
+        const bar = el.querySelector('progress'); bar.max = Math.max(j.total, 1); bar.value = j.done;
+        el.querySelector('.status').textContent = j.status;
+      }
+      poll();
+    }), 500); })();</script>""" % method
+
+    @staticmethod
+    def home(theme, notes, notes_version, navits, widgets_unlocked):
         extra_widgets = ""
         if widgets_unlocked:
             extra_widgets = """
@@ -132,10 +1854,37 @@ class InternalPages:
             </div>
             """
         
-        return f"""<html><head><style>{InternalPages.css(theme)}</style>
+        return f"""<html><head><meta charset="utf-8"><style>{InternalPages.css(theme)}</style>{InternalPages.BRIDGE_JS}
         <script>
             setInterval(() => document.getElementById('clock').innerText = new Date().toLocaleTimeString(), 1000);
-            function saveNotes(val) {{ window.location = 'navi://save_notes/' + encodeURIComponent(val); }}
+            // Notes are sent 400 ms after typing stops, as one splice (start, deleted, inserted)
+            // in code points against the last version the browser acknowledged
+            const notes = {{
+                version: {notes_version}, sent: '', timer: 0, busy: false, again: false,
+                changed(ta) {{ clearTimeout(notes.timer); notes.timer = setTimeout(() => notes.flush(ta), 400); }},
+                async flush(ta) {{
+                    clearTimeout(notes.timer);
+                    if (!(window.qt && qt.webChannelTransport)) {{ window.location = 'navi://save_notes/' + encodeURIComponent(ta.value); return; }}
+                    if (notes.busy) {{ notes.again = true; return; }}
+                    const a = Array.from(notes.sent), b = Array.from(ta.value);
+                    let p = 0; while (p < a.length && p < b.length && a[p] === b[p]) p++;
+                    let q = 0; while (q < a.length - p && q < b.length - p && a[a.length - 1 - q] === b[b.length - 1 - q]) q++;
+                    if (p === a.length && p === b.length) return;
+                    notes.busy = true;
+                    const value = ta.value;
+                    const r = await navi.call('editNotes', notes.version, p, a.length - p - q, b.slice(p, b.length - q).join(''));
+                    notes.busy = false;
+                    if (r.version === undefined) return;
+                    // Behind another tab's edits: rebase on the stored text, then resend this textarea's
+                    notes.version = r.version; notes.sent = r.ok ? value : r.text;
+                    if (!r.ok || notes.again) {{ notes.again = false; notes.flush(ta); }}
+                }},
+            }};
+            document.addEventListener('DOMContentLoaded', () => {{
+                const ta = document.getElementById('notes');
+                notes.sent = ta.value;
+                addEventListener('pagehide', () => notes.flush(ta));
+            }});
         </script>
         </head><body>
         <div class="container">
@@ -144,7 +1893,7 @@ class InternalPages:
             <div class="widget-grid">
                 <div class="card">
                     <h3>📝 Notes</h3>
-                    <textarea style="height: 150px; resize: none;" oninput="saveNotes(this.value)">{notes}</textarea>
+                    <textarea id="notes" style="height: 150px; resize: none;" oninput="notes.changed(this)">{escape(notes)}</textarea>
                 </div>
                 {extra_widgets}
                 <div class="card" style="text-align:center;">
@@ -196,9 +1945,20 @@ class CodeEditorWindow(QWidget):
             l.addWidget(QLabel("Title:")); l.addWidget(self.title_input)
 
         self.content_input = QTextEdit()
+        if self.mode == "ext": self.content_input.setPlaceholderText("// @match https://example.com/*\n// @run-at document-start\n")
         l.addWidget(QLabel("Code:"))
         l.addWidget(self.content_input)
 
+        if self.mode == "site":
+            # Files are staged here and written on Save, each as its own pack entry
+            self.added, self.removed = {}, set()
+            self.files_list = QListWidget(); self.files_list.setMaximumHeight(120)
+            row = QHBoxLayout()
+            for t, f in [("Add Files...", self.add_files), ("Remove", self.remove_file)]:
+                b = QPushButton(t); b.clicked.connect(f); row.addWidget(b)
+            l.addWidget(QLabel("Files (reference them by name, e.g. <img src=\"logo.png\">):"))
+            l.addWidget(self.files_list); l.addLayout(row)
+
         btn = QPushButton("Save"); btn.setStyleSheet("background:#198754;color:white;padding:10px;")
         btn.clicked.connect(self.save)
         l.addWidget(btn)
@@ -214,6 +1974,8 @@ class CodeEditorWindow(QWidget):
                 self.name_input.setText(self.key_to_edit.replace(suffix, ""))
                 self.title_input.setText(d['title'])
                 self.content_input.setText(d['html_content'])
+                store = self.browser_main.store
+                if self.key_to_edit in store.site_files: self.files_list.addItems(sorted(store.site_files[self.key_to_edit]))
         else:
             d = self.browser_main.data['extensions'].get(self.key_to_edit)
             if d: self.name_input.setText(self.key_to_edit); self.content_input.setText(d['code'])
@@ -227,62 +1989,127 @@ class CodeEditorWindow(QWidget):
             suffix = self.browser_main.data['settings'].get('custom_suffix', '.pw-navi')
             full = f"{n.lower()}{suffix}" if not n.endswith(suffix) else n.lower()
             self.browser_main.data['sites'][full] = {'domain': full, 'title': self.title_input.text(), 'html_content': c}
+            self.browser_main.store.put_site(full, self.browser_main.data['sites'][full])
+            for path in self.removed: self.browser_main.store.delete_site_file(full, path)
+            for path, data in self.added.items(): self.browser_main.store.put_site_file(full, path, data)
+            self.browser_main.record_visit(full, self.title_input.text(), None, 4.0)
             self.browser_main.add_new_tab(QUrl(f"local://{full}/"))
         else:
             self.browser_main.data['extensions'][n] = {'code': c, 'active': True}
+            self.browser_main.store.put_extension(n, self.browser_main.data['extensions'][n])
+            self.browser_main.extensions.refresh(n)
         
-        self.browser_main.save_to_disk()
         self.close()
 
+    def add_files(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "Add Files")
+        for p in paths:
+            name = os.path.basename(p)
+            try:
+                with open(p, 'rb') as f: self.added[name] = f.read()
+            except OSError as e: QMessageBox.warning(self, "Error", str(e)); continue
+            self.removed.discard(name)
+            if not self.files_list.findItems(name, Qt.MatchExactly): self.files_list.addItem(name)
+
+    def remove_file(self):
+        item = self.files_list.currentItem()
+        if not item: return
+        name = item.text()
+        self.added.pop(name, None); self.removed.add(name)
+        self.files_list.takeItem(self.files_list.row(item))
+
 # --- Browser Tab ---
 class BrowserTab(QWebEngineView):
-    def __init__(self, parent_window):
+    # Counts the page's subresources as served from cache (no bytes on the wire) or fetched.
+    # Cross-origin entries without Timing-Allow-Origin report zero sizes and are skipped.
+    CACHE_PROBE = """(() => { let h = 0, m = 0, b = 0;
+      for (const e of performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))) {
+        if (!e.decodedBodySize) continue;
+        if (e.transferSize === 0) { h++; b += e.decodedBodySize; } else m++;
+      } return [h, m, b]; })()"""
+    # Navigation Timing and paint entries, in ms since navigation start (only run while recording)
+    PAINT_PROBE = """(() => { const n = performance.getEntriesByType('navigation')[0], r = {};
+      if (n) { r['ttfb'] = n.responseStart; r['dom-content-loaded'] = n.domContentLoadedEventEnd; r['load-event'] = n.loadEventEnd; }
+      for (const p of performance.getEntriesByType('paint')) r[p.name] = p.startTime;
+      return r; })()"""
+    SERIAL = itertools.count(1)
+
+    def __init__(self, parent_window, private=False):
         super().__init__()
         self.parent_window = parent_window
+        self.private = private
+        self.serial = next(self.SERIAL)  # Trace thread id
+        self.load_started = None
+        self.load_t0 = None  # Always timed, unlike load_started, for the performance profile figures
+        self.blocked = 0  # Requests blocked since the last main-frame load
+        self.loaded_at = None  # Epoch ms of the last successful load; keys the tab's thumbnail
         
-        # Youtube Timer
-        self.yt_timer = QTimer(self)
-        self.yt_timer.timeout.connect(self.check_youtube_watch)
-        self.yt_timer.start(60000) # Check every minute
+        # Youtube watch time, counted by the parent window's scheduler
         self.yt_minutes = 0
         self.current_yt_url = ""
 
-        # Profile
-        p = QWebEngineProfile.defaultProfile()
-        p.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+        self.setPage(NaviWebPage(parent_window.private_profile if private else parent_window.profile, self))
         self.settings().setAttribute(QWebEngineSettings.PluginsEnabled, True)
         self.settings().setAttribute(QWebEngineSettings.JavascriptEnabled, True)
         self.settings().setAttribute(QWebEngineSettings.LocalStorageEnabled, True)
 
-        self.setPage(NaviWebPage(self))
+        self.page().loadStarted.connect(self.on_load_started)
+        if hasattr(self.page(), 'setUrlRequestInterceptor'):
+            self.interceptor = NaviRequestInterceptor(self, parent_window.blocker)
+            self.page().setUrlRequestInterceptor(self.interceptor)
         self.page().loadFinished.connect(self.on_load_finished)
         self.urlChanged.connect(self.on_url_changed)
+        self.page().recentlyAudibleChanged.connect(lambda _: self.parent_window.update_watch_tracking())
+        self.restore_scroll = None  # Set when a discarded tab is brought back
+        self.restoring = False  # The next load is that tab's reload, not a new visit
+
+    def is_watching_youtube(self):
+        u = self.url()
+        return (u.host() == "youtube.com" or u.host().endswith(".youtube.com")) and u.path() == "/watch"
 
     def on_url_changed(self, url):
         u_str = url.toString()
-        if "youtube.com/watch" not in u_str:
+        if not self.is_watching_youtube():
             self.yt_minutes = 0
             self.current_yt_url = ""
         else:
             if u_str != self.current_yt_url:
                 self.yt_minutes = 0
                 self.current_yt_url = u_str
+        self.parent_window.update_watch_tracking()
 
     def check_youtube_watch(self):
-        if "youtube.com/watch" in self.url().toString():
-            self.yt_minutes += 1
-            if self.yt_minutes == 15:
-                self.parent_window.add_navits(1, "Watched YouTube (15m)")
-                self.yt_minutes = 0 # Reset or keep counting? Let's reset for "every 15m" logic
+        self.yt_minutes += 1
+        if self.yt_minutes == 15:
+            self.parent_window.add_navits(1, "Watched YouTube (15m)")
+            self.yt_minutes = 0 # Reset or keep counting? Let's reset for "every 15m" logic
+
+    def on_load_started(self):
+        self.load_started = self.parent_window.perf.start()
+        self.load_t0 = time.perf_counter()
+        self.blocked = 0
 
     def on_load_finished(self, ok):
+        perf = self.parent_window.perf
+        started, self.load_started = self.load_started, None
+        perf.end(started, 'load', 'page load', tab=self.serial, host=self.url().host() or self.url().scheme(), ok=ok)
+        t0, self.load_t0 = self.load_t0, None
+        restoring, self.restoring = self.restoring, False
         if not ok: return
+        self.loaded_at = int(time.time() * 1000)
+        if t0 is not None and self.url().scheme() in ("http", "https"): self.parent_window.track_profile(loads=1, load_ms=(time.perf_counter() - t0) * 1000)
+        t0 = perf.start()
+        if self.restore_scroll is not None:
+            self.page().runJavaScript("window.scrollTo(%d, %d)" % self.restore_scroll)
+            self.restore_scroll = None
         
-        # Extensions
-        for name, ext in self.parent_window.data['extensions'].items():
-            if ext['active']: self.page().runJavaScript(ext['code'])
-        
-        # History & Navits (Search Rewards)
+        # History & Navits (Search Rewards); bringing back a discarded tab is not a new visit
+        if not restoring: self.record_visit()
+        perf.end(t0, 'load', 'on_load_finished', tab=self.serial)
+        if started is not None and self.url().scheme() in ("http", "https"):
+            self.page().runJavaScript(self.PAINT_PROBE, lambda r: perf.page_metrics(r, started, self.serial))
+
+    def record_visit(self):
         url = self.url().toString()
         host = self.url().host()
         
@@ -291,33 +2118,565 @@ class BrowserTab(QWebEngineView):
         elif "duckduckgo.com" in host: self.parent_window.attempt_search_reward(1)
         elif "ecosia.org" in host: self.parent_window.attempt_search_reward(2)
 
-        if not url.startswith("local://") and not url.startswith("navi://"):
+        if not url.startswith(("local://", "navi://", "saved://")) and not self.private:
             self.parent_window.add_to_history(url, self.title())
+            self.page().runJavaScript(self.CACHE_PROBE, self.parent_window.record_cache_probe)
 
     def createWindow(self, _type): return self.parent_window.add_new_tab()
 
+class TabPlaceholder(QWidget):
+    # Stands in for a restored session tab; NaviBrowser swaps in a BrowserTab on first selection
+    private = False
+
+    def __init__(self, url, title, loaded_at=None):
+        super().__init__()
+        self.qurl, self.label, self.loaded_at = QUrl(url), title, loaded_at
+        self.serial = next(BrowserTab.SERIAL)
+        l = QVBoxLayout(self); l.addWidget(QLabel(f"Loading {url}...", alignment=Qt.AlignCenter))
+
+    def url(self): return self.qurl
+    def title(self): return self.label
+    def reload(self): pass
+
+# --- Scheduler ---
+# All periodic work in one place: a heap of deadlines and a single QTimer armed for the
+# earliest one. With nothing scheduled the timer is stopped, so an idle browser never wakes.
+class Scheduler(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.heap, self.jobs, self.cooldowns = [], {}, {}
+        self.seq = itertools.count()
+        self.wakeups = 0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)  # A coarse timer may fire early and spin
+        self.timer.timeout.connect(self.run_due)
+
+    def schedule(self, name, delay, fn, repeat=None):
+        # Replaces any pending job with the same name
+        self.cancel(name)
+        job = [time.monotonic() + delay, next(self.seq), name, fn, repeat]
+        self.jobs[name] = job
+        heapq.heappush(self.heap, job)
+        self.arm()
+
+    def cancel(self, name):
+        job = self.jobs.pop(name, None)
+        if job: job[3] = None  # Dropped from the heap lazily
+        self.arm()
+
+    def pending(self, name):
+        return name in self.jobs
+
+    def try_cooldown(self, name, seconds):
+        # Rate limits are deadline bookkeeping only and never arm the timer
+        now = time.time()
+        if now < self.cooldowns.get(name, 0): return False
+        self.cooldowns[name] = now + seconds
+        return True
+
+    def arm(self):
+        while self.heap and self.heap[0][3] is None: heapq.heappop(self.heap)
+        if not self.heap: self.timer.stop(); return
+        self.timer.start(max(0, math.ceil((self.heap[0][0] - time.monotonic()) * 1000)))
+
+    def run_due(self):
+        self.wakeups += 1
+        now = time.monotonic()
+        while self.heap and self.heap[0][0] <= now:
+            deadline, _, name, fn, repeat = heapq.heappop(self.heap)
+            if fn is None: continue
+            if repeat:
+                # Periods missed while suspended are dropped, so a job runs at most once per wakeup
+                job = [max(deadline + repeat, now + repeat), next(self.seq), name, fn, repeat]
+                self.jobs[name] = job
+                heapq.heappush(self.heap, job)
+            else: self.jobs.pop(name, None)
+            try: fn()
+            except Exception as e: print(f"Error in scheduled job {name}: {e}")
+        self.arm()
+
+# --- Instrumentation ---
+# Timing samples in a bounded ring, shown at navi://perf. When recording is off start()
+# returns None and end() returns straight away, so instrumented paths cost one call.
+class PerfRecorder:
+    def __init__(self, capacity=5000, enabled=False):
+        self.enabled = enabled
+        self.samples = deque(maxlen=capacity)  # (category, name, start, duration ms, args)
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def end(self, t0, cat, name, **args):
+        if t0 is None: return
+        self.samples.append((cat, name, t0, (time.perf_counter() - t0) * 1000, args))
+
+    def add(self, cat, name, t0, ms, **args):
+        if self.enabled: self.samples.append((cat, name, t0, ms, args))
+
+    def page_metrics(self, r, t0, tab):
+        # Navigation Timing values are relative to navigation start, which is close to loadStarted
+        if not isinstance(r, dict): return
+        for name, ms in r.items():
+            if isinstance(ms, (int, float)) and ms > 0: self.add('page', name, t0, float(ms), tab=tab)
+
+    def summary(self):
+        # [(category, name, count, p50, p90, p99, max)]
+        groups = defaultdict(list)
+        for cat, name, _, ms, _ in self.samples: groups[(cat, name)].append(ms)
+        rows = []
+        for key, v in sorted(groups.items()):
+            v.sort()
+            pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+            rows.append((*key, len(v), pick(.5), pick(.9), pick(.99), v[-1]))
+        return rows
+
+    def to_json(self):
+        return json.dumps([{'cat': c, 'name': n, 'start_ms': (t - STARTUP_T0) * 1000, 'ms': ms, 'args': a}
+                           for c, n, t, ms, a in self.samples])
+
+    def to_trace(self):
+        # Chrome trace event format (chrome://tracing, ui.perfetto.dev); one track per tab
+        pid = os.getpid()
+        return json.dumps({'displayTimeUnit': 'ms', 'traceEvents': [
+            {'name': n, 'cat': c, 'ph': 'X', 'ts': (t - STARTUP_T0) * 1e6, 'dur': ms * 1000, 'pid': pid, 'tid': a.get('tab', 0), 'args': a}
+            for c, n, t, ms, a in self.samples]})
+
+# --- Tab Lifecycle ---
+def process_rss(pid):
+    # Resident memory of a process in bytes (Linux); 0 where it cannot be read
+    try:
+        with open(f"/proc/{pid}/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError): return 0
+
+# Background tabs are frozen after a while and discarded least recently used first once
+# there are more than max_live of them or their renderers exceed the memory budget.
+# A discarded page drops its renderer but keeps URL, title and navigation history;
+# Qt brings it back to Active (reloading it) when it is shown again.
+class TabLifecycleManager:
+    SUPPORTED = hasattr(QWebEnginePage, 'LifecycleState')
+
+    def __init__(self, tabs, max_live=8, budget_mb=0, freeze_after=300):
+        self.tabs = tabs
+        self.max_live, self.budget, self.freeze_after = max_live, budget_mb * 1024 * 1024, freeze_after
+        self.last_active = {}
+        self.discarded = self.reclaimed = 0
+
+    def state(self, tab):
+        return tab.page().lifecycleState()
+
+    def activated(self, tab):
+        self.last_active[tab] = time.monotonic()
+        if not self.SUPPORTED: return
+        if self.state(tab) != QWebEnginePage.LifecycleState.Active:
+            tab.page().setLifecycleState(QWebEnginePage.LifecycleState.Active)
+        self.enforce()
+
+    def closed(self, tab):
+        self.last_active.pop(tab, None)
+
+    def background(self):
+        current = self.tabs.currentWidget()
+        tabs = [self.tabs.widget(i) for i in range(self.tabs.count())]
+        return [t for t in tabs if t is not current and isinstance(t, QWebEngineView)]
+
+    def enforce(self):
+        if not self.SUPPORTED: return
+        Lifecycle = QWebEnginePage.LifecycleState
+        now = time.monotonic()
+        live = sorted((t for t in self.background() if self.state(t) != Lifecycle.Discarded),
+                      key=lambda t: self.last_active.get(t, 0))
+        # Audible tabs are left alone, whatever their age
+        live = [t for t in live if not t.page().recentlyAudible()]
+        for t in live:
+            if self.state(t) == Lifecycle.Active and now - self.last_active.get(t, 0) > self.freeze_after:
+                t.page().setLifecycleState(Lifecycle.Frozen)
+        rss = {t: self.renderer_rss(t) for t in live} if self.budget else {}
+        while live and (len(live) + 1 > self.max_live or (self.budget and sum(rss[t] for t in live) > self.budget)):
+            self.discard(live.pop(0), live)
+
+    def renderer_rss(self, tab):
+        pid = tab.page().renderProcessPid() if hasattr(tab.page(), 'renderProcessPid') else 0
+        return process_rss(pid) if pid else 0
+
+    def discard(self, tab, others=()):
+        page = tab.page()
+        pos = page.scrollPosition()
+        tab.restore_scroll, tab.restoring = (int(pos.x()), int(pos.y())), True
+        # A renderer shared with another live tab (same site) stays up; don't count it
+        pid = page.renderProcessPid() if hasattr(page, 'renderProcessPid') else 0
+        shared = pid and any(o.page().renderProcessPid() == pid for o in others)
+        freed = 0 if shared else self.renderer_rss(tab)
+        page.setLifecycleState(QWebEnginePage.LifecycleState.Discarded)
+        self.discarded += 1
+        self.reclaimed += freed
+
+    def stats(self):
+        if not self.SUPPORTED: return {'live': self.tabs.count(), 'discarded': 0, 'frozen': 0, 'reclaimed_mb': 0.0}
+        states = [self.state(t) for t in self.background()]
+        Lifecycle = QWebEnginePage.LifecycleState
+        return {'live': self.tabs.count() - states.count(Lifecycle.Discarded), 'discarded': states.count(Lifecycle.Discarded),
+                'frozen': states.count(Lifecycle.Frozen), 'reclaimed_mb': self.reclaimed / 1048576}
+
+# --- Tab Thumbnails ---
+# Snapshots for navi://tabs. A tab is grabbed on the GUI thread as it is left; scaling, JPEG encoding
+# and the file write run on one worker thread. Entries are keyed by URL and the time the page last
+# finished loading (the file's mtime on disk), so a tab never shows an older page than it has.
+# Private tabs are kept in memory only.
+class ThumbnailCache(QObject):
+    WIDTH = 320
+    ready = pyqtSignal(str, object, object)
+
+    def __init__(self, root=THUMB_DIR, mem_mb=16, disk_mb=64):
+        super().__init__()
+        self.root, self.disk_bytes, self.disk_size = root, disk_mb << 20, None
+        self.mem = ByteLRU(mem_mb << 20)
+        self.stamps = {}  # URL -> stamp of its entry in mem
+        self.pool = ThreadPoolExecutor(1, thread_name_prefix="navi-thumbs")
+        self.ready.connect(self.remember)
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.root, hashlib.sha1(url.encode()).hexdigest() + ".jpg")
+
+    def capture(self, url, stamp, image, private=False):
+        # image is a QImage; QImage is copy-on-write, so the worker can scale it safely
+        self.pool.submit(self.encode, url, stamp, image, private)
+
+    def encode(self, url, stamp, image, private):
+        if image.isNull(): return
+        if image.width() > self.WIDTH: image = image.scaledToWidth(self.WIDTH, Qt.SmoothTransformation)
+        buf = QBuffer(); buf.open(QIODevice.WriteOnly)
+        if not image.save(buf, "JPEG", 80): return
+        data = bytes(buf.data())
+        self.ready.emit(url, stamp, data)
+        if not private: self.write(url, stamp, data)
+
+    def write(self, url, stamp, data):
+        path = self.path(url)
+        try:
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            atomic_write(path, data)
+            os.utime(path, ns=(stamp * 1000000, stamp * 1000000))
+        except OSError as e:
+            print(f"Thumbnail not saved: {e}"); return
+        self.disk_size = dir_size(self.root) if self.disk_size is None else self.disk_size + len(data) - old
+        if self.disk_size > self.disk_bytes: self.evict()
+
+    def evict(self):
+        # Least recently loaded pages first, down to 3/4 of the cap so this doesn't run on every write
+        files = []
+        for e in os.scandir(self.root):
+            try: st = e.stat(); files.append((st.st_mtime_ns, st.st_size, e.path))
+            except OSError: pass
+        for _, size, path in sorted(files):
+            if self.disk_size <= self.disk_bytes * 3 // 4: break
+            try: os.remove(path); self.disk_size -= size
+            except OSError: pass
+
+    def remember(self, url, stamp, data):
+        old = self.stamps.get(url)
+        if old is not None and old != stamp: self.mem.pop((url, old))
+        self.stamps[url] = stamp
+        self.mem.put((url, stamp), data)
+
+    def on_disk(self, url, stamp):
+        try: return os.stat(self.path(url)).st_mtime_ns // 1000000 == stamp
+        except OSError: return False
+
+    def has(self, url, stamp):
+        return (url, stamp) in self.mem.items or self.on_disk(url, stamp)
+
+    def get(self, url, stamp):
+        data = self.mem.get((url, stamp))
+        if data is None and self.on_disk(url, stamp):
+            try:
+                with open(self.path(url), 'rb') as f: data = f.read()
+            except OSError: return None
+            self.remember(url, stamp, data)
+        return data
+
+    def close(self):
+        self.pool.shutdown(wait=True)  # Lets queued writes finish
+
+# --- Single Instance ---
+# One process per profile. The first launch holds a lock next to the database and listens on a
+# local socket; later launches hand their URLs over and exit, so the running process opens them
+# and only one process ever writes the store.
+def launch_urls(argv):
+    # Positional arguments, skipping our --flags and Qt's "-option value" pairs
+    urls, skip = [], False
+    for a in argv[1:]:
+        if skip: skip = False
+        elif a.startswith("--"): continue
+        elif a.startswith("-"): skip = "=" not in a
+        else: urls.append(a)
+    return urls
+
+class InstanceGuard(QObject):
+    received = pyqtSignal(list)
+
+    def __init__(self, db_path=DB_FILE):
+        super().__init__()
+        path = os.path.abspath(db_path)
+        self.name = "navi-" + hashlib.sha1(path.encode()).hexdigest()[:16]
+        self.lock = QLockFile(path + ".lock")
+        self.lock.setStaleLockTime(0)  # A lock is only stale when its process is gone
+        self.server = None
+
+    def claim(self):
+        # True when this process is the primary; QLockFile clears a lock left by a crash
+        return self.lock.tryLock(0)
+
+    def listen(self):
+        # Needs the QApplication, so it runs after claim()
+        QLocalServer.removeServer(self.name)  # Socket file left by a crash
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.accept)
+        if not self.server.listen(self.name): print(f"Error listening for other instances: {self.server.errorString()}")
+
+    def forward(self, urls, timeout=5):
+        # Blocking; the primary may still be starting, so retry until the timeout
+        payload = json.dumps(urls).encode() + b"\n"
+        deadline = time.monotonic() + timeout
+        while True:
+            sock = QLocalSocket()
+            sock.connectToServer(self.name)
+            if sock.waitForConnected(500):
+                sock.write(payload)
+                sent = sock.waitForBytesWritten(1000)
+                sock.disconnectFromServer()
+                if sent: return True
+            if time.monotonic() > deadline: return False
+            time.sleep(0.1)
+
+    def accept(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            sock.readyRead.connect(lambda s=sock: self.read(s))
+            sock.disconnected.connect(lambda s=sock: (self.read(s), s.deleteLater()))
+
+    def read(self, sock):
+        while sock.canReadLine():
+            try: urls = json.loads(bytes(sock.readLine()).decode())
+            except ValueError: continue
+            if isinstance(urls, list): self.received.emit([str(u) for u in urls])
+
+# --- Batch Mode ---
+# `--batch urls.txt --out dir/` renders URLs with no window: a pool of off-screen NaviWebPages on an
+# off-the-record profile with the active extensions installed. As each page finishes its
+# <n>.html and <n>.txt (and <n>.png with --screenshots) are written and a line goes to
+# results.jsonl; report.json gets throughput, latency percentiles and extension timings at the end.
+class BatchRunner(QObject):
+    done = pyqtSignal(dict)
+
+    def __init__(self, urls, out, profile, extensions, concurrency=4, timeout=30, retries=1, screenshots=False, settle_ms=200):
+        super().__init__()
+        # URLs are pulled lazily and nothing is kept per page but its latency, so memory stays flat
+        self.urls, self.out, self.profile, self.extensions = enumerate(urls), out, profile, extensions
+        self.concurrency, self.timeout, self.retries = max(1, concurrency), timeout, retries
+        self.screenshots, self.settle_ms = screenshots, settle_ms
+        self.latencies = array('d')
+        self.ok = self.failed = self.retried = self.bytes = self.active = 0
+        os.makedirs(out, exist_ok=True)
+        self.results = open(os.path.join(out, "results.jsonl"), "w", encoding="utf-8")
+        self.slots = []
+
+    def new_page(self, slot):
+        page = NaviWebPage(self.profile, self)
+        page.extensions = self.extensions
+        page.loadFinished.connect(lambda ok, s=slot: self.loaded(s, ok))
+        if slot['view'] is not None: slot['view'].setPage(page)
+        slot['page'] = page
+
+    def new_slot(self):
+        # One page reused URL after URL; shown in a hidden view only when screenshots are wanted
+        slot = {'page': None, 'view': None, 'timer': QTimer(self), 'job': None, 'token': 0}
+        if self.screenshots:
+            slot['view'] = QWebEngineView()
+            slot['view'].setAttribute(Qt.WA_DontShowOnScreen)
+            slot['view'].resize(1280, 900); slot['view'].show()
+        self.new_page(slot)
+        slot['timer'].setSingleShot(True)
+        slot['timer'].timeout.connect(lambda s=slot: self.fail(s, "timeout"))
+        return slot
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        self.slots = [self.new_slot() for _ in range(self.concurrency)]
+        for slot in self.slots: self.next(slot)
+        if not self.active: self.finish()
+
+    def next(self, slot):
+        job = next(self.urls, None)
+        slot['job'] = None
+        if job is None: return
+        self.active += 1
+        self.load(slot, job[0], job[1], 1, time.perf_counter())
+
+    def load(self, slot, index, url, attempt, t0):
+        # The timeout covers the whole attempt: load, settle and dump
+        slot['token'] += 1
+        slot['job'] = (index, url, attempt, t0)
+        slot['timer'].start(int(self.timeout * 1000))
+        slot['page'].load(QUrl.fromUserInput(url))
+
+    def loaded(self, slot, ok):
+        if slot['job'] is None: return
+        if not ok: return self.fail(slot, "load failed")
+        # A script redirect finishes a second load; only the last one is dumped
+        slot['token'] += 1
+        token = slot['token']
+        # Deferred (document-idle) extensions run just after the load finishes
+        QTimer.singleShot(self.settle_ms, lambda: token == slot['token'] and self.dump(slot))
+
+    def dump(self, slot):
+        token, page = slot['token'], slot['page']
+        def html_ready(html):
+            if token == slot['token']: page.toPlainText(lambda text: token == slot['token'] and self.write(slot, html, text))
+        page.toHtml(html_ready)
+
+    def write(self, slot, html, text):
+        slot['timer'].stop()
+        index, url, attempt, t0 = slot['job']
+        page, name = slot['page'], os.path.join(self.out, f"{index:06d}")
+        body = html.encode()
+        with open(name + ".html", "wb") as f: f.write(body)
+        with open(name + ".txt", "w", encoding="utf-8") as f: f.write(text)
+        files = [name + ".html", name + ".txt"]
+        if slot['view'] is not None and slot['view'].grab().save(name + ".png"): files.append(name + ".png")
+        self.record(slot, {'index': index, 'url': url, 'ok': True, 'attempts': attempt, 'ms': round((time.perf_counter() - t0) * 1000, 1),
+                           'final_url': page.url().toString(), 'title': page.title(), 'bytes': len(body), 'files': files})
+
+    def fail(self, slot, reason):
+        if slot['job'] is None: return
+        slot['timer'].stop(); slot['token'] += 1
+        index, url, attempt, t0 = slot['job']
+        if reason == "timeout":
+            # A fresh page, so the abandoned load can't finish into the next attempt
+            old = slot['page']; old.loadFinished.disconnect(); old.triggerAction(QWebEnginePage.Stop); old.deleteLater()
+            self.new_page(slot)
+        if attempt <= self.retries:
+            self.retried += 1
+            return self.load(slot, index, url, attempt + 1, t0)
+        self.record(slot, {'index': index, 'url': url, 'ok': False, 'attempts': attempt, 'ms': round((time.perf_counter() - t0) * 1000, 1), 'error': reason})
+
+    def record(self, slot, r):
+        self.results.write(json.dumps(r) + "\n"); self.results.flush()
+        if r['ok']: self.ok += 1; self.bytes += r['bytes']; self.latencies.append(r['ms'])
+        else: self.failed += 1
+        self.active -= 1
+        self.next(slot)
+        if not self.active: self.finish()
+
+    def report(self):
+        wall = time.perf_counter() - self.t0
+        lat = sorted(self.latencies)
+        pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] if lat else 0.0
+        return {
+            'urls': self.ok + self.failed, 'ok': self.ok, 'failed': self.failed, 'retries': self.retried,
+            'concurrency': self.concurrency, 'wall_s': round(wall, 3), 'pages_per_s': round(self.ok / wall, 3) if wall else 0.0,
+            'html_mb': round(self.bytes / 1048576, 3),
+            'latency_ms': {'mean': round(sum(lat) / len(lat), 1) if lat else 0.0, 'p50': pick(.5), 'p90': pick(.9), 'p99': pick(.99), 'max': lat[-1] if lat else 0.0},
+            'extensions': {n: {'runs': runs, 'avg_ms': round(total / runs, 3), 'max_ms': round(mx, 3)} for n, (runs, total, mx) in self.extensions.stats.items() if runs},
+        }
+
+    def finish(self):
+        self.results.close()
+        report = self.report()
+        atomic_write(os.path.join(self.out, "report.json"), json.dumps(report, indent=1).encode())
+        for slot in self.slots:
+            if slot['view'] is not None: slot['view'].close()
+        self.done.emit(report)
+
+def run_batch(argv):
+    # Returns the exit status: 0 when every URL was rendered
+    ap = argparse.ArgumentParser(prog="simple_browser.py", description="Render URLs headlessly with the active extensions.")
+    ap.add_argument("--batch", metavar="URLS", required=True, help="file with one URL per line, or - for stdin")
+    ap.add_argument("--out", required=True, help="directory for the pages, results.jsonl and report.json")
+    ap.add_argument("--concurrency", type=int, default=4, help="pages loading at once")
+    ap.add_argument("--timeout", type=float, default=30, help="seconds per attempt")
+    ap.add_argument("--retries", type=int, default=1, help="extra attempts after a failure or timeout")
+    ap.add_argument("--screenshots", action="store_true", help="also save <n>.png")
+    ap.add_argument("--settle-ms", type=int, default=200, help="wait after load before dumping, for deferred extensions")
+    args, _ = ap.parse_known_args(argv[1:])
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    apply_perf_profile(argv)
+    register_url_schemes()
+    app = QApplication(argv)
+    # Off the record, so a run leaves no cookies or cache in the profile; extensions are read, never written
+    profile = QWebEngineProfile(app)
+    extensions = ExtensionRegistry({n: {'code': c, 'active': bool(a)} for n, c, a in saved_rows("SELECT name, code, active FROM extensions ORDER BY rowid")}, profile)
+    src = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    try:
+        # The runner reads URLs lazily while the event loop runs, so the file stays open until it ends
+        urls = (line.strip() for line in src if line.strip() and not line.lstrip().startswith("#"))
+        runner = BatchRunner(urls, args.out, profile, extensions, args.concurrency, args.timeout, args.retries, args.screenshots, args.settle_ms)
+        report = {}
+        runner.done.connect(lambda r: (report.update(r), app.quit()))
+        QTimer.singleShot(0, runner.start)
+        app.exec_()
+    finally:
+        if src is not sys.stdin: src.close()
+    print(json.dumps(report))
+    return 0 if report.get('failed') == 0 else 1
+
 # --- Main Window ---
 class NaviBrowser(QMainWindow):
-    def __init__(self):
+    frecency_ready = pyqtSignal(object)
+    history_ready = pyqtSignal(object)
+    capture_done = pyqtSignal(object)
+    import_done = pyqtSignal(object)
+
+    def __init__(self, perf_profile=None):
         super().__init__()
         self.setWindowTitle("Navi Browser Ultimate v4")
         self.resize(1300, 900)
         
         # Defaults
         self.data = {
-            'sites': {}, 'extensions': {}, 'history': [], 'downloads': [],
-            'settings': {'theme': 'light', 'wholesome_switch': True, 'home_notes': '', 'custom_suffix': '.pw-navi'},
+            'sites': {}, 'extensions': {}, 'history': HistoryLog(), 'downloads': [],
+            'settings': {'theme': 'light', 'wholesome_switch': True, 'custom_suffix': '.pw-navi'},
             'proxy': {'type': 'Google', 'key': '', 'url': ''},
             'navits': 0, 'inventory': [], 'last_active': time.time(),
             'last_reward_time': 0
         }
         
+        self.store = NaviStore(DB_FILE)
+        TRACE.mark("store opened")
         self.load_from_disk()
+        TRACE.mark("settings loaded")
+        self.store.writer.window = self.data['settings']['save_window_ms'] / 1000
+        self.store.asset_cache.max_bytes = self.data['settings']['site_cache_mb'] << 20
+        self.scheduler = Scheduler(self)
+        self.perf = PerfRecorder(self.data['settings']['perf_samples'], self.data['settings']['perf_enabled'])
+        self.blocker = ContentBlocker(FILTER_DIR, self.data['settings']['blocking_enabled'])
+        self.captures = {}  # Download id -> PageCapture still running
+        self.capture_done.connect(self.on_capture_done)
+        self.imports = []  # BrowserImports of this session, finished ones included
+        self.import_done.connect(self.on_import_done)
+        self.thumbs = ThumbnailCache(THUMB_DIR, self.data['settings']['thumb_cache_mb'], self.data['settings']['thumb_disk_mb'])
+        self.setup_profile_stats(perf_profile)
+        self.setup_profiles()
+        self.scheduler.cooldowns['search-reward'] = self.data.get('last_reward_time', 0) + 60
+        self.watching = set()
+        self.history_loaded = False
+        self.history_ready.connect(self.on_history_ready)
         self.check_dead_mans_switch()
+        self.schedule_profile_samples()
         self.setup_ui()
+        self.setup_routes()
         self.apply_theme()
+        TRACE.mark("window built")
         
-        self.add_new_tab(QUrl("local://navi/"))
+        home = self.add_new_tab(QUrl("local://navi/"))
+        home.loadFinished.connect(lambda _: TRACE.mark("home tab loaded"))
+        if self.data['settings']['restore_session']: self.restore_session()
+        TRACE.mark("first tab created")
+        if not self.history_loaded: self.load_history()
+        else: self.build_frecency()  # History was replaced by the dead man's switch; index that instead
+        self.blocker.load()
 
     def setup_ui(self):
         tb = QToolBar(); tb.setMovable(False); self.addToolBar(tb)
@@ -331,8 +2690,20 @@ class NaviBrowser(QMainWindow):
         self.url_bar.returnPressed.connect(self.navigate)
         tb.addWidget(self.url_bar)
 
+        # Autocomplete (index is built off-thread at startup, lookups debounced per keystroke)
+        self.frecency, self.frecency_pending = None, None
+        self.frecency_ready.connect(self.on_frecency_ready)
+        self.suggestions = QStringListModel(self)
+        self.completer = QCompleter(self.suggestions, self)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.activated[str].connect(self.on_suggestion)
+        self.url_bar.setCompleter(self.completer)
+        self.suggest_timer = QTimer(self); self.suggest_timer.setSingleShot(True); self.suggest_timer.setInterval(30)
+        self.suggest_timer.timeout.connect(self.update_suggestions)
+        self.url_bar.textEdited.connect(lambda _: self.suggest_timer.start())
+
         # Tools
-        for t, f, tip in [("⬇️", self.download_page, "DL"), ("< >", self.inspect_page, "Src"), ("+", self.add_new_tab_safe, "New Tab")]:
+        for t, f, tip in [("⬇️", self.download_page, "DL"), ("< >", self.inspect_page, "Src"), ("+", self.add_new_tab_safe, "New Tab"), ("🕶️", self.add_private_tab, "Private Tab"), ("▦", self.show_tab_overview, "Tabs")]:
             b = QPushButton(t); b.setToolTip(tip); b.setFixedSize(35,35); b.clicked.connect(f); tb.addWidget(b)
 
         self.tabs = QTabWidget()
@@ -342,33 +2713,108 @@ class NaviBrowser(QMainWindow):
         self.tabs.currentChanged.connect(self.update_url_bar)
         self.setCentralWidget(self.tabs)
 
+        s = self.data['settings']
+        self.lifecycle = TabLifecycleManager(self.tabs, s['max_live_tabs'], s['tab_memory_budget_mb'], s['tab_freeze_seconds'])
+        self.active_tab = None  # Snapshotted for the tab overview when another tab is selected
+        self.tabs.currentChanged.connect(self.on_tab_activated)
+
     # --- Navits Logic ---
     def attempt_search_reward(self, amount):
-        now = time.time()
         # 60 second cooldown on search rewards
-        if now - self.data.get('last_reward_time', 0) > 60:
+        if self.scheduler.try_cooldown('search-reward', 60):
             self.add_navits(amount, "Search Reward")
-            self.data['last_reward_time'] = now
+            self.data['last_reward_time'] = time.time()
+            self.save_to_disk('last_reward_time')
+
+    def update_watch_tracking(self):
+        # Only YouTube tabs that are on screen or playing sound earn watch time;
+        # the minute tick is scheduled only while there is at least one
+        current = self.tabs.currentWidget() if not self.isMinimized() else None
+        self.watching = {t for t in (self.tabs.widget(i) for i in range(self.tabs.count()))
+                         if isinstance(t, BrowserTab) and t.is_watching_youtube() and (t is current or t.page().recentlyAudible())}
+        if not self.watching: self.scheduler.cancel('youtube-watch')
+        elif not self.scheduler.pending('youtube-watch'): self.scheduler.schedule('youtube-watch', 60, self.tick_watch, repeat=60)
+
+    def tick_watch(self):
+        for t in list(self.watching): t.check_youtube_watch()
     
     def add_navits(self, amount, reason=""):
         self.data['navits'] = self.data.get('navits', 0) + amount
         print(f"Earned {amount} Navits: {reason} (Total: {self.data['navits']})")
-        self.save_to_disk()
+        self.save_to_disk('navits')
 
     # --- Feature Logic ---
     def check_dead_mans_switch(self):
         if not self.data['settings']['wholesome_switch']: return
         if time.time() - self.data.get('last_active', 0) > TWO_WEEKS_SECONDS:
             QMessageBox.information(self, "Welcome Back", "Optimizing your experience...")
-            self.data['history'] = get_wholesome_history()
+            wholesome = get_wholesome_history()
+            self.data['history'].clear()
+            self.data['history'].extend((h['url'], h['title'], h['time']) for h in reversed(wholesome))
+            self.store.replace_history(wholesome)
+            self.history_loaded = True  # Nothing worth reading back from disk; __init__ builds the index once the UI is up
+        # Stamped once the window is up (and again on close), not on the startup path
+        self.scheduler.schedule('touch-active', 60, self.touch_active)
+
+    def touch_active(self):
         self.data['last_active'] = time.time()
-        self.save_to_disk()
+        self.save_to_disk('last_active')
+
+    def load_history(self):
+        limit = self.data['settings']['history_limit']
+        def work():
+            db = sqlite3.connect(self.store.path)
+            try: self.history_ready.emit(self.store.load_history(limit, db))
+            finally: db.close()
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_history_ready(self, log):
+        # Visits made while loading are newer than anything on disk
+        for h in self.data['history'].oldest_first(): log.append(h.url, h.title, h.time)
+        self.data['history'], self.history_loaded = log, True
+        TRACE.mark(f"history loaded ({len(log)} entries)")
+        self.build_frecency()
 
     def add_to_history(self, url, title):
-        if self.data['history'] and self.data['history'][0]['url'] == url: return
-        self.data['history'].insert(0, {'url': url, 'title': title, 'time': time.time()})
-        self.data['history'] = self.data['history'][:1000]
-        self.save_to_disk()
+        last = self.data['history'].first()
+        if last and last.url == url: return
+        now = time.time()
+        self.data['history'].append(url, title, now)
+        self.record_visit(url, title, now)
+        self.store.add_history(url, title, now, self.data['history'].capacity)
+
+    # --- Autocomplete ---
+    def build_frecency(self):
+        # Started once history is in memory
+        if self.frecency_pending is not None: return
+        self.frecency_pending = []  # Visits made while building, replayed on handover
+        now = time.time()
+        history = self.data['history'].copy()
+        extra = [(d, v['title'], now, 4.0) for d, v in self.data['sites'].items()]
+        extra += [(u, t, now, 2.0) for u, t in INTERNAL_ROUTES.items()]
+        def work():
+            visits = [(h.url, h.title, h.time, 1.0) for h in history.oldest_first()] + extra
+            self.frecency_ready.emit(FrecencyIndex().build(visits))
+        threading.Thread(target=work, name="navi-frecency", daemon=True).start()
+
+    def on_frecency_ready(self, index):
+        for v in self.frecency_pending: index.visit(*v)
+        self.frecency, self.frecency_pending = index, None
+        if self.url_bar.hasFocus(): self.update_suggestions()
+
+    def record_visit(self, *visit):
+        if self.frecency: self.frecency.visit(*visit)
+        if self.frecency_pending is not None: self.frecency_pending.append(visit)  # Also while rebuilding
+
+    def update_suggestions(self):
+        if self.frecency is None: return
+        urls = [u for u, _ in self.frecency.query(self.url_bar.text())]
+        self.suggestions.setStringList(urls)
+        if urls and self.url_bar.hasFocus(): self.completer.complete()
+
+    def on_suggestion(self, url):
+        self.url_bar.setText(url)
+        self.navigate()
 
     # --- Safe Tab Adding (Crash Fix) ---
     def add_new_tab_safe(self):
@@ -379,51 +2825,184 @@ class NaviBrowser(QMainWindow):
 
     def download_page(self):
         t = self.tabs.currentWidget()
-        if t: t.page().toHtml(lambda h: self.save_download(t.title(), h))
+        if t: t.page().toHtml(lambda h, t=t: self.capture_page(t.url().toString(), t.title(), h))
 
-    def save_download(self, t, h):
-        self.data['downloads'].append({'title': t, 'html': h, 'date': time.time(), 'id': str(int(time.time()))})
-        self.save_to_disk(); QMessageBox.information(self, "Saved", "Page saved offline!")
+    def capture_page(self, url, title, html):
+        # Fetching and blob writes run on a background thread; navi://dlw shows progress meanwhile
+        s = self.data['settings']
+        job = PageCapture(url, title, html, self.store.blobs, s['capture_workers'], s['capture_per_host'], self.profile.httpUserAgent())
+        job.id = str(int(time.time()))
+        while job.id in self.captures or any(d['id'] == job.id for d in self.data['downloads']): job.id = str(int(job.id) + 1)
+        self.captures[job.id] = job
+        threading.Thread(target=lambda: self.capture_done.emit(job.run()), name="navi-capture", daemon=True).start()
+        return job
+
+    def on_capture_done(self, job):
+        self.captures.pop(job.id, None)
+        if job.state != 'done':
+            self.store.blobs.unpin(job.pins)
+            QMessageBox.warning(self, "Not Saved", f"Couldn't save the page: {job.error}")
+            return
+        d = {'title': job.title, 'date': time.time(), 'id': job.id, 'size': job.size, 'hash': job.hash}
+        self.data['downloads'].append(d)
+        self.store.add_capture(d, job.resources, job.pins)
+        missing = f" ({job.failed} resources couldn't be fetched and stay online)" if job.failed else ""
+        QMessageBox.information(self, "Saved", f"Page saved offline with {len(job.resources)} resources{missing}!")
+
+    def start_import(self, path):
+        job = BrowserImport(path, self.store, self.data['settings']['history_limit'])
+        job.id = len(self.imports)
+        self.imports.append(job)
+        threading.Thread(target=lambda: self.import_done.emit(job.run()), name="navi-import", daemon=True).start()
+        return job
+
+    def on_import_done(self, job):
+        if job.bookmarks:
+            # Bookmarks become a personal site, so they open like any other local:// page
+            suffix = self.data['settings'].get('custom_suffix', '.pw-navi')
+            n, domain = 1, f"bookmarks{suffix}"
+            while domain in self.data['sites']: n += 1; domain = f"bookmarks-{n}{suffix}"
+            self.data['sites'][domain] = {'domain': domain, 'title': "Imported Bookmarks", 'html_content': job.site_html()}
+            self.store.put_site(domain, self.data['sites'][domain])
+            self.record_visit(domain, "Imported Bookmarks", None, 4.0)
+            job.site = domain
+        if job.imported:
+            # The merge rewrote the history on disk; read it back the way startup does
+            self.data['history'], self.history_loaded = HistoryLog(self.data['settings']['history_limit']), False
+            self.load_history()
+        self.touch_active()  # Imported visits are old; don't let the dead man's switch take them for inactivity
 
     def inspect_page(self):
         t = self.tabs.currentWidget()
         if t: t.page().toHtml(lambda h: SourceViewer(h, self).exec_())
 
+    # --- Profiles ---
+    def setup_profiles(self):
+        # Configured once: the default profile keeps a bounded HTTP cache on disk across
+        # restarts, private tabs share an off-the-record profile that caches in memory only
+        s = self.data['settings']
+        self.profile = QWebEngineProfile.defaultProfile()
+        self.profile.setCachePath(os.path.abspath(s['cache_dir']))
+        self.profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+        self.profile.setHttpCacheMaximumSize(self.cache_limit_mb() * 1024 * 1024)
+        self.private_profile = QWebEngineProfile(self)
+        self.private_profile.setHttpCacheType(QWebEngineProfile.MemoryHttpCache)
+        self.cache_stats = {'hits': 0, 'misses': 0, 'saved': 0}
+
+    def cache_limit_mb(self):
+        # The low-memory profile caps the cache without touching the saved size
+        cap = PERF_PROFILES.get(self.perf_profile, {}).get('cache_cap_mb')
+        return min(self.data['settings']['cache_size_mb'], cap) if cap else self.data['settings']['cache_size_mb']
+
+    def record_cache_probe(self, r):
+        if not isinstance(r, list) or len(r) != 3: return
+        self.cache_stats['hits'] += int(r[0]); self.cache_stats['misses'] += int(r[1]); self.cache_stats['saved'] += int(r[2])
+
+    # --- Performance Profile Figures ---
+    PROFILE_STATS = {'sessions': 0, 'loads': 0, 'load_ms': 0.0, 'rss_samples': 0, 'rss_mb': 0.0, 'peak_mb': 0.0}
+
+    def setup_profile_stats(self, perf_profile):
+        # perf_profile is what apply_perf_profile chose; None when this process didn't apply one.
+        # Figures go to this session and, with a profile, to its totals across sessions
+        self.perf_profile = perf_profile
+        self.session_stats = dict(self.PROFILE_STATS, sessions=1)
+        self.profile_totals = [self.session_stats]
+        if perf_profile:
+            totals = self.data['perf_profile_stats'].setdefault(perf_profile, dict(self.PROFILE_STATS))
+            totals['sessions'] += 1
+            self.profile_totals.append(totals)
+
+    def track_profile(self, loads=0, load_ms=0.0, rss_mb=None):
+        for st in self.profile_totals:
+            st['loads'] += loads; st['load_ms'] += load_ms
+            if rss_mb is not None: st['rss_samples'] += 1; st['rss_mb'] += rss_mb; st['peak_mb'] = max(st['peak_mb'], rss_mb)
+
+    def renderer_pids(self):
+        pages = (self.tabs.widget(i).page() for i in range(self.tabs.count()) if isinstance(self.tabs.widget(i), BrowserTab))
+        return {p.renderProcessPid() for p in pages if hasattr(p, 'renderProcessPid')} - {0}
+
+    def sample_profile_rss(self):
+        # Browser plus renderer processes; memory shared between them is counted more than once.
+        # Kept in memory; the totals are written once, on close
+        self.track_profile(rss_mb=(process_rss(os.getpid()) + sum(process_rss(p) for p in self.renderer_pids())) / 1048576)
+
+    def schedule_profile_samples(self):
+        # Every 30 s while the perf recorder runs, every 10 minutes otherwise
+        every = 30 if self.perf.enabled else 600
+        self.scheduler.schedule('profile-sample', every, self.sample_profile_rss, repeat=every)
+
     # --- Routing ---
+    def setup_routes(self):
+        # route -> (renderer, data sections it shows); None marks pages that are never cached
+        home = (self.render_home, ('settings', 'navits', 'inventory', 'notes'))
+        self.routes = {
+            "": home, "home": home, "navits": (self.render_navits, ('navits',)),
+            "navits/buy": (self.render_store, ('navits', 'inventory')), "settings": (self.render_settings, ('settings', 'inventory')),
+            "pw": (self.render_sites, ('sites',)), "cws": (self.render_extensions, None),
+            "history": (self.render_history, None), "dlw": (self.render_downloads, None), "info": (self.render_info, None),
+            "cache": (self.render_cache, None), "perf": (self.render_perf, None), "blocking": (self.render_blocking, None),
+            "diagnostics": (self.render_diagnostics, None), "import": (self.render_import, None), "tabs": (self.render_tabs, None),
+            "bridge/qwebchannel.js": (lambda p: qwebchannel_js(), None),
+            "perf/samples.json": (lambda p: self.perf.to_json(), None), "perf/trace.json": (lambda p: self.perf.to_trace(), None),
+        }
+        self.page_cache = OrderedDict()
+        self.scheme_handler = NaviSchemeHandler(self)
+        for p in (self.profile, self.private_profile):
+            for scheme in (b"navi", b"local", b"saved"): p.installUrlSchemeHandler(scheme, self.scheme_handler)
+        self.extensions = ExtensionRegistry(self.data['extensions'], self.profile)
+        self.extensions.add_profile(self.private_profile)
+
+    def render_url(self, url):
+        if url.scheme() == "local" and url.host() != "navi":
+            # local://<site>/ is the site's page; any other path is one of its files
+            d = self.data['sites'].get(url.host())
+            if not d: return None
+            path = url.path().lstrip("/")
+            return d['html_content'] if path in ("", "index.html") else self.store.read_site_file(url.host(), path)
+        if url.scheme() == "saved":
+            # saved://dlw/<id> is a captured page, saved://dlw/res/<hash>.<ext> one of its resources
+            path = url.path().strip("/")
+            if url.host() != "dlw": return None
+            return self.store.read_capture_resource(path[4:]) if path.startswith("res/") else self.render_download_view(path)
+        route = (url.path() if url.scheme() == "local" else url.host() + url.path()).strip("/").lower()
+        params = {k: v[-1] for k, v in parse_qs(url.query(QUrl.FullyEncoded)).items()}
+        if route.startswith("tabs/thumb/"): return self.tab_thumbnail(route.split("thumb/")[1])
+        if route not in self.routes: return None
+        render, deps = self.routes[route]
+        if deps is None: return render(params)
+        # Regenerate only when a section the page shows has changed since the cached copy
+        key = (route, url.query(), self.data['settings']['theme'], time.strftime("%Y%m%d"))
+        version = tuple(self.store.versions[d] for d in deps)
+        hit = self.page_cache.get(key)
+        if hit and hit[0] == version:
+            self.page_cache.move_to_end(key)
+            return hit[1]
+        html = render(params)
+        self.page_cache[key] = (version, html)
+        if len(self.page_cache) > 64: self.page_cache.popitem(last=False)
+        return html
+
+    def is_page_route(self, url):
+        # navi:// URLs that render a page, as opposed to commands
+        route = (url.host() + url.path()).strip("/").lower()
+        return route in self.routes or route.startswith("tabs/thumb/")
+
+    def show_page(self, browser, url):
+        # Re-request an internal page after a command changed what it shows
+        if browser.url() == QUrl(url): browser.reload()
+        else: browser.setUrl(QUrl(url))
+
     def handle_internal_pages(self, url, browser):
-        cmd = url.lower().replace("navi://", "").strip("/")
-        theme = self.data['settings']['theme']
-        
-        if cmd == "" or cmd == "home":
-            unlocked = "widgets" in self.data['inventory']
-            browser.setHtml(InternalPages.home(theme, self.data['settings']['home_notes'], self.data.get('navits',0), unlocked), QUrl("local://navi/"))
-        elif cmd == "navits":
-            self.render_navits(browser)
-        elif cmd == "navits/buy":
-            self.render_store(browser)
-        elif cmd == "settings":
-            self.render_settings(browser)
-        elif cmd == "pw":
-            self.render_sites(browser)
-        elif cmd == "cws":
-            self.render_extensions(browser)
-        elif cmd == "history":
-            self.render_history(browser)
-        elif cmd == "dlw":
-            self.render_downloads(browser)
-        elif cmd == "info":
-             # Fixed syntax error with triple quotes
-            browser.setHtml(f"""<html><head><style>{InternalPages.css(theme)}</style></head><body><div class="container"><h1>Info</h1><div class="card">Navi Browser v4<br><br><a href="https://discord.gg/64um79VVMa" class="btn" style="background:#5865F2">Discord</a></div></div></body></html>""", QUrl("local://navi/info"))
-            
-        # Commands
-        elif cmd.startswith("save_notes/"):
-            self.data['settings']['home_notes'] = QUrl.fromPercentEncoding(url.split("save_notes/")[1].encode())
-            self.save_to_disk()
+        # Runs navi:// commands (NaviWebPage has already checked where they came from); False when there is no such command
+        cmd = url.lower().replace("navi://", "").split("?")[0].strip("/")
+
+        if cmd.startswith("save_notes/"):
+            self.save_notes(QUrl.fromPercentEncoding(url.split("save_notes/")[1].encode()))
         elif cmd.startswith("settings/set_theme/"):
             t = url.split("set_theme/")[1]
             self.data['settings']['theme'] = t
-            self.apply_theme()
-            self.save_to_disk(); self.render_settings(browser)
+            self.save_to_disk('settings')
+            self.apply_theme()  # Reloads the internal pages, this one included
         elif cmd.startswith("settings/set_suffix/"):
             s = QUrl.fromPercentEncoding(url.split("set_suffix/")[1].encode())
             if not s.startswith("."): s = "." + s
@@ -431,57 +3010,205 @@ class NaviBrowser(QMainWindow):
                 QMessageBox.warning(self, "Invalid", "Suffix must be empty or just a word, code adds .navi")
             else:
                 self.data['settings']['custom_suffix'] = s
-                self.save_to_disk()
-            self.render_settings(browser)
+                self.save_to_disk('settings')
+            self.show_page(browser, "navi://settings")
+        elif cmd.startswith("settings/set_perf_profile/"):
+            name = cmd.split("set_perf_profile/")[1]
+            if name in PERF_PROFILES:
+                self.data['settings']['perf_profile'] = name
+                self.save_to_disk('settings')
+            self.show_page(browser, "navi://settings")
+        elif cmd == "blocking/toggle":
+            self.blocker.enabled = self.data['settings']['blocking_enabled'] = not self.blocker.enabled
+            self.save_to_disk('settings')
+            self.show_page(browser, "navi://blocking")
+        elif cmd == "blocking/reload":
+            self.blocker.reset_stats()
+            self.blocker.load()
+            self.show_page(browser, "navi://blocking")
+        elif cmd == "perf/toggle":
+            self.perf.enabled = self.data['settings']['perf_enabled'] = not self.perf.enabled
+            self.save_to_disk('settings')
+            self.schedule_profile_samples()
+            self.show_page(browser, "navi://perf")
+        elif cmd == "perf/clear":
+            self.perf.samples.clear()
+            self.show_page(browser, "navi://perf")
+        elif cmd in ("perf/save/json", "perf/save/trace"):
+            trace = cmd.endswith("trace")
+            path, _ = QFileDialog.getSaveFileName(self, "Export", "navi-trace.json" if trace else "navi-perf.json", "JSON (*.json)")
+            if path:
+                with open(path, 'w') as f: f.write(self.perf.to_trace() if trace else self.perf.to_json())
+        elif cmd == "cache/clear":
+            self.profile.clearHttpCache()
+            self.cache_stats = {'hits': 0, 'misses': 0, 'saved': 0}
+            self.show_page(browser, "navi://cache")
+        elif cmd.startswith("cache/set_size/"):
+            try: mb = max(0, int(cmd.split("set_size/")[1]))
+            except ValueError: mb = None
+            if mb is not None:
+                self.data['settings']['cache_size_mb'] = mb
+                self.save_to_disk('settings')
+                self.profile.setHttpCacheMaximumSize(self.cache_limit_mb() * 1024 * 1024)
+            self.show_page(browser, "navi://cache")
+        elif cmd == "import/choose":
+            path, _ = QFileDialog.getOpenFileName(self, "Import History or Bookmarks", os.path.expanduser("~"),
+                                                  "Browser data (History places.sqlite *.sqlite *.db *.html *.htm);;All files (*)")
+            if path: self.start_import(path)
+            self.show_page(browser, "navi://import")
+        elif cmd.startswith("tabs/switch/"):
+            i = self.tab_index(cmd.split("switch/")[1])
+            if i >= 0: self.tabs.setCurrentIndex(i)
+        elif cmd.startswith("tabs/close/"):
+            self.close_tab_serial(cmd.split("close/")[1])
+            if self.tabs.indexOf(browser) >= 0: self.show_page(browser, "navi://tabs")
+        elif cmd.startswith("dlw/delete/"):
+            self.delete_download(url.split("delete/")[1])
+            self.show_page(browser, "navi://dlw")
         elif cmd.startswith("store/buy/"):
-            item = url.split("buy/")[1]
-            self.buy_item(item)
-            self.render_store(browser)
+            ok, title, message = self.buy_item(url.split("buy/")[1])
+            (QMessageBox.information if ok or title == "Owned" else QMessageBox.warning)(self, title, message)
+            self.show_page(browser, "navi://navits/buy")
 
         # Editors
         elif cmd == "pw/new": CodeEditorWindow(self, "site").show()
         elif cmd.startswith("pw/edit/"): CodeEditorWindow(self, "site", QUrl.fromPercentEncoding(url.split("edit/")[1].encode())).show()
         elif cmd.startswith("pw/delete/"):
-            d = QUrl.fromPercentEncoding(url.split("delete/")[1].encode())
-            if d in self.data['sites']: del self.data['sites'][d]; self.save_to_disk()
-            self.render_sites(browser)
+            self.delete_site(QUrl.fromPercentEncoding(url.split("delete/")[1].encode()))
+            self.show_page(browser, "navi://pw")
         elif cmd == "cws/new": CodeEditorWindow(self, "ext").show()
         elif cmd.startswith("cws/edit/"): CodeEditorWindow(self, "ext", QUrl.fromPercentEncoding(url.split("edit/")[1].encode())).show()
         elif cmd.startswith("cws/toggle/"):
-            n = QUrl.fromPercentEncoding(url.split("toggle/")[1].encode())
-            if n in self.data['extensions']: 
-                self.data['extensions'][n]['active'] = not self.data['extensions'][n]['active']
-                self.save_to_disk()
-            self.render_extensions(browser)
+            self.toggle_extension(QUrl.fromPercentEncoding(url.split("toggle/")[1].encode()))
+            self.show_page(browser, "navi://cws")
+        else: return False
+        return True
+
+    # --- Actions (shared by navi:// commands and NaviBridge) ---
+    # Home notes are a snapshot plus a log of splice edits. After NOTES_COMPACT_EVERY edits,
+    # or once the logged text outweighs the note itself, the log is folded into a new snapshot.
+    def edit_notes(self, base, start, deleted, text):
+        # New version, or None when the edit was made against an older one (or doesn't fit)
+        if base != self.notes_version or not 0 <= start <= start + deleted <= len(self.notes): return None
+        self.notes = self.notes[:start] + text + self.notes[start + deleted:]
+        self.notes_version += 1
+        self.notes_edits += 1; self.notes_log_chars += len(text)
+        if self.notes_edits >= NOTES_COMPACT_EVERY or self.notes_log_chars > len(self.notes): self.save_notes(self.notes)
+        else: self.store.add_note_edit(self.notes_version, start, deleted, text)
+        return self.notes_version
+
+    def save_notes(self, text):
+        # Whole-text save as a fresh snapshot
+        if self.notes_edits or text != self.notes: self.notes_version += 1
+        self.notes, self.notes_edits, self.notes_log_chars = text, 0, 0
+        self.store.put_notes(self.notes_version, text)
+
+    def toggle_extension(self, n):
+        # New active state, or None for an unknown extension
+        e = self.data['extensions'].get(n)
+        if not e: return None
+        e['active'] = not e['active']
+        self.store.put_extension(n, e)
+        self.extensions.refresh(n)
+        return e['active']
+
+    def delete_site(self, d):
+        if d not in self.data['sites']: return False
+        del self.data['sites'][d]; self.store.delete_site(d)
+        return True
+
+    def delete_download(self, i):
+        if not any(d['id'] == i for d in self.data['downloads']): return False
+        self.data['downloads'] = [d for d in self.data['downloads'] if d['id'] != i]
+        self.store.delete_download(i)
+        return True
 
     def buy_item(self, item_id):
+        # Returns (bought, title, message)
         prices = {"christmas": 150, "halloween": 150, "suffix": 250, "widgets": 200}
         
         # Seasonal Check
         if item_id in ["christmas", "halloween"] and not is_seasonal(item_id):
-            QMessageBox.warning(self, "Unavailable", "This item is not currently available!")
-            return
+            return False, "Unavailable", "This item is not currently available!"
 
         price = prices.get(item_id, 9999)
         balance = self.data.get('navits', 0)
 
         if item_id in self.data['inventory']:
-            QMessageBox.information(self, "Owned", "You already own this item.")
-            return
+            return False, "Owned", "You already own this item."
 
         if balance >= price:
             self.data['navits'] -= price
             self.data['inventory'].append(item_id)
-            self.save_to_disk()
-            QMessageBox.information(self, "Success", f"Bought {item_id}!")
-        else:
-            QMessageBox.warning(self, "Poor", f"Need {price} Navits. You have {balance}.")
+            self.save_to_disk('navits', 'inventory')
+            return True, "Success", f"Bought {item_id}!"
+        return False, "Poor", f"Need {price} Navits. You have {balance}."
 
     # --- Renderers ---
-    def render_navits(self, b):
+    def render_home(self, params):
+        unlocked = "widgets" in self.data['inventory']
+        return InternalPages.home(self.data['settings']['theme'], self.notes, self.notes_version, self.data.get('navits',0), unlocked)
+
+    def render_info(self, params):
+        theme = self.data['settings']['theme']
+        w = self.store.writer.stats()
+        tabs = self.lifecycle.stats()
+        sched = f"{self.scheduler.wakeups} wakeups, {len(self.scheduler.jobs)} jobs pending"
+        failed = f"<br><small>⚠️ {w['failed']} writes failed; last error at {datetime.fromtimestamp(w['last_error'][0]).strftime('%H:%M:%S')}: {escape(w['last_error'][1])}</small>" if w['last_error'] else ""
+        # Fixed syntax error with triple quotes
+        return InternalPages.page(theme, f"""<h1>Info</h1><div class="card">Navi Browser v4<br><br><a href="https://discord.gg/64um79VVMa" class="btn" style="background:#5865F2">Discord</a></div><div class="card"><h3>💾 Storage</h3>{w['requested']} writes requested, {w['performed']} commits performed ({w['coalesced']} coalesced){failed}</div><div class="card"><h3>🗂️ Tabs</h3>{tabs['live']} live, {tabs['frozen']} frozen, {tabs['discarded']} discarded · {tabs['reclaimed_mb']:.0f} MB reclaimed</div><div class="card"><h3>⏱️ Scheduler</h3>{sched}</div>""")
+
+    def render_diagnostics(self, params):
+        t = self.data['settings']['theme']
+        name = self.perf_profile
+        active = f"{PERF_PROFILES[name]['label']}: {escape(PERF_PROFILES[name]['about'])}" if name else "None applied by this process (QtWebEngine defaults plus any flags below)"
+        flags = "".join(f"<li><code>{escape(f)}</code></li>" for f in os.environ.get("QTWEBENGINE_CHROMIUM_FLAGS", "").split()) or "<li>none</li>"
+        software = "software OpenGL" if QApplication.testAttribute(Qt.AA_UseSoftwareOpenGL) else "default OpenGL"
+        now = (process_rss(os.getpid()) + sum(process_rss(p) for p in self.renderer_pids())) / 1048576
+        def row(n, st):
+            load = f"{st['load_ms'] / st['loads']:.0f}" if st['loads'] else "–"
+            rss = f"{st['rss_mb'] / st['rss_samples']:.0f}" if st['rss_samples'] else "–"
+            return f"<tr><td>{escape(n)}</td><td>{st['sessions']}</td><td>{st['loads']}</td><td>{load}</td><td>{rss}</td><td>{st['peak_mb']:.0f}</td></tr>"
+        rows = row("This session", self.session_stats) + "".join(row(PERF_PROFILES[n]['label'] if n in PERF_PROFILES else n, st) for n, st in sorted(self.data['perf_profile_stats'].items()))
+        table = f"""<table style="width:100%;text-align:left"><tr><th>Profile</th><th>Sessions</th><th>Page loads</th><th>Avg load ms</th><th>Avg RSS MB</th><th>Peak RSS MB</th></tr>{rows}</table>"""
+        return InternalPages.page(t, f"""<h1>Diagnostics</h1><div class="card"><h3>⚡ Performance Profile</h3>{active}<br><br><a href="navi://settings" class="btn">Change</a></div><div class="card"><h3>🧩 Chromium Flags</h3><ul>{flags}</ul><small>QTWEBENGINE_CHROMIUM_FLAGS · {software} · {CPU_COUNT} cores</small></div><div class="card"><h3>📏 Measured</h3>Now: {now:.0f} MB across the browser and {len(self.renderer_pids())} renderer processes<br><br>{table}<p><small>Loads are http(s) pages, timed from load start to finish; RSS is sampled every 30 s, and memory shared between processes is counted in each of them. The figures depend on what was browsed, so compare profiles over similar use, or with benchmarks/bench_browser.py --perf-profile.</small></p></div>""")
+
+    def render_blocking(self, params):
+        t = self.data['settings']['theme']
+        b, e = self.blocker, self.blocker.engine
+        if e: engine = f"{e.rules} rules from {b.info.get('lists', 0)} lists ({e.skipped} skipped) · {len(e.block.hosts)} hosts, {len(e.block.plain)} substrings, {len(e.block.tokens)} tokens, {len(e.block.generic)} generic · loaded in {b.info.get('ms', 0):.0f} ms{' from cache' if b.info.get('cached') else ''}"
+        else: engine = "Loading..." if b.loading else "No lists loaded"
+        avg = b.total_us / b.checks if b.checks else 0
+        buckets = " · ".join(f"{k}: {v}" for k, v in sorted(b.buckets.items())) or "none"
+        top = "".join(f"<li>{escape(h)} · {n}</li>" for h, n in sorted(b.hosts.items(), key=lambda x: -x[1])[:15])
+        tabs = "".join(f"<li>{escape(w.title() or w.url().toString())} · {w.blocked}</li>" for w in (self.tabs.widget(i) for i in range(self.tabs.count()))
+                       if isinstance(w, BrowserTab) and w.blocked)
+        return InternalPages.page(t, f"""<h1>Content Blocking</h1><div class="card"><h3>🛡️ {"On" if b.enabled else "Off"}</h3>{engine}<p><small>Lists are read from {escape(os.path.abspath(b.folder))}/*.txt</small></p><a href="navi://blocking/toggle" class="btn">{"Turn Off" if b.enabled else "Turn On"}</a> <a href="navi://blocking/reload" class="btn">Reload Lists</a></div><div class="card"><h3>⏱️ Matching</h3>{b.checks} requests checked, {b.blocked} blocked · avg {avg:.1f} µs, max {b.max_us:.0f} µs<br>Matched by {buckets}</div><div class="card"><h3>🚫 Top Blocked Hosts</h3><ul>{top}</ul></div><div class="card"><h3>🗂️ Tabs</h3><ul>{tabs}</ul></div>""")
+
+    def render_perf(self, params):
+        t = self.data['settings']['theme']
+        state = "Recording" if self.perf.enabled else "Off"
+        rows = "".join(f"<tr><td>{c}</td><td>{escape(n)}</td><td>{k}</td><td>{p50:.1f}</td><td>{p90:.1f}</td><td>{p99:.1f}</td><td>{mx:.1f}</td></tr>"
+                       for c, n, k, p50, p90, p99, mx in self.perf.summary())
+        table = f"""<table style="width:100%;text-align:left"><tr><th>Category</th><th>Name</th><th>n</th><th>p50 ms</th><th>p90 ms</th><th>p99 ms</th><th>max ms</th></tr>{rows}</table>""" if rows else "<p>No samples yet.</p>"
+        loads = [s for s in reversed(self.perf.samples) if s[1] == 'page load'][:20]
+        recent = "".join(f"<li>{escape(a.get('host', ''))} · {ms:.0f} ms{'' if a.get('ok') else ' (failed)'}</li>" for _, _, _, ms, a in loads)
+        return InternalPages.page(t, f"""<h1>Performance</h1><div class="card"><h3>⏱️ {state}</h3>{len(self.perf.samples)} of {self.perf.samples.maxlen} samples<br><br><a href="navi://perf/toggle" class="btn">{"Stop" if self.perf.enabled else "Start"} Recording</a> <a href="navi://perf/clear" class="btn btn-danger">Clear</a> <a href="navi://perf/save/json" class="btn">Export JSON</a> <a href="navi://perf/save/trace" class="btn">Export Chrome Trace</a></div><div class="card"><h3>📊 Percentiles</h3>{table}</div><div class="card"><h3>🕒 Recent Loads</h3><ul>{recent}</ul></div>""")
+
+    def render_cache(self, params):
+        t = self.data['settings']['theme']
+        c = self.cache_stats
+        used = dir_size(self.profile.cachePath()) / 1048576
+        limit = self.data['settings']['cache_size_mb']
+        capped = f" (capped at {self.cache_limit_mb()} MB by the {self.perf_profile} profile)" if self.cache_limit_mb() < limit else ""
+        seen = c['hits'] + c['misses']
+        rate = f"{100 * c['hits'] / seen:.0f}%" if seen else "n/a"
+        return InternalPages.page(t, f"""<h1>Cache</h1><div class="card"><h3>💽 Disk Cache</h3>{used:.1f} MB used of {limit} MB{capped}<br><small>{escape(self.profile.cachePath())}</small><br><br><a href="navi://cache/clear" class="btn btn-danger">Clear Cache</a></div><div class="card"><h3>📈 This Session</h3>{c['hits']} resources from cache, {c['misses']} fetched ({rate} hit rate) · {c['saved'] / 1048576:.1f} MB not downloaded<p><small>Estimated from resource timing; cross-origin resources that hide their sizes are not counted.</small></p></div><div class="card"><h3>⚙️ Size Limit</h3><input id="mb" value="{limit}"> MB <button class="btn" onclick="window.location='navi://cache/set_size/'+encodeURIComponent(document.getElementById('mb').value)">Update</button></div>""")
+
+    def render_navits(self, params):
         t = self.data['settings']['theme']
         # Fixed syntax error with triple quotes
-        html = f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container">
+        html = InternalPages.page(t, f"""
         <h1>🏆 Navits System</h1>
         <div class="card">
             <h2>Balance: {self.data.get('navits', 0)} Navits</h2>
@@ -492,42 +3219,47 @@ class NaviBrowser(QMainWindow):
                 <li>YouTube (15 mins): +1</li>
             </ul>
             <a href="navi://navits/buy" class="btn btn-gold">Go to Store</a>
-        </div></div></body></html>"""
-        b.setHtml(html, QUrl("local://navi/navits"))
+        </div>""")
+        return html
 
-    def render_store(self, b):
+    def render_store(self, params):
         t = self.data['settings']['theme']
         inv = self.data['inventory']
         
         # Items logic
-        items_html = ""
+        items = []
+        buy = lambda item: "" if item in inv else f''' onclick="return navi.act(event, 'buyItem', [{js_arg(item)}], r => bought(this, r))"'''
         
         # Christmas
         btn_cls = "btn-success" if is_seasonal("christmas") else "btn-danger"
         lbl = "Buy (150 N)" if "christmas" not in inv else "Owned"
         action = "navi://store/buy/christmas" if "christmas" not in inv else "#"
-        items_html += f"""<div class="card"><h3>🎄 Christmas Theme</h3><p>Seasonal (Dec-Jan)</p><a href="{action}" class="btn {btn_cls}">{lbl}</a></div>"""
+        items.append(f"""<div class="card"><h3>🎄 Christmas Theme</h3><p>Seasonal (Dec-Jan)</p><a href="{action}"{buy('christmas')} class="btn {btn_cls}">{lbl}</a></div>""")
 
         # Halloween
         btn_cls = "btn-success" if is_seasonal("halloween") else "btn-danger"
         lbl = "Buy (150 N)" if "halloween" not in inv else "Owned"
         action = "navi://store/buy/halloween" if "halloween" not in inv else "#"
-        items_html += f"""<div class="card"><h3>🎃 Halloween Theme</h3><p>Seasonal (Oct)</p><a href="{action}" class="btn {btn_cls}">{lbl}</a></div>"""
+        items.append(f"""<div class="card"><h3>🎃 Halloween Theme</h3><p>Seasonal (Oct)</p><a href="{action}"{buy('halloween')} class="btn {btn_cls}">{lbl}</a></div>""")
 
         # Suffix
         lbl = "Buy (250 N)" if "suffix" not in inv else "Owned"
         action = "navi://store/buy/suffix" if "suffix" not in inv else "#"
-        items_html += f"""<div class="card"><h3>🔗 Custom Domain Suffix</h3><p>Change .pw-navi to your own suffix!</p><a href="{action}" class="btn">{lbl}</a></div>"""
+        items.append(f"""<div class="card"><h3>🔗 Custom Domain Suffix</h3><p>Change .pw-navi to your own suffix!</p><a href="{action}"{buy('suffix')} class="btn">{lbl}</a></div>""")
 
         # Widgets
         lbl = "Buy (200 N)" if "widgets" not in inv else "Owned"
         action = "navi://store/buy/widgets" if "widgets" not in inv else "#"
-        items_html += f"""<div class="card"><h3>🧩 Pro Widgets</h3><p>Calculator & Calendar on start page.</p><a href="{action}" class="btn">{lbl}</a></div>"""
+        items.append(f"""<div class="card"><h3>🧩 Pro Widgets</h3><p>Calculator & Calendar on start page.</p><a href="{action}"{buy('widgets')} class="btn">{lbl}</a></div>""")
 
         # Fixed syntax error with triple quotes
-        b.setHtml(f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>🛒 Navits Store</h1><p>Balance: {self.data.get('navits',0)}</p><div class="widget-grid">{items_html}</div></div></body></html>""", QUrl("local://navi/store"))
+        script = """<script>function bought(a, r) {
+            document.getElementById('balance').textContent = r.navits;
+            if (r.ok) { a.textContent = 'Owned'; a.removeAttribute('onclick'); a.href = '#'; } else alert(r.message);
+        }</script>"""
+        return InternalPages.page(t, f"""<h1>🛒 Navits Store</h1><p>Balance: <span id="balance">{self.data.get('navits',0)}</span></p><div class="widget-grid">{"".join(items)}</div>{script}""")
 
-    def render_settings(self, b):
+    def render_settings(self, params):
         s = self.data['settings']
         t = s['theme']
         inv = self.data['inventory']
@@ -540,53 +3272,211 @@ class NaviBrowser(QMainWindow):
         if "suffix" in inv:
             suffix_html = f"""<div class="card"><h3>🔗 Custom Suffix</h3><input id="suf" value="{s.get('custom_suffix', '.pw-navi')}"><button class="btn" onclick="window.location='navi://settings/set_suffix/'+encodeURIComponent(document.getElementById('suf').value)">Update</button></div>"""
 
+        chosen = s['perf_profile']
+        profiles = "".join(f"""<a href="navi://settings/set_perf_profile/{n}" class="btn{' btn-success' if n == chosen else ''}" title="{escape(p['about'])}">{p['label']}</a> """ for n, p in PERF_PROFILES.items())
+        restart = "" if chosen == (self.perf_profile or 'balanced') else "<p><b>Restart Navi to switch profiles.</b></p>"
+        perf_html = f"""<div class="card"><h3>⚡ Performance Profile</h3>{profiles}<p><small>{escape(PERF_PROFILES[chosen]['about'])} Flags and their measured effect are on <a href="navi://diagnostics">Diagnostics</a>.</small></p>{restart}</div>"""
+
         # Fixed syntax error with triple quotes
-        html = f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>Settings</h1><div class="card"><h3>🎨 Theme</h3>{themes_html}</div>{suffix_html}</div></body></html>"""
-        b.setHtml(html, QUrl("local://navi/settings"))
+        html = InternalPages.page(t, f"""<h1>Settings</h1><div class="card"><h3>🎨 Theme</h3>{themes_html}</div>{suffix_html}{perf_html}""")
+        return html
 
-    def render_sites(self, b):
+    def render_sites(self, params):
         t = self.data['settings']['theme']
-        r = ""
-        for d, v in self.data['sites'].items(): r += f"""<div class="card"><b>{v['title']}</b> ({d})<br><br><a href="{d}" class="btn">Visit</a> <a href="navi://pw/edit/{d}" class="btn btn-success">Edit</a> <a href="navi://pw/delete/{d}" class="btn btn-danger">Delete</a></div>"""
-        # Fixed syntax error with triple quotes
-        b.setHtml(f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>My Sites</h1><a href="navi://pw/new" class="btn">+ New</a><br><br>{r}</div></body></html>""", QUrl("local://navi/pw"))
+        def files(d):
+            f = self.store.site_files[d] if d in self.store.site_files else {}
+            return f" · {len(f)} files, {sum(s for _, _, s in f.values()) // 1024} KB" if f else ""
+        r = "".join(f"""<div class="card"><b>{escape(v['title'] or '')}</b> ({escape(d)}{files(d)})<br><br><a href="local://{url_part(d)}/" class="btn">Visit</a> <a href="navi://pw/edit/{url_part(d)}" class="btn btn-success">Edit</a> <a href="navi://pw/delete/{url_part(d)}" onclick="return navi.act(event, 'deleteSite', [{js_arg(d)}], r => r.ok && this.closest('.card').remove())" class="btn btn-danger">Delete</a></div>""" for d, v in self.data['sites'].items())
+        return InternalPages.page(t, f"""<h1>My Sites</h1><a href="navi://pw/new" class="btn">+ New</a><br><br>{r}""")
 
-    def render_extensions(self, b):
+    def render_extensions(self, params):
         t = self.data['settings']['theme']
-        r = ""
+        r = []
         for k, v in self.data['extensions'].items(): 
             c = "green" if v['active'] else "gray"
-            r += f"""<div class="card" style="border-left:5px solid {c}"><h3>{k}</h3><a href="navi://cws/toggle/{k}" class="btn">Toggle</a> <a href="navi://cws/edit/{k}" class="btn">Edit</a></div>"""
-        # Fixed syntax error with triple quotes
-        b.setHtml(f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>Extensions</h1><a href="navi://cws/new" class="btn">+ New</a><br><br>{r}</div></body></html>""", QUrl("local://navi/cws"))
+            runs, total, worst = self.extensions.stats.get(k, (0, 0.0, 0.0))
+            timing = f"<p><small>{runs} runs · avg {total / runs:.1f} ms · max {worst:.1f} ms</small></p>" if runs else ""
+            r.append(f"""<div class="card" style="border-left:5px solid {c}"><h3>{escape(k)}</h3>{timing}<a href="navi://cws/toggle/{url_part(k)}" onclick="return navi.act(event, 'toggleExtension', [{js_arg(k)}], r => r.ok && (this.closest('.card').style.borderLeftColor = r.active ? 'green' : 'gray'))" class="btn">Toggle</a> <a href="navi://cws/edit/{url_part(k)}" class="btn">Edit</a></div>""")
+        return InternalPages.page(t, f"""<h1>Extensions</h1><a href="navi://cws/new" class="btn">+ New</a><br><br>{"".join(r)}""")
 
-    def render_history(self, b):
+    def render_history(self, params):
         t = self.data['settings']['theme']
-        r = ""
-        for h in self.data['history']: r += f"""<div class="card"><a href="{h['url']}"><b>{h.get('title','Page')}</b></a><br><small>{h['url']}</small></div>"""
-        # Fixed syntax error with triple quotes
-        b.setHtml(f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>History</h1>{r}</div></body></html>""", QUrl("local://navi/history"))
-
-    def render_downloads(self, b):
+        q, page = params.get('q', ''), params.get('page', '1')
+        page = max(1, int(page)) if page.isdigit() else 1
+        start = (page - 1) * HISTORY_PAGE_SIZE
+        # One extra row tells us whether there is a next page
+        if q.strip(): rows = self.store.search_history(q, HISTORY_PAGE_SIZE + 1, start)
+        else: rows = self.data['history'].recent(HISTORY_PAGE_SIZE + 1, start)
+        qs = f"q={QUrl.toPercentEncoding(q).data().decode()}&" if q else ""
+        nav = ""
+        if page > 1: nav += f"""<a href="navi://history?{qs}page={page - 1}" class="btn">← Newer</a> """
+        if len(rows) > HISTORY_PAGE_SIZE: nav += f"""<a href="navi://history?{qs}page={page + 1}" class="btn">Older →</a>"""
+        search = f"""<form action="navi://history"><input name="q" placeholder="Search history..." value="{escape(q)}"></form>"""
+        # Streamed: rows are fetched now, cards are generated as the engine reads them
+        def chunks():
+            yield InternalPages.head(t) + f"""<h1>History</h1>{search}"""
+            for h in rows[:HISTORY_PAGE_SIZE]: yield f"""<div class="card"><a href="{escape(h.url)}"><b>{escape(h.title or 'Page')}</b></a><br><small>{escape(h.url)}</small></div>"""
+            yield f"""<p>{nav}</p>""" + InternalPages.TAIL
+        return chunks()
+
+    def render_import(self, params):
         t = self.data['settings']['theme']
-        r = ""
-        for d in self.data['downloads']: r += f"""<div class="card"><h3>{d['title']}</h3><a href="navi://dlw/view/{d['id']}" class="btn">View</a> <a href="navi://dlw/delete/{d['id']}" class="btn btn-danger">Delete</a></div>"""
-        # Fixed syntax error with triple quotes
-        b.setHtml(f"""<html><head><style>{InternalPages.css(t)}</style></head><body><div class="container"><h1>Downloads</h1>{r}</div></body></html>""", QUrl("local://navi/dlw"))
+        kinds = {'chromium': "Chromium history", 'firefox': "Firefox history and bookmarks", 'bookmarks': "Bookmarks file", None: "Detecting..."}
+        cards = ""
+        for j in reversed(self.imports):
+            title = f"📚 {escape(os.path.basename(j.path))} <small>· {kinds.get(j.kind)}</small>"
+            if j.state == 'running': cards += InternalPages.job_card(j.id, title, j.done, j.total, j.status())
+            else:
+                site = f"""<br><br><a href="local://{j.site}/" class="btn">Open Bookmarks</a>""" if j.site else ""
+                cards += f"""<div class="card"><h3>{"✅" if j.state == 'done' else "⚠️"} {title}</h3>{escape(j.status())}{site}</div>"""
+        poll = InternalPages.poll_jobs('importProgress') if any(j.state == 'running' for j in self.imports) else ""
+        return InternalPages.page(t, f"""<h1>Import</h1><div class="card"><h3>📥 From Another Browser</h3><p>Choose a copy of Chromium's <code>History</code>, Firefox's <code>places.sqlite</code>, or a bookmarks HTML export. Visits are merged into your history, newest {self.data['settings']['history_limit']} kept; bookmarks become a page under My Sites.</p><a href="navi://import/choose" class="btn">Choose File...</a></div>{cards}{poll}""")
+
+    def render_tabs(self, params):
+        # Built from what each tab already knows (URL, title, load time), so no tab is rendered or woken
+        # for it; thumbnails are cached snapshots, fetched lazily as the grid scrolls
+        t = self.data['settings']['theme']
+        # Read now: tabs can close or change while the page streams, and a deleted widget can't be read then
+        tabs = []
+        for i in range(self.tabs.count()):
+            w = self.tabs.widget(i)
+            if w.url() == QUrl("navi://tabs"): continue
+            u = w.url().toString()
+            thumb = w.loaded_at if w.loaded_at and self.thumbs.has(u, w.loaded_at) else None
+            tabs.append((w.serial, u, w.url().host() or w.url().scheme(), w.title(), w.private, thumb))
+        def chunks():
+            yield InternalPages.head(t) + f"""<style>.tab-grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 16px; }}
+            .tab-grid .card {{ padding: 10px; margin: 0; }}
+            .thumb {{ width: 100%; aspect-ratio: 16 / 10; object-fit: cover; object-position: top; border-radius: 6px; display: flex; align-items: center; justify-content: center; font-size: 2em; background: rgba(128,128,128,0.15); }}
+            .tab-grid a {{ color: inherit; text-decoration: none; }}</style><h1>Tabs <small>({len(tabs)})</small></h1><div class="tab-grid">"""
+            for serial, u, host, title, private, thumb in tabs:
+                if thumb: pic = f"""<img class="thumb" src="navi://tabs/thumb/{serial}.jpg?v={thumb}" loading="lazy" alt="">"""
+                else: pic = f"""<div class="thumb">{escape(host[:1].upper() or "?")}</div>"""
+                title = ("🕶️ " if private else "") + escape(title or u)
+                yield f"""<div class="card"><a href="navi://tabs/switch/{serial}">{pic}<p><b>{title}</b><br><small>{escape(host)}</small></p></a><a href="navi://tabs/close/{serial}" onclick="return navi.act(event, 'closeTab', [{serial}], r => r.ok && this.closest('.card').remove())" class="btn btn-danger">Close</a></div>"""
+            yield "</div>" + InternalPages.TAIL
+        return chunks()
+
+    def tab_thumbnail(self, name):
+        i = self.tab_index(name.split(".")[0])
+        w = self.tabs.widget(i) if i >= 0 else None
+        return self.thumbs.get(w.url().toString(), w.loaded_at) if w and w.loaded_at else None
+
+    def render_downloads(self, params):
+        t = self.data['settings']['theme']
+        downloads, jobs = list(self.data['downloads']), list(self.captures.values())
+        def chunks():
+            yield InternalPages.head(t) + "<h1>Downloads</h1>"
+            for j in jobs: yield InternalPages.job_card(j.id, f"📥 {escape(j.title or j.url)}", j.fetched + j.failed, j.total, j.progress()['status'])
+            if jobs: yield InternalPages.poll_jobs('captureProgress')
+            for d in downloads: yield f"""<div class="card"><h3>{escape(d['title'] or '')}</h3><p><small>{datetime.fromtimestamp(d['date']).strftime('%Y-%m-%d %H:%M')} · {d['size'] // 1024} KB</small></p><a href="{SAVED_ORIGIN}/{d['id']}" class="btn">View</a> <a href="navi://dlw/delete/{d['id']}" onclick="return navi.act(event, 'deleteDownload', [{js_arg(d['id'])}], r => r.ok && this.closest('.card').remove())" class="btn btn-danger">Delete</a></div>"""
+            yield InternalPages.TAIL
+        return chunks()
+
+    def render_download_view(self, dl_id):
+        d = next((d for d in self.data['downloads'] if d['id'] == dl_id), None)
+        return self.store.read_download(d) if d else None
 
     # --- Std Funcs ---
-    def add_new_tab(self, qurl=None, label="New Tab"):
-        if qurl is None: qurl = QUrl("local://navi/")
-        b = BrowserTab(self); b.setUrl(qurl)
+    def new_browser(self, qurl, private=False):
+        b = BrowserTab(self, private); b.setUrl(qurl)
         b.urlChanged.connect(lambda q, b=b: self.update_url_bar_for_tab(q, b))
+        b.urlChanged.connect(lambda _: self.session_changed())
         b.titleChanged.connect(lambda t, b=b: self.update_tab_title(t, b))
+        return b
+
+    def add_new_tab(self, qurl=None, label="New Tab", private=False):
+        if qurl is None: qurl = QUrl("local://navi/")
+        b = self.new_browser(qurl, private)
         i = self.tabs.addTab(b, label); self.tabs.setCurrentIndex(i)
+        return b
+
+    # --- Session ---
+    def restore_session(self):
+        # Placeholders cost a widget each; pages load only when their tab is first shown
+        for t in self.data['session']:
+            if t['url'] != "local://navi/": self.tabs.addTab(TabPlaceholder(t['url'], t['title'], t.get('loaded_at')), t['title'][:15])
+
+    def materialize_tab(self, i):
+        ph = self.tabs.widget(i)
+        b = self.new_browser(ph.url())
+        self.tabs.blockSignals(True)
+        self.tabs.removeTab(i); self.tabs.insertTab(i, b, ph.label[:15]); self.tabs.setCurrentIndex(i)
+        self.tabs.blockSignals(False)
+        ph.deleteLater()
+        return b
+
+    def session_changed(self):
+        self.scheduler.schedule('save-session', 2, self.save_session)
+
+    def save_session(self):
+        tabs = [self.tabs.widget(i) for i in range(self.tabs.count())]
+        session = [{'url': w.url().toString(), 'title': w.title() or w.url().toString(), 'loaded_at': w.loaded_at} for w in tabs if not w.private]
+        if session == self.data['session']: return
+        self.data['session'] = session
+        self.save_to_disk('session')
+
+    def add_private_tab(self):
+        self.add_new_tab(label="Private", private=True)
+
+    def open_urls(self, urls):
+        # From the command line, here or from a later launch; with no URLs that launch gets a new tab
+        for u in urls or [None]: self.add_new_tab(QUrl.fromUserInput(u, os.getcwd()) if u else None)
+        if self.isMinimized(): self.showNormal()
+        self.raise_(); self.activateWindow()
+
+    def on_tab_activated(self, i):
+        if i < 0: return
+        if isinstance(self.tabs.widget(i), TabPlaceholder): self.materialize_tab(i)
+        if self.active_tab is not None: self.snapshot_tab(self.active_tab)
+        self.active_tab = self.tabs.widget(i)
+        self.lifecycle.activated(self.tabs.widget(i))
+        # Freeze whatever is still active in the background once it has been idle long enough
+        if self.lifecycle.SUPPORTED: self.scheduler.schedule('tab-lifecycle', self.lifecycle.freeze_after + 1, self.lifecycle.enforce)
+        self.update_watch_tracking()
+
+    def snapshot_tab(self, tab):
+        # The tab being left, as it was last shown; discarded or never-loaded pages have nothing to grab
+        if not isinstance(tab, BrowserTab) or not tab.loaded_at or is_internal_url(tab.url()): return
+        if self.lifecycle.SUPPORTED and self.lifecycle.state(tab) == QWebEnginePage.LifecycleState.Discarded: return
+        self.thumbs.capture(tab.url().toString(), tab.loaded_at, tab.grab().toImage(), tab.private)
+
+    def tab_index(self, serial):
+        # Tabs are addressed by serial in navi://tabs, since indexes shift as tabs close
+        try: serial = int(serial)
+        except ValueError: return -1
+        return next((i for i in range(self.tabs.count()) if self.tabs.widget(i).serial == serial), -1)
+
+    def close_tab_serial(self, serial):
+        i = self.tab_index(serial)
+        return i >= 0 and self.close_tab(i)
+
+    def show_tab_overview(self):
+        # One overview tab at most; selecting it again refreshes it
+        for i in range(self.tabs.count()):
+            if self.tabs.widget(i).url() == QUrl("navi://tabs"):
+                self.tabs.setCurrentIndex(i); self.tabs.widget(i).reload(); return
+        self.add_new_tab(QUrl("navi://tabs"), "Tabs")
+
+    def changeEvent(self, e):
+        if e.type() == QEvent.WindowStateChange: self.update_watch_tracking()
+        super().changeEvent(e)
 
     def close_tab(self, i): 
-        if self.tabs.count() > 1: self.tabs.removeTab(i)
+        if self.tabs.count() > 1:
+            w = self.tabs.widget(i)
+            if w is self.active_tab: self.active_tab = None  # Nothing to snapshot on the way out
+            self.tabs.removeTab(i)
+            self.lifecycle.closed(w)
+            self.watching.discard(w)
+            w.deleteLater()  # removeTab alone keeps the page and its renderer alive
+            self.update_watch_tracking()
+            self.session_changed()
+            return True
+        return False
     def update_tab_title(self, t, b): 
         i = self.tabs.indexOf(b); 
-        if i!=-1: self.tabs.setTabText(i, t[:15])
+        if i!=-1: self.tabs.setTabText(i, ("🕶️ " if b.private else "") + t[:15])
     def go_back(self): 
         if self.tabs.currentWidget(): self.tabs.currentWidget().back()
     def go_forward(self): 
@@ -599,7 +3489,6 @@ class NaviBrowser(QMainWindow):
         if i>=0: self.update_bar_text(self.tabs.widget(i).url().toString())
     def update_url_bar_for_tab(self, q, b):
         if b==self.tabs.currentWidget(): self.update_bar_text(q.toString())
-        if q.scheme()=="navi": self.handle_internal_pages(q.toString(), b)
     def update_bar_text(self, url):
         if url.startswith("local://navi/"): self.url_bar.setText(url.replace("local://navi/", "navi://").rstrip("/"))
         elif not url.startswith("local://"): self.url_bar.setText(url)
@@ -609,13 +3498,13 @@ class NaviBrowser(QMainWindow):
         browser = self.tabs.currentWidget()
         if not browser: return
         
-        if text.lower().startswith("navi://"): self.handle_internal_pages(text, browser)
+        if text.lower().startswith("navi://"): browser.setUrl(QUrl(text))
         else:
             # Custom Suffix Support
             suffix = self.data['settings'].get('custom_suffix', '.pw-navi')
             if text.lower().endswith(suffix):
                 d = self.data['sites'].get(text.lower())
-                if d: browser.setHtml(d['html_content'], QUrl(f"local://{text}/"))
+                if d: browser.setUrl(QUrl(f"local://{text.lower()}/"))
                 return
 
             u = QUrl(text)
@@ -623,42 +3512,68 @@ class NaviBrowser(QMainWindow):
             elif "://" not in text: u = QUrl("https://" + text)
             browser.setUrl(u)
 
-    def save_to_disk(self):
-        try:
-            with open(DATA_FILE, 'w') as f: json.dump(self.data, f)
-        except: pass
+    def save_to_disk(self, *keys):
+        # Writes only the given top-level keys (all small ones when none are given);
+        # sites, extensions, history and downloads are written per record via self.store
+        keys = keys or [k for k in self.data if k not in NaviStore.RECORD_SECTIONS]
+        t0 = self.perf.start()
+        items = {k: self.data[k] for k in keys}
+        try: self.store.put(**items)
+        except Exception as e: print(f"Error saving: {e}")
+        if t0 is not None:
+            self.perf.add('store', 'save_to_disk', t0, (time.perf_counter() - t0) * 1000, keys=",".join(keys), bytes=len(json.dumps(items)))
     
     def load_from_disk(self):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, 'r') as f: 
-                    loaded = json.load(f)
-                    self.data.update(loaded)
-                    
-                    # --- MIGRATION LOGIC (The Fix) ---
-                    # Ensure all new keys exist in old data files
-                    if 'settings' not in self.data: self.data['settings'] = {}
-                    if 'theme' not in self.data['settings']: self.data['settings']['theme'] = 'light'
-                    if 'wholesome_switch' not in self.data['settings']: self.data['settings']['wholesome_switch'] = True
-                    if 'custom_suffix' not in self.data['settings']: self.data['settings']['custom_suffix'] = '.pw-navi'
-                    
-                    if 'inventory' not in self.data: self.data['inventory'] = []
-                    if 'navits' not in self.data: self.data['navits'] = 0
-                    if 'sites' not in self.data: self.data['sites'] = {}
-                    if 'extensions' not in self.data: self.data['extensions'] = {}
-                    if 'history' not in self.data: self.data['history'] = []
-                    if 'downloads' not in self.data: self.data['downloads'] = []
-            except: pass
+        self.notes_version, self.notes, self.notes_edits, self.notes_log_chars = 0, "", 0, 0
+        try:
+            # --- MIGRATION LOGIC (The Fix) ---
+            if self.store.is_empty() and os.path.exists(DATA_FILE):
+                with open(DATA_FILE, 'r') as f: legacy = apply_data_defaults(json.load(f))
+                self.store.import_data(legacy)
+                os.replace(DATA_FILE, DATA_FILE + ".migrated")
+            self.data.update(self.store.load())
+            self.notes_version, self.notes, self.notes_edits = self.store.load_notes()
+        except Exception as e: print(f"Error loading: {e}")
+        apply_data_defaults(self.data)
+
+    def closeEvent(self, e):
+        self.touch_active()
+        if self.perf_profile:
+            self.sample_profile_rss()
+            self.save_to_disk('perf_profile_stats')
+        if self.data['settings']['restore_session']: self.save_session()
+        self.thumbs.close()
+        self.store.close()  # Flushes pending writes
+        super().closeEvent(e)
 
     def apply_theme(self):
         # Now self.data['settings']['theme'] is guaranteed to exist
-        self.setStyleSheet(ModernStyles.get(self.data['settings']['theme']))
-        if self.tabs.currentWidget(): self.tabs.currentWidget().reload()
+        theme = self.data['settings']['theme']
+        if theme == getattr(self, 'applied_theme', None): return
+        self.applied_theme = theme
+        self.setStyleSheet(ModernStyles.get(theme))
+        # Only internal pages are themed; web content and personal sites are left alone
+        for i in range(self.tabs.count()):
+            u = self.tabs.widget(i).url()
+            if is_internal_url(u): self.tabs.widget(i).reload()
 
 if __name__ == '__main__':
+    TRACE.mark("imports")
+    if any(a == "--batch" or a.startswith("--batch=") for a in sys.argv): sys.exit(run_batch(sys.argv))
+    instance = InstanceGuard(DB_FILE)
+    if not instance.claim():
+        # Another process has this profile open and opens the URLs itself
+        sys.exit(0 if instance.forward(launch_urls(sys.argv)) else "Navi is already running with this profile but isn't responding.")
+    perf_profile = apply_perf_profile(sys.argv)
+    register_url_schemes()
     app = QApplication(sys.argv)
     QApplication.setApplicationName("Navi Browser")
-    window = NaviBrowser()
+    TRACE.mark("QApplication")
+    instance.listen()
+    window = NaviBrowser(perf_profile)
+    instance.received.connect(window.open_urls)
     window.show()
+    if launch_urls(sys.argv): window.open_urls(launch_urls(sys.argv))
+    QTimer.singleShot(0, lambda: TRACE.mark("window shown"))
     sys.exit(app.exec_())
 
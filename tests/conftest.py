@@ -0,0 +1,59 @@
+# Shared fixtures. simple_browser needs PyQt5 and PyQtWebEngine importable (requirements.txt); apart from
+# test_batch.py, which renders pages in a subprocess, nothing here starts QtWebEngine.
+#   python -m pytest -q
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+class Site:
+    # What the local server answers: path -> (body, content type); anything else is a 404
+    def __init__(self):
+        self.pages, self.hits = {}, Counter()
+        self.delay, self.active, self.peak = 0.0, 0, 0
+        self.lock = threading.Lock()
+        self.base = None
+
+    def add(self, path, body, ctype="text/html"):
+        self.pages[path] = (body.encode() if isinstance(body, str) else body, ctype)
+
+@pytest.fixture
+def site():
+    s = Site()
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with s.lock:
+                s.hits[self.path] += 1; s.active += 1; s.peak = max(s.peak, s.active)
+            try:
+                time.sleep(s.delay)
+                if self.path not in s.pages:
+                    self.send_error(404); return
+                body, ctype = s.pages[self.path]
+                self.send_response(200)
+                self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+            finally:
+                with s.lock: s.active -= 1
+
+        def log_message(self, *args): pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    s.base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield s
+    server.shutdown(); server.server_close()
+
+@pytest.fixture
+def store(tmp_path):
+    sb = pytest.importorskip("simple_browser")
+    st = sb.NaviStore(str(tmp_path / "navi.db"), str(tmp_path / "blobs"), str(tmp_path / "sites"))
+    st.writer.window = 0.01
+    yield st
+    st.close()
@@ -0,0 +1,44 @@
+# End to end: simple_browser.py --batch as its own process against the local server
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+# The batch runs in a fresh interpreter, so check QtWebEngine loads there too
+if subprocess.run([sys.executable, "-c", "import PyQt5.QtWebEngineWidgets"], capture_output=True).returncode:
+    pytest.skip("QtWebEngine is not available", allow_module_level=True)
+
+def run_batch(tmp_path, urls, *args):
+    (tmp_path / "urls.txt").write_text("# comment lines are skipped\n" + "".join(u + "\n" for u in urls))
+    return subprocess.run([sys.executable, os.path.join(ROOT, "simple_browser.py"), "--batch", "urls.txt", "--out", "out",
+                           "--timeout", "20", *args], cwd=tmp_path, capture_output=True, text=True, timeout=180)
+
+def test_batch_writes_every_page_and_a_report(site, tmp_path):
+    for i in range(5): site.add(f"/p{i}", f"<html><head><title>Page {i}</title></head><body><p>Text of page {i}</p></body></html>")
+    p = run_batch(tmp_path, [f"{site.base}/p{i}" for i in range(5)], "--concurrency", "2")
+    assert p.returncode == 0, p.stderr
+    out = tmp_path / "out"
+    results = [json.loads(line) for line in (out / "results.jsonl").read_text().splitlines()]
+    assert sorted(r['index'] for r in results) == list(range(5))
+    for r in results:
+        assert r['ok'] and r['title'] == f"Page {r['index']}"
+        assert f"Text of page {r['index']}" in (out / f"{r['index']:06d}.txt").read_text()
+        assert (out / f"{r['index']:06d}.html").stat().st_size == r['bytes']
+    report = json.loads((out / "report.json").read_text())
+    assert (report['urls'], report['ok'], report['failed']) == (5, 5, 0)
+    assert report == json.loads(p.stdout.strip().splitlines()[-1])
+
+def test_batch_reports_failures_after_retries(site, tmp_path):
+    site.add("/ok", "<title>Fine</title>")
+    p = run_batch(tmp_path, [f"{site.base}/ok", "http://127.0.0.1:9/unreachable"], "--retries", "1")
+    assert p.returncode == 1
+    results = {r['url']: r for r in map(json.loads, (tmp_path / "out" / "results.jsonl").read_text().splitlines())}
+    assert results[f"{site.base}/ok"]['ok']
+    failed = results["http://127.0.0.1:9/unreachable"]
+    assert not failed['ok'] and failed['attempts'] == 2
+    report = json.loads((tmp_path / "out" / "report.json").read_text())
+    assert (report['ok'], report['failed'], report['retries']) == (1, 1, 1)
@@ -0,0 +1,12 @@
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+def test_blob_store_dedupes_and_streams(tmp_path):
+    blobs = sb.BlobStore(str(tmp_path))
+    h = blobs.put(b"same")
+    assert blobs.put(b"same") == h and blobs.get(h) == b"same"
+    assert blobs.put(b"other") != h
+    assert b"".join(blobs.stream(h, chunk=2)) == b"same"
+    blobs.delete(h)
+    with pytest.raises(FileNotFoundError): blobs.get(h)
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+CSS = b'@import "base.css"; @font-face{font-family:f;src:url(font.woff2)} body{background:url("/img/bg.png")}'
+PAGE = """<html><head><link rel="stylesheet" href="/static/site.css" integrity="sha384-x">
+<script src="/static/app.js"></script></head><body style="background:url(/img/inline.png)">
+<img src="/img/a.png" srcset="/img/a.png 1x, /img/a2.png 2x"><img src="/img/missing.png"></body></html>"""
+
+def serve_page(site):
+    site.add("/static/site.css", CSS, "text/css")
+    site.add("/static/base.css", b"h1{background:url(/img/h1.png)}", "text/css")
+    site.add("/static/font.woff2", b"\0font", "font/woff2")
+    site.add("/static/app.js", b"console.log(1)", "application/javascript")
+    for n in ("bg", "inline", "a", "a2", "h1"): site.add(f"/img/{n}.png", f"png {n}".encode(), "image/png")
+
+def blob_count(store):
+    return sum(len(files) for _, _, files in os.walk(store.blobs.root))
+
+def capture(site, store, html=PAGE, **kw):
+    return sb.PageCapture(site.base + "/page", "Page", html, store.blobs, **kw).run()
+
+def test_capture_stores_and_rewrites_every_resource(site, store):
+    serve_page(site)
+    job = capture(site, store)
+    assert job.state == 'done'
+    assert (job.fetched, job.failed) == (9, 1)
+    page = store.blobs.get(job.hash).decode()
+    for path in ("/static/site.css", "/static/app.js", "/img/a.png", "/img/a2.png", "/img/inline.png"):
+        assert site.base + path not in page and job.local[site.base + path] in page
+    assert 'src="/img/missing.png"' in page  # Failed ones keep their web URL
+    assert "integrity" not in page
+    assert all(u.startswith(sb.SAVED_ORIGIN + "/res/") for u in job.local.values())
+
+def test_capture_rewrites_stylesheets_deepest_first(site, store):
+    serve_page(site)
+    job = capture(site, store)
+    css = store.blobs.get(job.resources[site.base + "/static/site.css"]).decode()
+    assert job.local[site.base + "/static/base.css"] in css
+    assert job.local[site.base + "/static/font.woff2"] in css
+    assert job.local[site.base + "/img/bg.png"] in css
+    base = store.blobs.get(job.resources[site.base + "/static/base.css"]).decode()
+    assert job.local[site.base + "/img/h1.png"] in base
+
+def test_recapture_writes_no_new_blobs(site, store):
+    serve_page(site)
+    capture(site, store)
+    before = blob_count(store)
+    capture(site, store)
+    assert blob_count(store) == before
+
+def test_capture_caps_connections_per_host(site, store):
+    for i in range(12): site.add(f"/img/{i}.png", b"x%d" % i, "image/png")
+    site.delay = 0.05
+    job = capture(site, store, "".join(f'<img src="/img/{i}.png">' for i in range(12)), workers=8, per_host=3)
+    assert job.fetched == 12
+    assert site.peak <= 3
+
+def test_delete_keeps_blobs_another_capture_uses(site, store):
+    serve_page(site)
+    first = capture(site, store); first.id = "1"
+    store.add_capture({'id': "1", 'title': "A", 'date': 0, 'size': first.size, 'hash': first.hash}, first.resources, first.pins)
+    # Finished but not recorded yet: its blobs are only pinned when the older copy is deleted
+    second = capture(site, store, PAGE + " "); second.id = "2"
+    store.delete_download("1"); store.writer.flush()
+    shared = second.resources[site.base + "/img/a.png"]
+    assert os.path.exists(store.blobs.path(shared))
+    store.add_capture({'id': "2", 'title': "B", 'date': 0, 'size': second.size, 'hash': second.hash}, second.resources, second.pins)
+    store.writer.flush()
+    assert not store.blobs.pinned
+    store.delete_download("2"); store.writer.flush()
+    assert not os.path.exists(store.blobs.path(shared))
+    assert blob_count(store) == 0
+
+def test_rewrite_urls_srcset_and_css():
+    local = {"http://h/a.png": "saved://dlw/res/1.png", "http://h/b.png": "saved://dlw/res/2.png"}
+    html = '<img srcset="a.png 1x, b.png 2x, c.png 3x"><div style="background:url(\'b.png\')">'
+    out = sb.rewrite_urls(html, "http://h/", local)
+    assert 'srcset="saved://dlw/res/1.png 1x,saved://dlw/res/2.png 2x, c.png 3x"' in out
+    assert 'url("saved://dlw/res/2.png")' in out
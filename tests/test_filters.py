@@ -0,0 +1,68 @@
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+RULES = """! comment
+[Adblock Plus 2.0]
+example.com##.banner
+||ads.example^
+/banner/*/img^
+ad_slot
+||tracker.net^$third-party
+||cdn.net/pixel.gif$image,domain=news.com|~sports.news.com
+@@||ads.example/allowed^
+@@||trusted.org^$document
+||pop.net^$popup
+/ad[0-9]+/
+"""
+
+IMAGE, SCRIPT = sb.FILTER_TYPE_BITS['image'], sb.FILTER_TYPE_BITS['script']
+
+@pytest.fixture(scope="module")
+def engine():
+    return sb.FilterEngine.parse(RULES.splitlines())
+
+def blocked(engine, url, site="page.com", type_bit=SCRIPT):
+    host = url.split("/")[2]
+    return engine.match(url, host, site, type_bit) is not None
+
+def test_counts_rules_and_skips_what_it_cannot_honour(engine):
+    assert engine.rules == 7
+    assert engine.skipped == 2  # $popup and the regex rule
+
+def test_host_rules_match_subdomains(engine):
+    assert blocked(engine, "https://ads.example/x.js")
+    assert blocked(engine, "https://img.ads.example/x.js")
+    assert not blocked(engine, "https://notads.example/x.js")
+
+def test_exceptions_and_allowed_sites(engine):
+    assert not blocked(engine, "https://ads.example/allowed/x.js")
+    assert not blocked(engine, "https://ads.example/x.js", site="www.trusted.org")
+
+def test_wildcard_token_and_substring_rules(engine):
+    assert blocked(engine, "https://a.com/banner/123/img?x=1")
+    assert not blocked(engine, "https://a.com/banner/123/image")
+    assert blocked(engine, "https://a.com/js/ad_slot.js")
+
+def test_party_type_and_domain_options(engine):
+    assert blocked(engine, "https://tracker.net/t.js", site="page.com")
+    assert not blocked(engine, "https://tracker.net/t.js", site="www.tracker.net")
+    assert blocked(engine, "https://cdn.net/pixel.gif", site="news.com", type_bit=IMAGE)
+    assert not blocked(engine, "https://cdn.net/pixel.gif", site="news.com", type_bit=SCRIPT)
+    assert not blocked(engine, "https://cdn.net/pixel.gif", site="sports.news.com", type_bit=IMAGE)
+    assert not blocked(engine, "https://cdn.net/pixel.gif", site="other.com", type_bit=IMAGE)
+
+def test_aho_corasick_finds_overlapping_patterns():
+    ac = sb.AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(ac.search("ushers")) == [0, 1, 3]
+
+def test_compiled_engine_is_cached_until_a_list_changes(tmp_path):
+    lst, cache = tmp_path / "list.txt", str(tmp_path / ".compiled.pickle")
+    lst.write_text(RULES)
+    engine, cached = sb.FilterEngine.load([str(lst)], cache)
+    assert not cached and engine.rules == 7
+    engine, cached = sb.FilterEngine.load([str(lst)], cache)
+    assert cached and engine.match("https://ads.example/x", "ads.example", "page.com", SCRIPT)
+    lst.write_text(RULES + "||more.ads^\n")
+    engine, cached = sb.FilterEngine.load([str(lst)], cache)
+    assert not cached and engine.rules == 8
@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+def test_frecency_ranks_recent_and_frequent_first():
+    now = time.time()
+    old, recent = now - 60 * 86400, now - 3600
+    idx = sb.FrecencyIndex().build([
+        ("https://www.example.com/old", "Old", old, 1.0),
+        ("https://example.com/new", "New", recent, 1.0),
+        ("https://example.com/often", "Often", recent - 60, 1.0),
+        ("https://example.com/often", None, recent - 120, 1.0),
+        ("https://other.org/", "Other", recent, 1.0),
+    ])
+    assert [u for u, _ in idx.query("exa")] == ["https://example.com/often", "https://example.com/new", "https://www.example.com/old"]
+    assert idx.query("https://www.exa")[0] == ("https://example.com/often", "Often")
+    assert idx.query("") == []
+
+def test_frecency_visits_update_rankings_and_long_prefixes():
+    now = time.time()
+    idx = sb.FrecencyIndex().build([("https://example.com/alpha", "A", now - 86400, 1.0), ("https://example.com/beta", "B", now - 3600, 1.0)])
+    assert idx.query("example.com/")[0][0] == "https://example.com/beta"  # Longer than TOP_DEPTH: sorted scan
+    for _ in range(3): idx.visit("https://example.com/alpha")
+    assert idx.query("exampl")[0][0] == "https://example.com/alpha"
+    assert idx.query("example.com/")[0][0] == "https://example.com/alpha"
+    idx.visit("https://new.site/", "New")
+    assert idx.query("new.s") == [("https://new.site/", "New")]
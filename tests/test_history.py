@@ -0,0 +1,25 @@
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+def test_history_log_is_newest_first():
+    log = sb.HistoryLog(10)
+    log.extend((f"https://s{i}.com/p", f"T{i}", i) for i in range(3))
+    assert [e.url for e in log] == ["https://s2.com/p", "https://s1.com/p", "https://s0.com/p"]
+    assert log.first().host == "s2.com" and log.first().title == "T2"
+    assert [e.time for e in log.oldest_first()] == [0, 1, 2]
+    assert [e.url for e in log.recent(1, offset=1)] == ["https://s1.com/p"]
+
+def test_history_log_overwrites_the_oldest_once_full():
+    log = sb.HistoryLog(5)
+    for i in range(23): log.append(f"https://s{i % 7}.com/{i}", f"T{i}", i)
+    assert len(log) == 5
+    assert [e.time for e in log] == [22, 21, 20, 19, 18]
+    assert len(log.urls) + len(log.titles) <= 4 * log.capacity + 2  # Compacted along the way
+
+def test_history_log_copy_is_independent():
+    log = sb.HistoryLog(5)
+    log.append("https://a.com/", "A", 1)
+    c = log.copy()
+    log.append("https://b.com/", "B", 2)
+    assert len(c) == 1 and c.first().url == "https://a.com/"
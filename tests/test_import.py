@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+def chromium_history(path, pages=20, visits=3):
+    db = sqlite3.connect(path)
+    db.executescript("CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT); CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER)")
+    t0 = (1700000000 + sb.CHROME_EPOCH) * 1000000
+    for i in range(pages):
+        db.execute("INSERT INTO urls VALUES (?, ?, ?)", (i + 1, f"https://site{i}.com/", f"Site {i}"))
+        # Back to back, like reloads
+        for k in range(visits): db.execute("INSERT INTO visits (url, visit_time) VALUES (?, ?)", (i + 1, t0 + (i * visits + k) * 1000000))
+    db.execute("INSERT INTO urls VALUES (999, 'chrome://settings', 'Settings')")
+    db.execute("INSERT INTO visits (url, visit_time) VALUES (999, ?)", (t0,))
+    db.commit(); db.close()
+
+def firefox_places(path):
+    db = sqlite3.connect(path)
+    db.executescript("""CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT, title TEXT);
+        CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, place_id INTEGER, visit_date INTEGER);
+        CREATE TABLE moz_bookmarks (id INTEGER PRIMARY KEY, type INTEGER, fk INTEGER, parent INTEGER, position INTEGER, title TEXT, dateAdded INTEGER);
+        INSERT INTO moz_places VALUES (1, 'https://mozilla.org/', 'Mozilla'), (2, 'https://docs.org/', 'Docs');
+        INSERT INTO moz_historyvisits (place_id, visit_date) VALUES (1, 1700000000000000), (2, 1700000100000000), (1, 1700000200000000);
+        INSERT INTO moz_bookmarks VALUES (10, 2, NULL, 0, 0, 'Toolbar', 0), (11, 1, 2, 10, 0, 'The docs', 1700000000000000);""")
+    db.commit(); db.close()
+
+def test_chromium_import_keeps_every_visit(store, tmp_path):
+    chromium_history(tmp_path / "History")
+    job = sb.BrowserImport(str(tmp_path / "History"), store, 1000).run()
+    assert (job.state, job.kind) == ('done', 'chromium')
+    assert (job.visits, job.imported, job.skipped) == (61, 60, 1)
+    log = store.load_history(1000)
+    assert sum(1 for e in log if e.url == "https://site3.com/") == 3
+    times = [e.time for e in log.oldest_first()]
+    assert times == sorted(times) and times[0] == 1700000000
+
+def test_repeated_import_adds_nothing(store, tmp_path):
+    chromium_history(tmp_path / "History")
+    sb.BrowserImport(str(tmp_path / "History"), store, 1000).run()
+    job = sb.BrowserImport(str(tmp_path / "History"), store, 1000).run()
+    assert (job.imported, job.skipped) == (0, 61)
+    assert len(store.load_history(1000)) == 60
+
+def test_import_keeps_only_the_newest_limit(store, tmp_path):
+    store.add_history("https://mine.com/", "Mine", 1800000000); store.writer.flush()
+    chromium_history(tmp_path / "History")
+    job = sb.BrowserImport(str(tmp_path / "History"), store, 10).run()
+    log = store.load_history(100)
+    assert len(log) == 10 and job.imported == 9
+    assert log.first().url == "https://mine.com/"
+
+def test_firefox_history_and_bookmarks(store, tmp_path):
+    firefox_places(tmp_path / "places.sqlite")
+    job = sb.BrowserImport(str(tmp_path / "places.sqlite"), store, 1000).run()
+    assert (job.state, job.kind, job.imported, job.bookmarks) == ('done', 'firefox', 3, 1)
+    html = job.site_html()
+    assert "<h2>Toolbar</h2>" in html and '<a href="https://docs.org/" ADD_DATE="1700000000">The docs</a>' in html
+
+def test_bookmark_file_with_folders_and_escaping(store, tmp_path):
+    (tmp_path / "bookmarks.html").write_text("""<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<DL><p><DT><H3>Work</H3><DL><p>
+<DT><A HREF="https://a.com/?x=1&amp;y=&quot;2&quot;" ADD_DATE="1">A &lt;b&gt;</A>
+<DT><A HREF="javascript:alert(1)">Bad</A>
+</DL><p><DT><A HREF="https://b.com/" ADD_DATE="junk">B</A>
+<DT><A HREF="https://b.com/">B again</A></DL>""", encoding="utf-8")
+    job = sb.BrowserImport(str(tmp_path / "bookmarks.html"), store, 1000).run()
+    assert (job.state, job.kind, job.bookmarks) == ('done', 'bookmarks', 2)
+    html = job.site_html()
+    assert '<a href="https://a.com/?x=1&amp;y=&quot;2&quot;" ADD_DATE="1">A &lt;b&gt;</a>' in html
+    assert '<a href="https://b.com/">B</a>' in html
+    assert "javascript:" not in html and html.index("<h2>Work</h2>") < html.index("<h2>Bookmarks</h2>")
+
+def test_unknown_files_fail_cleanly(store, tmp_path):
+    (tmp_path / "notes.txt").write_text("hello")
+    job = sb.BrowserImport(str(tmp_path / "notes.txt"), store, 1000).run()
+    assert job.state == 'failed' and "not a browser" in job.error
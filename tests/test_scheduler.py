@@ -0,0 +1,31 @@
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sb.time, "monotonic", lambda: now[0])
+    return now
+
+def test_repeating_job_skips_periods_missed_while_asleep(clock):
+    sched, ticks = sb.Scheduler(), []
+    sched.schedule('tick', 60, lambda: ticks.append(clock[0]), repeat=60)
+    clock[0] += 60; sched.run_due()
+    assert len(ticks) == 1
+    clock[0] += 600; sched.run_due()  # Ten periods asleep
+    assert len(ticks) == 2
+    assert sched.heap[0][0] == clock[0] + 60
+    clock[0] += 59; sched.run_due()
+    assert len(ticks) == 2
+    clock[0] += 1; sched.run_due()
+    assert len(ticks) == 3
+
+def test_one_shot_and_cancelled_jobs(clock):
+    sched, ran = sb.Scheduler(), []
+    sched.schedule('once', 5, lambda: ran.append('once'))
+    sched.schedule('dropped', 5, lambda: ran.append('dropped'))
+    sched.schedule('once', 10, lambda: ran.append('again'))  # Replaces the first
+    sched.cancel('dropped')
+    clock[0] += 10; sched.run_due(); sched.run_due()
+    assert ran == ['again'] and not sched.pending('once') and not sched.heap
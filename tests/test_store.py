@@ -0,0 +1,78 @@
+import pytest
+
+sb = pytest.importorskip("simple_browser")
+
+def kv(store):
+    return dict(store.db.execute("SELECT key, value FROM kv"))
+
+def test_put_round_trips(store):
+    store.put(navits=9, inventory=["widgets"])
+    store.writer.flush()
+    assert store.load()['navits'] == 9 and store.load()['inventory'] == ["widgets"]
+    assert kv(store) == {'navits': '9', 'inventory': '["widgets"]'}
+
+def test_history_is_capped_and_loaded_in_order(store):
+    for i in range(30): store.add_history(f"https://s{i}.com/", f"T{i}", i, limit=20)
+    store.writer.flush()
+    log = store.load_history(20)
+    assert len(log) == 20
+    assert [e.time for e in log.oldest_first()] == list(range(10, 30))
+
+def test_writes_coalesce_by_key(store):
+    store.writer.window = 0.2  # One burst
+    for n in range(10): store.put(navits=n)
+    store.put(inventory=["widgets"])
+    store.writer.flush()
+    assert store.load()['navits'] == 9
+    stats = store.writer.stats()
+    assert (stats['requested'], stats['ops'], stats['coalesced'], stats['failed']) == (11, 2, 9, 0)
+
+def test_failing_op_does_not_roll_back_its_burst(store):
+    store.writer.window = 0.2
+    store.put(navits=5)
+    store.writer.submit(lambda db: db.execute("INSERT INTO no_such_table VALUES (1)"))
+    store.put(inventory=["x"])
+    store.writer.flush()
+    assert kv(store) == {'navits': '5', 'inventory': '["x"]'}
+    stats = store.writer.stats()
+    assert stats['failed'] == 1 and stats['coalesced'] == 0
+    assert "no_such_table" in stats['last_error'][1]
+
+def test_failed_op_is_retried(store):
+    calls = []
+    def flaky(db):
+        calls.append(1)
+        if len(calls) == 1: raise RuntimeError("busy")
+        db.execute("INSERT INTO kv (key, value) VALUES ('flaky', '1')")
+    store.writer.submit(flaky, 'flaky')
+    store.writer.flush()
+    assert len(calls) == 2 and kv(store)['flaky'] == '1'
+    assert store.writer.stats()['failed'] == 0
+
+def test_newer_write_replaces_a_failed_one(store):
+    store.writer.window = 0.2
+    def bad(db): raise RuntimeError("stale")
+    store.writer.submit(bad, ('kv', 'navits'))
+    store.writer.flush()
+    assert store.writer.stats()['failed'] == 1  # Tried ATTEMPTS times, then dropped
+    store.put(navits=7); store.writer.flush()
+    assert store.load()['navits'] == 7
+
+def test_history_search_matches_every_word_as_a_prefix(store):
+    store.add_history("https://docs.python.org/3/library/sqlite3.html", "sqlite3 — DB-API interface", 1)
+    store.add_history("https://example.com/", "Example Domain", 2)
+    store.writer.flush()
+    assert [e.url for e in store.search_history("pyth sqli")] == ["https://docs.python.org/3/library/sqlite3.html"]
+    assert [e.url for e in store.search_history("Exam")] == ["https://example.com/"]
+    assert store.search_history("pyth exam") == [] and store.search_history("!!") == []
+
+def test_legacy_import_waits_for_queued_writes(store):
+    store.writer.window = 0.5
+    store.put(queued_key=["queued"])
+    legacy = sb.apply_data_defaults({'navits': 3, 'history': [{'url': "https://b.com/", 'title': "B", 'time': 2}, {'url': "https://a.com/", 'title': "A", 'time': 1}],
+                                     'downloads': [{'id': 1, 'title': "Saved", 'date': "today", 'html': "<p>hi</p>"}]})
+    store.import_data(legacy)
+    data = store.load()
+    assert data['navits'] == 3 and data["queued_key"] == ["queued"]
+    assert [e.url for e in store.load_history(10)] == ["https://b.com/", "https://a.com/"]
+    assert b"".join(store.read_download(data['downloads'][0])) == b"<p>hi</p>"